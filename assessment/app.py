@@ -12,12 +12,64 @@ def create_app() -> Flask:
     app.secret_key = os.environ.get('SECRET_KEY', 'dit-assessment-dev-key')
 
     # Initialize search engine (loads pre-computed embeddings)
+    from config import settings
+    from embeddings.query_cache import QueryEmbeddingCache
     from embeddings.search import SearchEngine
-    app.search_engine = SearchEngine()
+    app.search_engine = SearchEngine(query_cache=QueryEmbeddingCache(
+        max_size=settings.query_cache_size,
+        path=settings.query_cache_path,
+    ), nprobe=settings.search_nprobe)
+    if settings.precompute_growth_paths:
+        app.search_engine.build_growth_index()
 
     # Initialize LLM provider registry
     from llm import create_provider_registry
     app.llm_registry = create_provider_registry()
+    app.llm_registry.start_health_checker(interval=settings.provider_health_interval)
+
+    # Per-request model choice by question complexity and remaining budget
+    from llm.model_router import create_model_router
+    app.model_router = create_model_router(
+        settings.model_routing,
+        reserve=settings.model_routing_reserve,
+        economy=settings.model_routing_economy,
+    )
+
+    # Chat rate limiter (RATE_LIMIT_BACKEND)
+    from rate_limit import create_rate_limiter
+    app.rate_limiter = create_rate_limiter(
+        settings.rate_limit_backend,
+        limit=settings.rate_limit_requests,
+        window=settings.rate_limit_window,
+        path=settings.rate_limit_path,
+        max_keys=settings.rate_limit_max_keys,
+    )
+
+    # Optional chat response cache (RESPONSE_CACHE_BACKEND)
+    from response_cache import create_response_cache
+    app.response_cache = create_response_cache(
+        settings.response_cache_backend,
+        max_size=settings.response_cache_size,
+        ttl=settings.response_cache_ttl,
+        path=settings.response_cache_path,
+        similarity=settings.response_cache_similarity,
+    )
+
+    # Chat history compaction (HISTORY_TOKEN_BUDGET=0 disables)
+    from history import HistoryManager
+    app.history_manager = HistoryManager(
+        token_budget=settings.history_token_budget,
+        summary_words=settings.history_summary_words,
+    ) if settings.history_token_budget > 0 else None
+
+    # Write-behind persistence of assessment results (None without Firestore)
+    from result_writer import create_result_writer
+    app.result_writer = create_result_writer(
+        settings.result_spill_dir,
+        batch_size=settings.result_batch_size,
+        flush_interval=settings.result_flush_interval,
+        max_queue=settings.result_queue_size,
+    )
 
     # Register blueprints
     from blueprints import register_all_blueprints
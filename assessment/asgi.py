@@ -0,0 +1,196 @@
+"""ASGI entry point: async chat and search endpoints in front of the Flask app.
+
+The hot, I/O-bound endpoints (POST /chat/api/message, its SSE variant
+/chat/api/message/stream, and POST /api/search) are served natively on the
+event loop, so an in-flight LLM call holds a coroutine rather than a
+gunicorn thread and one instance can keep hundreds of requests waiting on
+the provider. Every other route falls through to the unchanged Flask app
+via a WSGI adapter.
+
+Provider streams are synchronous iterators: the SSE endpoint pulls each
+chunk on a worker thread from a dedicated pool (ASGI_STREAM_THREADS), which
+is held only while waiting for the next chunk.
+
+Run with:
+    cd assessment
+    uvicorn asgi:app --port 5002
+"""
+import asyncio
+
+import anyio
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+
+from app import create_app
+from chat_service import (
+    build_chat_call, cached_response, compact_history, estimate_tokens, response_payload, route_model,
+    sse_event, store_response, usage_tokens,
+)
+from config import settings
+from usage_tracker import record_usage, release_tokens, reserve_tokens
+
+flask_app = create_app()
+search_engine = flask_app.search_engine
+llm_registry = flask_app.llm_registry
+response_cache = flask_app.response_cache
+history_manager = flask_app.history_manager
+model_router = flask_app.model_router
+rate_limiter = flask_app.rate_limiter
+
+_stream_limiter = None  # created on first use: it must belong to the running event loop
+
+
+def _client_ip(request: Request) -> str:
+    forwarded = request.headers.get('x-forwarded-for')
+    if forwarded:
+        return forwarded.split(',')[0].strip()
+    return request.client.host if request.client else ''
+
+
+async def semantic_search(request: Request):
+    data = await request.json()
+    query = data['query']
+    mode = data.get('mode', settings.search_mode)
+    try:
+        results = await search_engine.asearch(query, top_k=data.get('top_k', 5),
+                                              filters=data.get('filters'), mode=mode)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    return JSONResponse({"results": results, "query": query, "mode": mode})
+
+
+async def send_message(request: Request):
+    # The sqlite backend is disk I/O
+    limit = await asyncio.to_thread(rate_limiter.check, _client_ip(request))
+    if not limit.allowed:
+        return JSONResponse({"error": "Rate limit exceeded. Please try again later."}, status_code=429,
+                            headers=limit.headers())
+    response = await _send_message(request)
+    response.headers.update(limit.headers())
+    return response
+
+
+async def _prepare_chat(request: Request) -> dict:
+    data = await request.json()
+    chunks = await search_engine.asearch(data['message'], top_k=settings.context_candidates)
+    data = route_model(model_router, llm_registry, data, chunks)
+    chat = build_chat_call(data, chunks)
+    chat["query_vector"] = search_engine.cached_query_vector(data['message'])
+    return chat
+
+
+async def _send_message(request: Request):
+    chat = await _prepare_chat(request)
+    provider = llm_registry.route(chat["provider_name"])
+
+    # The SQLite response cache is blocking disk I/O: keep it off the event loop
+    cache_key, cached = await asyncio.to_thread(cached_response, response_cache, chat, provider)
+    if cached is not None:
+        usage = record_usage(0, 0, cache_hit=True)
+        return JSONResponse(response_payload(cached, usage, chat["chunks"], cached=True, route=chat["route"]))
+
+    # Usually local; leasing a new budget block is a Firestore transaction
+    reserved = estimate_tokens(chat)
+    if not await asyncio.to_thread(reserve_tokens, reserved):
+        return JSONResponse({"error": "Daily token budget reached. Chat will resume tomorrow."},
+                            status_code=503)
+
+    try:
+        # Summaries are rare, short generate() calls: run them in a thread
+        await asyncio.to_thread(compact_history, history_manager, chat, provider)
+        response = await provider.agenerate(**chat["kwargs"])
+    except BaseException:
+        # Includes cancellation when the client disconnects
+        release_tokens(reserved)
+        raise
+    await asyncio.to_thread(store_response, response_cache, cache_key, chat, response)
+
+    # Usage is recorded in memory and flushed in batches: no I/O here
+    usage = record_usage(*usage_tokens(chat, response), reserved=reserved)
+
+    return JSONResponse(response_payload(response, usage, chat["chunks"], route=chat["route"]))
+
+
+async def _iterate_in_threads(iterator):
+    """Async iteration over a blocking iterator, one next() per pool thread."""
+    global _stream_limiter
+    if _stream_limiter is None:
+        _stream_limiter = anyio.CapacityLimiter(settings.asgi_stream_threads)
+    done = object()
+    while True:
+        item = await anyio.to_thread.run_sync(next, iterator, done, limiter=_stream_limiter)
+        if item is done:
+            return
+        yield item
+
+
+async def stream_message(request: Request):
+    limit = await asyncio.to_thread(rate_limiter.check, _client_ip(request))
+    if not limit.allowed:
+        return JSONResponse({"error": "Rate limit exceeded. Please try again later."}, status_code=429,
+                            headers=limit.headers())
+    response = await _stream_message(request)
+    response.headers.update(limit.headers())
+    return response
+
+
+async def _stream_message(request: Request):
+    """Same events as the Flask stream_message (blueprints/chat.py)."""
+    chat = await _prepare_chat(request)
+    provider = llm_registry.route(chat["provider_name"])
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+    cache_key, cached = await asyncio.to_thread(cached_response, response_cache, chat, provider)
+    if cached is not None:
+        usage = record_usage(0, 0, cache_hit=True)
+        events = [
+            sse_event({"type": "delta", "text": cached.text}),
+            sse_event({"type": "done", **response_payload(cached, usage, chat["chunks"], cached=True,
+                                                           route=chat["route"])}),
+        ]
+        return StreamingResponse(iter(events), media_type='text/event-stream', headers=headers)
+
+    reserved = estimate_tokens(chat)
+    if not await asyncio.to_thread(reserve_tokens, reserved):
+        return JSONResponse({"error": "Daily token budget reached. Chat will resume tomorrow."},
+                            status_code=503)
+
+    async def events():
+        settled = False
+        try:
+            await asyncio.to_thread(compact_history, history_manager, chat, provider)
+            chunks = provider.stream(**chat["kwargs"])
+            try:
+                async for item in _iterate_in_threads(chunks):
+                    if item.response is None:
+                        yield sse_event({"type": "delta", "text": item.text})
+                        continue
+                    response = item.response
+                    await asyncio.to_thread(store_response, response_cache, cache_key, chat, response)
+                    usage = record_usage(*usage_tokens(chat, response), reserved=reserved)
+                    settled = True
+                    yield sse_event({"type": "done", **response_payload(response, usage, chat["chunks"],
+                                                                        route=chat["route"])})
+            finally:
+                # No next() is running here: a cancelled one is waited for, not abandoned
+                chunks.close()
+        except Exception as e:
+            print(f"Chat stream failed: {e}")
+            yield sse_event({"type": "error", "error": "The model provider failed mid-response."})
+        finally:
+            # Provider error or client disconnect: free the reservation
+            if not settled:
+                release_tokens(reserved)
+
+    return StreamingResponse(events(), media_type='text/event-stream', headers=headers)
+
+
+app = Starlette(routes=[
+    Route('/api/search', semantic_search, methods=['POST']),
+    Route('/chat/api/message', send_message, methods=['POST']),
+    Route('/chat/api/message/stream', stream_message, methods=['POST']),
+    Mount('/', app=WSGIMiddleware(flask_app)),
+])
@@ -1,5 +1,6 @@
 import os
 from flask import Blueprint, request, jsonify, current_app
+from config import settings as app_settings
 
 bp = Blueprint('api', __name__, url_prefix='/api')
 
@@ -16,8 +17,18 @@ def semantic_search():
     data = request.get_json()
     query = data['query']
     top_k = data.get('top_k', 5)
-    results = current_app.search_engine.search(query, top_k=top_k)
-    return jsonify({"results": results, "query": query})
+    mode = data.get('mode', app_settings.search_mode)
+    try:
+        results = current_app.search_engine.search(query, top_k=top_k, filters=data.get('filters'), mode=mode)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"results": results, "query": query, "mode": mode})
+
+
+@bp.route('/search/cache')
+def search_cache_stats():
+    """Return query-embedding cache hit/miss counters for this worker."""
+    return jsonify(current_app.search_engine.cache_stats())
 
 
 @bp.route('/providers')
@@ -26,6 +37,12 @@ def list_providers():
     return jsonify({"providers": providers})
 
 
+@bp.route('/providers/latency')
+def provider_latency():
+    """Per-provider latency histograms (p50/p95/p99, errors, timeouts) and prompt-cache hit rates for this worker."""
+    return jsonify(current_app.llm_registry.latency_stats())
+
+
 @bp.route('/models')
 def list_models():
     """Return full model catalog filtered to available providers."""
@@ -59,7 +76,8 @@ def heatmap_data():
 def usage_stats():
     """Return current daily token usage stats."""
     from usage_tracker import get_usage_stats
-    return jsonify(get_usage_stats())
+    cache = current_app.response_cache
+    return jsonify({**get_usage_stats(), "response_cache": cache.stats() if cache else None})
 
 
 @bp.route('/keys', methods=['GET'])
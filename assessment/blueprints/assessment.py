@@ -25,15 +25,11 @@ def submit_assessment():
     answers = request.get_json()
     score = score_assessment(answers)
     placement = get_placement(score)
-    # Store anonymous result (fire-and-forget)
-    try:
-        from storage import store_result
-        store_result(score['sae_level'], score['epias_stage'])
-    except Exception as e:
-        current_app.logger.warning(f"Failed to store result: {e}")
-    # Find relevant growth path chunks via search
-    query = f"growth path for SAE L{placement['sae_level']} {placement['epias_stage']}"
-    chunks = current_app.search_engine.search(query, top_k=5)
+    # Store anonymous result (queued; written in batches by the result writer)
+    if current_app.result_writer is not None:
+        current_app.result_writer.submit(score['sae_level'], score['epias_stage'])
+    # Growth path chunks are precomputed per matrix cell
+    chunks = current_app.search_engine.growth_chunks(placement['sae_level'], placement['epias_stage'], top_k=5)
     placement['growth_chunks'] = [{'text': c['text'], 'section': c.get('section_title', ''), 'source': c.get('source_file', '')} for c in chunks]
     return jsonify(placement)
 
@@ -1,27 +1,30 @@
 import os
-import time
-from collections import defaultdict
-from flask import Blueprint, render_template, request, jsonify, current_app
+from flask import Blueprint, Response, g, render_template, request, jsonify, current_app, stream_with_context
+from config import settings as app_settings
+from chat_service import (
+    build_chat_call, cached_response, compact_history, estimate_tokens, response_payload, route_model,
+    sse_event, store_response, usage_tokens,
+)
 from llm.models import get_model_info
-from usage_tracker import check_budget, record_usage
+from usage_tracker import record_usage, release_tokens, reserve_tokens
 
 bp = Blueprint('chat', __name__, url_prefix='/chat')
 
-# Simple in-memory rate limiter: max 30 messages per IP per hour
-_RATE_LIMIT = 30
-_RATE_WINDOW = 3600  # seconds
-_rate_log: dict[str, list[float]] = defaultdict(list)
 
+@bp.after_request
+def _add_rate_limit_headers(response):
+    result = g.get('rate_limit')
+    if result is not None:
+        response.headers.update(result.headers())
+    return response
 
-def _check_rate_limit(ip: str) -> bool:
-    """Return True if under the rate limit."""
-    now = time.time()
-    cutoff = now - _RATE_WINDOW
-    _rate_log[ip] = [t for t in _rate_log[ip] if t > cutoff]
-    if len(_rate_log[ip]) >= _RATE_LIMIT:
-        return False
-    _rate_log[ip].append(now)
-    return True
+
+def _rate_limited():
+    """429 response if the client is over the chat rate limit, else None."""
+    g.rate_limit = current_app.rate_limiter.check(_client_ip())
+    if not g.rate_limit.allowed:
+        return jsonify({"error": "Rate limit exceeded. Please try again later."}), 429
+    return None
 
 
 @bp.route('/')
@@ -40,71 +43,107 @@ def chat_page():
                            simple_mode=simple, model_label=model_label)
 
 
+def _client_ip() -> str:
+    return request.headers.get('X-Forwarded-For', request.remote_addr or '').split(',')[0].strip()
+
+
+def _prepare_chat(data: dict) -> dict:
+    """Retrieve context and build the provider call shared by both chat endpoints."""
+    search_engine = current_app.search_engine
+    chunks = search_engine.search(data['message'], top_k=app_settings.context_candidates)
+    data = route_model(current_app.model_router, current_app.llm_registry, data, chunks)
+    chat = build_chat_call(data, chunks)
+    # The vector retrieval just computed, for semantic response-cache lookups
+    chat["query_vector"] = search_engine.cached_query_vector(data['message'])
+    return chat
+
+
 @bp.route('/api/message', methods=['POST'])
 def send_message():
-    ip = request.headers.get('X-Forwarded-For', request.remote_addr or '').split(',')[0].strip()
-    if not _check_rate_limit(ip):
-        return jsonify({"error": "Rate limit exceeded. Please try again later."}), 429
+    limited = _rate_limited()
+    if limited:
+        return limited
+
+    chat = _prepare_chat(request.get_json())
+    provider = current_app.llm_registry.route(chat["provider_name"])
+
+    # Cache hits spend no tokens, so they are served even over budget
+    cache_key, cached = cached_response(current_app.response_cache, chat, provider)
+    if cached is not None:
+        usage = record_usage(0, 0, cache_hit=True)
+        return jsonify(response_payload(cached, usage, chat["chunks"], cached=True, route=chat["route"]))
+
+    # Reserve the turn's estimated tokens from the daily budget before calling LLM
+    reserved = estimate_tokens(chat)
+    if not reserve_tokens(reserved):
+        return jsonify({"error": "Daily token budget reached. Chat will resume tomorrow."}), 503
+
+    try:
+        compact_history(current_app.history_manager, chat, provider)
+        response = provider.generate(**chat["kwargs"])
+    except Exception:
+        release_tokens(reserved)
+        raise
+    store_response(current_app.response_cache, cache_key, chat, response)
+
+    # Record token usage (including any history summary), settling the reservation
+    usage = record_usage(*usage_tokens(chat, response), reserved=reserved)
+
+    return jsonify(response_payload(response, usage, chat["chunks"], route=chat["route"]))
+
+
+@bp.route('/api/message/stream', methods=['POST'])
+def stream_message():
+    """Same as send_message, but streams tokens as Server-Sent Events.
+
+    Events are JSON objects: {"type": "delta", "text": ...} per token chunk,
+    then one {"type": "done", ...} with the send_message payload, or
+    {"type": "error", "error": ...} if the provider fails mid-stream.
+    """
+    limited = _rate_limited()
+    if limited:
+        return limited
+
+    chat = _prepare_chat(request.get_json())
+    provider = current_app.llm_registry.route(chat["provider_name"])
+    cache = current_app.response_cache
+    cache_key, cached = cached_response(cache, chat, provider)
 
-    data = request.get_json()
-    user_message = data['message']
-    provider_name = data.get('provider', 'auto')
-    model_id = data.get('model')
-    reasoning_value = data.get('reasoning')
-    conversation_history = data.get('history', [])
-
-    # Retrieve relevant context chunks
-    chunks = current_app.search_engine.search(user_message, top_k=5)
-    context = "\n\n---\n\n".join(
-        f"[Source: {c.get('source_file','')}, Section: {c.get('section_title','')}]\n{c['text']}"
-        for c in chunks
-    )
-
-    system_prompt = (
-        "You are an expert on the Design in Tech Report 2026 E-P-I-A-S x SAE Framework "
-        "by John Maeda for AI upskilling product designers. Answer questions based on the "
-        "following framework content. Cite specific SAE levels and EPIAS stages when relevant. "
-        "Be helpful and concrete in your advice.\n\n"
-        f"FRAMEWORK CONTEXT:\n{context}"
-    )
-
-    # Build reasoning_config based on the model's parameter type
-    reasoning_config = None
-    if model_id and reasoning_value is not None:
-        info = get_model_info(model_id)
-        if info:
-            param_type = info.get("reasoning_param")
-            if param_type == "effort":
-                reasoning_config = {"effort": reasoning_value}
-            elif param_type == "thinking":
-                reasoning_config = {"thinking": reasoning_value}
-            elif param_type == "thinking_budget":
-                reasoning_config = {"thinking_budget": reasoning_value}
-            elif param_type == "thinking_level":
-                reasoning_config = {"thinking_level": reasoning_value}
-
-    # Check daily token budget before calling LLM
-    if not check_budget():
+    reserved = estimate_tokens(chat) if cached is None else 0
+    if cached is None and not reserve_tokens(reserved):
         return jsonify({"error": "Daily token budget reached. Chat will resume tomorrow."}), 503
 
-    provider = current_app.llm_registry.get_provider(provider_name)
-    response = provider.generate(
-        system_prompt=system_prompt,
-        messages=conversation_history + [{"role": "user", "content": user_message}],
-        model=model_id,
-        reasoning_config=reasoning_config,
-    )
-
-    # Record token usage
-    usage = record_usage(response.input_tokens or 0, response.output_tokens or 0)
-
-    return jsonify({
-        "response": response.text,
-        "provider": response.provider,
-        "model": response.model,
-        "latency_ms": response.latency_ms,
-        "input_tokens": response.input_tokens,
-        "output_tokens": response.output_tokens,
-        "usage": usage,
-        "sources": [{"file": c.get('source_file',''), "section": c.get('section_title','')} for c in chunks],
+    def cached_events():
+        usage = record_usage(0, 0, cache_hit=True)
+        yield sse_event({"type": "delta", "text": cached.text})
+        yield sse_event({"type": "done", **response_payload(cached, usage, chat["chunks"], cached=True,
+                                                        route=chat["route"])})
+
+    history_manager = current_app.history_manager
+
+    def events():
+        settled = False
+        try:
+            compact_history(history_manager, chat, provider)
+            for item in provider.stream(**chat["kwargs"]):
+                if item.response is None:
+                    yield sse_event({"type": "delta", "text": item.text})
+                    continue
+                # Usage is only known once the stream has finished
+                response = item.response
+                store_response(cache, cache_key, chat, response)
+                usage = record_usage(*usage_tokens(chat, response), reserved=reserved)
+                settled = True
+                yield sse_event({"type": "done", **response_payload(response, usage, chat["chunks"], route=chat["route"])})
+        except Exception as e:
+            current_app.logger.warning(f"Chat stream failed: {e}")
+            yield sse_event({"type": "error", "error": "The model provider failed mid-response."})
+        finally:
+            # Provider error or client disconnect: free the reservation
+            if not settled:
+                release_tokens(reserved)
+
+    return Response(stream_with_context(events() if cached is None else cached_events()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
     })
@@ -0,0 +1,189 @@
+"""Framework-independent pieces of a chat turn, shared by the Flask and ASGI endpoints."""
+import json
+
+from config import settings
+from embeddings.context import pack_context
+from llm.models import get_context_budget, get_model_info
+
+
+def build_reasoning_config(model_id, reasoning_value):
+    """Build reasoning_config based on the model's parameter type."""
+    if not model_id or reasoning_value is None:
+        return None
+    info = get_model_info(model_id)
+    if not info:
+        return None
+    param_type = info.get("reasoning_param")
+    if param_type == "effort":
+        return {"effort": reasoning_value}
+    elif param_type == "thinking":
+        return {"thinking": reasoning_value}
+    elif param_type == "thinking_budget":
+        return {"thinking_budget": reasoning_value}
+    elif param_type == "thinking_level":
+        return {"thinking_level": reasoning_value}
+    return None
+
+
+SYSTEM_PROMPT = (
+    "You are an expert on the Design in Tech Report 2026 E-P-I-A-S x SAE Framework "
+    "by John Maeda for AI upskilling product designers. Answer questions based on the "
+    "framework content provided with each question. Cite specific SAE levels and EPIAS "
+    "stages when relevant. Be helpful and concrete in your advice."
+)
+
+
+def build_user_turn(chunks: list, message: str) -> str:
+    """The volatile part of the prompt: retrieved framework context plus the question.
+
+    Keeping retrieval results out of the system prompt leaves the system
+    prompt and earlier turns as a stable prefix that providers can serve
+    from their prompt caches on every follow-up turn.
+    """
+    context = "\n\n---\n\n".join(
+        f"[Source: {c.get('source_file','')}, Section: {c.get('section_title','')}]\n{c['text']}"
+        for c in chunks
+    )
+    return f"FRAMEWORK CONTEXT:\n{context}\n\nQUESTION:\n{message}"
+
+
+def pack_chunks(chunks: list, model_id: str | None) -> list:
+    """Pack retrieved chunks into the model's context token budget."""
+    return pack_context(
+        chunks,
+        get_context_budget(model_id, settings.context_token_budget),
+        min_relative_score=settings.context_min_relative_score,
+    )
+
+
+def route_model(router, registry, data: dict, chunks: list) -> dict:
+    """Request data with the model and reasoning the model router picked.
+
+    Returns data unchanged when routing is off or leaves this request
+    alone; otherwise a copy naming the concrete provider, the routed model
+    and reasoning, plus the decision under "route".
+    """
+    if router is None:
+        return data
+    provider = registry.get_provider(data.get('provider', 'auto'))
+    choice = router.choose(provider.name, data, chunks)
+    if choice is None:
+        return data
+    return {**data, "provider": provider.name, "model": choice["model"],
+            "reasoning": choice["reasoning"], "route": choice}
+
+
+def build_chat_call(data: dict, chunks: list) -> dict:
+    """Provider name and generate()/stream() kwargs for a chat request body.
+
+    chunks are the raw search results (settings.context_candidates of
+    them); only those that pack into the model's budget are sent.
+    """
+    model_id = data.get('model')
+    chunks = pack_chunks(chunks, model_id)
+    return {
+        "provider_name": data.get('provider', 'auto'),
+        "question": data['message'],
+        "first_turn": not data.get('history'),
+        "chunks": chunks,
+        "route": data.get('route'),
+        "kwargs": {
+            "system_prompt": SYSTEM_PROMPT,
+            "messages": data.get('history', []) + [
+                {"role": "user", "content": build_user_turn(chunks, data['message'])},
+            ],
+            "model": model_id,
+            "reasoning_config": build_reasoning_config(model_id, data.get('reasoning')),
+        },
+    }
+
+
+def compact_history(manager, chat: dict, provider) -> None:
+    """Replace turns that overflow the history budget with a rolling summary.
+
+    Updates chat["kwargs"] in place and records the tokens spent on the
+    summary in chat["extra_usage"] (see usage_tokens()). The summary goes at
+    the start of the new user turn, after the provider's cache breakpoints,
+    so it never changes the cached system prompt.
+    """
+    kwargs = chat["kwargs"]
+    history = kwargs["messages"][:-1]
+    chat["extra_usage"] = (0, 0)
+    if manager is None or not history:
+        return
+    recent, summary, usage = manager.compact(history, provider)
+    turn = kwargs["messages"][-1]
+    if summary:
+        turn = {**turn, "content": f"EARLIER IN THIS CONVERSATION (summary):\n{summary}\n\n{turn['content']}"}
+    kwargs["messages"] = recent + [turn]
+    chat["extra_usage"] = usage
+
+
+def estimate_tokens(chat: dict) -> int:
+    """Tokens to reserve from the daily budget before calling the provider.
+
+    The prompt at ~4 characters per token plus the expected answer length.
+    """
+    kwargs = chat["kwargs"]
+    chars = len(kwargs["system_prompt"]) + sum(len(m["content"]) for m in kwargs["messages"])
+    return chars // 4 + settings.chat_output_token_estimate
+
+
+def usage_tokens(chat: dict, response) -> tuple:
+    """(input, output) tokens to record for a turn, including history summaries."""
+    extra_in, extra_out = chat.get("extra_usage", (0, 0))
+    return (response.input_tokens or 0) + extra_in, (response.output_tokens or 0) + extra_out
+
+
+def cached_response(cache, chat: dict, provider) -> tuple:
+    """Look a chat turn up in the response cache (exact, then semantic).
+
+    Returns (key, response): key is None when the turn is not cacheable
+    (cache disabled, or a follow-up turn with history); response is None
+    on a miss. Sets chat["cache_scope"] for store_response().
+    """
+    if cache is None or not chat["first_turn"]:
+        return None, None
+    kwargs = chat["kwargs"]
+    scope = cache.scope(provider.name, kwargs["model"] or provider.default_model,
+                        kwargs["reasoning_config"])
+    chat["cache_scope"] = scope
+    key = cache.key(scope, chat["question"], [c.get('chunk_id') for c in chat["chunks"]])
+    return key, cache.get(key, scope=scope, query_vector=chat.get("query_vector"))
+
+
+def store_response(cache, key: str | None, chat: dict, response) -> None:
+    """Cache a fresh response under the key from cached_response().
+
+    Responses the provider cut short (incomplete_reason set) are never cached.
+    """
+    if key and response.incomplete_reason is None:
+        cache.put(key, response, scope=chat["cache_scope"], query_vector=chat.get("query_vector"))
+
+
+def response_payload(response, usage: dict, chunks: list, cached: bool = False,
+                     route: dict | None = None) -> dict:
+    """JSON body returned to the chat UI for a finished response.
+
+    route is the model router's decision (chat["route"]), if any.
+    """
+    return {
+        "response": response.text,
+        "provider": response.provider,
+        "model": response.model,
+        "latency_ms": response.latency_ms,
+        "first_token_ms": response.first_token_ms,
+        "input_tokens": response.input_tokens,
+        "cached_input_tokens": response.cached_input_tokens,
+        "output_tokens": response.output_tokens,
+        "usage": usage,
+        "cached": cached,
+        "incomplete_reason": response.incomplete_reason,
+        "route": {"tier": route["tier"], **route["signals"]} if route else None,
+        "sources": [{"file": c.get('source_file',''), "section": c.get('section_title','')} for c in chunks],
+    }
+
+
+def sse_event(payload: dict) -> str:
+    """One Server-Sent Event carrying a JSON payload."""
+    return f"data: {json.dumps(payload)}\n\n"
@@ -24,12 +24,127 @@ class Settings(BaseSettings):
     # Default provider (auto-detect if not set)
     default_provider: Optional[str] = None
 
+    # Shared HTTP client pools (llm/clients.py): connections kept alive per
+    # API host, and read/connect timeouts in seconds
+    http_pool_size: int = 20
+    http_timeout: float = 120.0
+    http_connect_timeout: float = 10.0
+
+    # asgi.py: threads that pull chunks from blocking provider streams for
+    # the native SSE endpoint (one per stream waiting on its next chunk)
+    asgi_stream_threads: int = 200
+
+    # RAG context packing: retrieve CONTEXT_CANDIDATES chunks, then pack the
+    # best of them into at most CONTEXT_TOKEN_BUDGET tokens (per-model
+    # overrides in llm/models.py), dropping chunks scoring below
+    # CONTEXT_MIN_RELATIVE_SCORE x the top hit
+    context_candidates: int = 8
+    context_token_budget: int = 1200
+    context_min_relative_score: float = 0.6
+
+    # Chat history compaction: recent turns are sent verbatim up to this many
+    # tokens, older ones as a rolling summary (0 = send full history)
+    history_token_budget: int = 2000
+    history_summary_words: int = 200
+
+    # Output tokens assumed when reserving a chat turn's cost from the daily
+    # budget before the call (settled with the actual usage afterwards)
+    chat_output_token_estimate: int = 1000
+
+    # Daily budget accounting (usage_tracker.py): workers lease the budget in
+    # blocks of USAGE_LEASE_TOKENS and flush usage every USAGE_FLUSH_INTERVAL s
+    usage_lease_tokens: int = 20000
+    usage_flush_interval: float = 2.0
+
+    # Chat rate limit per client IP: RATE_LIMIT_REQUESTS per sliding
+    # RATE_LIMIT_WINDOW seconds. Backend: memory (per worker) | sqlite (one
+    # file shared by all workers on the instance)
+    rate_limit_backend: str = "memory"
+    rate_limit_requests: int = 30
+    rate_limit_window: float = 3600
+    rate_limit_path: Path = Path(__file__).parent / "data" / "cache" / "rate_limits.sqlite3"
+    rate_limit_max_keys: int = 100000
+
+    # Chat response cache: off | memory (per worker) | sqlite (shared file)
+    response_cache_backend: str = "off"
+    response_cache_size: int = 2048
+    response_cache_ttl: float = 86400
+    response_cache_path: Path = Path(__file__).parent / "data" / "cache" / "responses.sqlite3"
+    # Cosine threshold for reusing the answer to a paraphrased first-turn
+    # question (e.g. 0.95); unset = exact matches only
+    response_cache_similarity: Optional[float] = None
+
+    # Provider availability cache (seconds): healthy providers are re-probed
+    # every TTL, unavailable ones back off exponentially up to MAX_BACKOFF;
+    # the background checker wakes every INTERVAL to run due probes
+    provider_health_ttl: float = 30.0
+    provider_health_max_backoff: float = 300.0
+    provider_health_interval: float = 5.0
+
+    # Chat routing across providers: off | fallback | hedge (llm/routing.py).
+    # Per-provider latency SLOs in ms, e.g. LLM_SLO_MS='{"openai": 30000}';
+    # hedging fires a fallback once the primary exceeds its p95 latency
+    # (never sooner than LLM_HEDGE_MIN_MS). Streams must send their first
+    # token within the SLO. Routed calls run on a pool of LLM_ROUTING_WORKERS
+    # threads (unused when routing is off)
+    llm_routing: str = "off"
+    llm_slo_ms: dict[str, float] = {}
+    llm_default_slo_ms: float = 60000
+    llm_hedge_min_ms: float = 2000
+    llm_max_fallbacks: int = 1
+    llm_routing_workers: int = 32
+
+    # Model choice by question complexity (llm/model_router.py): off | auto
+    # (requests without a model) | force (all requests). Below RESERVE of the
+    # daily budget left, complex questions get the standard tier; below
+    # ECONOMY, everything gets the simple tier
+    model_routing: str = "off"
+    model_routing_reserve: float = 0.5
+    model_routing_economy: float = 0.2
+
+    # Load testing: register a fake provider with this simulated latency
+    # (see scripts/load_test.py). Never set in production.
+    fake_llm_latency_ms: Optional[int] = None
+
     # Firestore
     firestore_enabled: bool = False
 
+    # Results/usage storage (storage.py): off | firestore | sqlite. Unset =
+    # firestore if FIRESTORE_ENABLED else off. sqlite keeps everything in
+    # STORAGE_PATH, shared by the workers of one instance
+    storage_backend: Optional[str] = None
+    storage_path: Path = Path(__file__).parent / "data" / "storage.sqlite3"
+
+    # Assessment results are written behind the request in batches: a flush
+    # runs every RESULT_FLUSH_INTERVAL seconds or at RESULT_BATCH_SIZE queued
+    # results; beyond RESULT_QUEUE_SIZE, or while writes fail, results are
+    # spilled to RESULT_SPILL_DIR and replayed later
+    result_batch_size: int = 200
+    result_flush_interval: float = 2.0
+    result_queue_size: int = 10000
+    result_spill_dir: Path = Path(__file__).parent / "data" / "spill"
+
     # Embedding
     embedding_model: str = "text-embedding-3-large"
     embedding_dimensions: int = 3072
+    # Local ONNX sentence encoders (EMBEDDER local), one directory per model
+    # holding model.onnx + tokenizer.json (scripts/download_local_encoder.py)
+    local_encoder_dir: Path = Path(__file__).parent / "data" / "models"
+
+    # Query-embedding cache (set query_cache_path to persist across worker restarts)
+    query_cache_size: int = 1024
+    query_cache_path: Optional[Path] = None
+
+    # Default retrieval mode for /api/search: dense | sparse | hybrid
+    search_mode: str = "dense"
+
+    # IVF clusters probed per query (only used when the index was built with --index ivf)
+    search_nprobe: int = 8
+
+    # Resolve growth-path chunks for all matrix cells at startup (one batched
+    # embedding call) if the manifest does not already carry them; when off,
+    # each cell is embedded on its first assessment
+    precompute_growth_paths: bool = True
 
     # Paths — source_dir points to repo's v-0.0.1/ so content stays in sync
     data_dir: Path = Path(__file__).parent / "data"
@@ -0,0 +1,66 @@
+"""Sparse BM25 retrieval over an inverted index, plus reciprocal rank fusion."""
+import re
+from collections import Counter, defaultdict
+
+import numpy as np
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-'][a-z0-9]+)*")
+
+
+def tokenize(text: str) -> list:
+    """Lowercase word tokens without English stop words ('L2', 'IDE' survive)."""
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in ENGLISH_STOP_WORDS]
+
+
+class BM25Index:
+    """Okapi BM25 over an inverted index of term -> (doc ids, term frequencies).
+
+    Query cost is proportional to the postings of the query terms, not the
+    corpus size, so it stays fast and fully local as the corpus grows.
+    """
+
+    def __init__(self, texts: list, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.n_docs = len(texts)
+        postings = defaultdict(lambda: ([], []))
+        lengths = np.zeros(self.n_docs, dtype=np.float32)
+        for doc_id, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            lengths[doc_id] = sum(counts.values())
+            for term, tf in counts.items():
+                ids, tfs = postings[term]
+                ids.append(doc_id)
+                tfs.append(tf)
+        avg_len = float(lengths.mean()) if self.n_docs else 0.0
+        # Per-document length normalization, folded in once at build time
+        self._norm = k1 * (1 - b + b * lengths / max(avg_len, 1e-9))
+        self._postings = {}
+        for term, (ids, tfs) in postings.items():
+            df = len(ids)
+            idf = np.log(1 + (self.n_docs - df + 0.5) / (df + 0.5))
+            self._postings[term] = (np.array(ids, dtype=np.int64), np.array(tfs, dtype=np.float32), idf)
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every document for the query (0 where no term matches)."""
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            ids, tfs, idf = posting
+            scores[ids] += idf * tfs * (self.k1 + 1) / (tfs + self._norm[ids])
+        return scores
+
+
+def reciprocal_rank_fusion(rankings: list, k: int = 60) -> dict:
+    """Fuse ranked lists of doc ids: score(d) = sum over lists of 1 / (k + rank).
+
+    Returns {doc_id: fused_score}.
+    """
+    fused = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            fused[int(doc_id)] += 1.0 / (k + rank)
+    return dict(fused)
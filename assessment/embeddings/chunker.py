@@ -1,4 +1,5 @@
 """Markdown-aware chunker for DIT framework content."""
+import hashlib
 import re
 from pathlib import Path
 from dataclasses import dataclass, field, asdict
@@ -16,6 +17,11 @@ class Chunk:
     sae_level: Optional[int] = None
     epias_stage: Optional[str] = None
     chunk_type: str = "prose"
+    content_hash: str = ""
+
+def content_hash(text: str) -> str:
+    """Stable hash of chunk text; unchanged chunks keep their embeddings."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
 
 class MarkdownChunker:
     MAX_TOKENS = 400
@@ -66,6 +72,7 @@ class MarkdownChunker:
                     sae_level=sae_level,
                     epias_stage=epias_stage,
                     chunk_type=chunk_type,
+                    content_hash=content_hash(sub_text.strip()),
                 ))
         return chunks
 
@@ -0,0 +1,63 @@
+"""Token-budgeted assembly of retrieved chunks into prompt context."""
+from embeddings.bm25 import tokenize
+
+# Chunks scoring below this fraction of the best hit are dropped. Relative,
+# so one floor works for cosine, BM25 and RRF scores alike.
+DEFAULT_MIN_RELATIVE_SCORE = 0.6
+
+# Skip a chunk when this share of its word bigrams already appears in a
+# chunk that was packed (repeated tables or paragraphs across source files)
+DEFAULT_MAX_OVERLAP = 0.6
+
+
+def _shingles(text: str) -> set:
+    words = tokenize(text)
+    return set(zip(words, words[1:])) or set(words)
+
+
+def _token_count(chunk: dict) -> int:
+    # Manifest chunks carry token_count; ~4 characters per token otherwise
+    return chunk.get("token_count") or len(chunk["text"]) // 4
+
+
+def pack_context(chunks: list, token_budget: int,
+                 min_relative_score: float = DEFAULT_MIN_RELATIVE_SCORE,
+                 max_overlap: float = DEFAULT_MAX_OVERLAP) -> list:
+    """Select the best chunks that fit within token_budget.
+
+    Args:
+        chunks: Search results, best first (each with "text", "score" and
+            ideally "token_count")
+        token_budget: Maximum total token_count of the packed chunks
+        min_relative_score: Drop chunks scoring below this fraction of the top score
+        max_overlap: Drop chunks whose bigram overlap with a packed chunk exceeds this
+
+    Returns:
+        The packed chunks in rank order. The top chunk is always kept, even
+        if it alone exceeds the budget, so a matching question never gets
+        an empty context.
+    """
+    if not chunks:
+        return []
+    top_score = chunks[0].get("score", 0.0)
+    floor = top_score * min_relative_score if top_score > 0 else float("-inf")
+
+    packed, packed_shingles, used = [], [], 0
+    for chunk in chunks:
+        if packed and chunk.get("score", 0.0) < floor:
+            break
+        tokens = _token_count(chunk)
+        if packed and used + tokens > token_budget:
+            continue  # a smaller, lower-ranked chunk may still fit
+        shingles = _shingles(chunk["text"])
+        if any(len(shingles & seen) > max_overlap * max(1, len(shingles)) for seen in packed_shingles):
+            continue
+        packed.append(chunk)
+        packed_shingles.append(shingles)
+        used += tokens
+    return packed
+
+
+def context_tokens(chunks: list) -> int:
+    """Total token_count of a list of chunks."""
+    return sum(_token_count(c) for c in chunks)
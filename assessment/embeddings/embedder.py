@@ -0,0 +1,293 @@
+"""Pluggable text embedders shared by index generation and query-time search.
+
+- OpenAIEmbedder:  text-embedding-3-large (or another OpenAI model) over the API
+- OnnxEmbedder:    local CPU sentence encoder (all-MiniLM-L6-v2 exported to
+                   ONNX) run with onnxruntime; semantic, no network. Model
+                   files come from scripts/download_local_encoder.py
+- HashingEmbedder: lexical n-gram hashing in pure NumPy, for machines
+                   without the encoder; not semantic
+
+The embedder that built an index is recorded in manifest.json under
+"embedder" ({"name", "model", "dimensions"}), and SearchEngine embeds
+queries with the same one so vectors stay comparable.
+"""
+import asyncio
+import hashlib
+import os
+import re
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+import numpy as np
+
+OPENAI_BATCH_SIZE = 100
+# OpenAI rejects inputs over ~8K tokens; truncate characters conservatively
+OPENAI_MAX_CHARS = 8000
+
+LOCAL_MODEL = "all-MiniLM-L6-v2"
+LOCAL_DIMENSIONS = 384
+# Texts per onnxruntime call, and tokens kept per text (the model was trained on 256)
+LOCAL_BATCH_SIZE = 32
+LOCAL_MAX_TOKENS = 256
+
+
+class Embedder(ABC):
+    """Abstract base for text embedders."""
+
+    # True when vectors only encode surface word/character overlap (no meaning)
+    lexical = False
+
+    @property
+    @abstractmethod
+    def name(self) -> str:
+        """Backend name as stored in the manifest ('openai', 'local', 'hashing')."""
+        ...
+
+    @property
+    @abstractmethod
+    def model(self) -> str:
+        """Model identifier (also used as the query-cache key)."""
+        ...
+
+    @property
+    @abstractmethod
+    def dimensions(self) -> int:
+        ...
+
+    @abstractmethod
+    def embed(self, texts: list) -> np.ndarray:
+        """Embed a batch of texts into an (N, dimensions) float32 array."""
+        ...
+
+    async def aembed(self, texts: list) -> np.ndarray:
+        """Async embed(). The default runs embed() in a worker thread."""
+        return await asyncio.to_thread(self.embed, texts)
+
+    def is_available(self) -> bool:
+        """Check if this embedder can run right now."""
+        return True
+
+    def describe(self) -> dict:
+        """The manifest "embedder" entry."""
+        return {"name": self.name, "model": self.model, "dimensions": self.dimensions}
+
+
+class OpenAIEmbedder(Embedder):
+    """OpenAI embeddings API, batched OPENAI_BATCH_SIZE texts per request."""
+
+    def __init__(self, model: str = "text-embedding-3-large", dimensions: int = 3072):
+        self._model = model
+        self._dimensions = dimensions
+
+    @property
+    def name(self) -> str:
+        return "openai"
+
+    @property
+    def model(self) -> str:
+        return self._model
+
+    @property
+    def dimensions(self) -> int:
+        return self._dimensions
+
+    def embed(self, texts: list) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self._dimensions), dtype=np.float32)
+        from llm.clients import openai_client
+        client = openai_client()
+        vectors = []
+        for i in range(0, len(texts), OPENAI_BATCH_SIZE):
+            batch = [t[:OPENAI_MAX_CHARS] for t in texts[i:i + OPENAI_BATCH_SIZE]]
+            response = client.embeddings.create(input=batch, model=self._model)
+            vectors.extend(r.embedding for r in response.data)
+        return np.array(vectors, dtype=np.float32)
+
+    async def aembed(self, texts: list) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self._dimensions), dtype=np.float32)
+        from llm.clients import async_openai_client
+        client = async_openai_client()
+        vectors = []
+        for i in range(0, len(texts), OPENAI_BATCH_SIZE):
+            batch = [t[:OPENAI_MAX_CHARS] for t in texts[i:i + OPENAI_BATCH_SIZE]]
+            response = await client.embeddings.create(input=batch, model=self._model)
+            vectors.extend(r.embedding for r in response.data)
+        return np.array(vectors, dtype=np.float32)
+
+    def is_available(self) -> bool:
+        return bool(os.environ.get("OPENAI_API_KEY"))
+
+
+class OnnxEmbedder(Embedder):
+    """Local CPU sentence encoder: a MiniLM transformer run with onnxruntime.
+
+    model_dir holds the ONNX export (model.onnx) and its tokenizer.json.
+    Both are loaded once per process, on first use, and shared by every
+    OnnxEmbedder for that directory. Texts are tokenized and run in batches
+    of LOCAL_BATCH_SIZE (padded to the longest text in the batch); token
+    vectors are mean-pooled over the attention mask and L2-normalized, as
+    sentence-transformers does for this model.
+
+    Needs the optional onnxruntime and tokenizers packages.
+    """
+
+    _sessions: dict = {}  # model_dir -> (tokenizer, session, input names)
+    _load_lock = threading.Lock()
+
+    def __init__(self, model_dir: Path, model: str = LOCAL_MODEL, dimensions: int = LOCAL_DIMENSIONS):
+        self.model_dir = Path(model_dir)
+        self._model = model
+        self._dimensions = dimensions
+
+    @property
+    def name(self) -> str:
+        return "local"
+
+    @property
+    def model(self) -> str:
+        return self._model
+
+    @property
+    def dimensions(self) -> int:
+        return self._dimensions
+
+    def _load(self) -> tuple:
+        key = str(self.model_dir)
+        with self._load_lock:
+            if key not in self._sessions:
+                import onnxruntime
+                from tokenizers import Tokenizer
+                tokenizer = Tokenizer.from_file(str(self.model_dir / "tokenizer.json"))
+                tokenizer.enable_truncation(max_length=LOCAL_MAX_TOKENS)
+                tokenizer.enable_padding()
+                session = onnxruntime.InferenceSession(str(self.model_dir / "model.onnx"),
+                                                       providers=["CPUExecutionProvider"])
+                inputs = {i.name for i in session.get_inputs()}
+                self._sessions[key] = (tokenizer, session, inputs)
+            return self._sessions[key]
+
+    def embed(self, texts: list) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self._dimensions), dtype=np.float32)
+        tokenizer, session, inputs = self._load()
+        out = []
+        for i in range(0, len(texts), LOCAL_BATCH_SIZE):
+            encodings = tokenizer.encode_batch(texts[i:i + LOCAL_BATCH_SIZE])
+            mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+            feed = {
+                "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+                "attention_mask": mask,
+                "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+            }
+            tokens = session.run(None, {k: v for k, v in feed.items() if k in inputs})[0]
+            weights = mask[:, :, None].astype(np.float32)
+            pooled = (tokens * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+            out.append(pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12))
+        return np.concatenate(out).astype(np.float32)
+
+    def is_available(self) -> bool:
+        if str(self.model_dir) in self._sessions:
+            return True
+        try:
+            import onnxruntime  # noqa: F401
+            import tokenizers  # noqa: F401
+        except ImportError:
+            return False
+        return (self.model_dir / "model.onnx").exists() and (self.model_dir / "tokenizer.json").exists()
+
+
+class HashingEmbedder(Embedder):
+    """Lexical CPU fallback: signed feature hashing of word and character n-grams.
+
+    Each text is mapped to word unigrams, word bigrams and character
+    trigrams, hashed into ``dimensions`` buckets with a +/-1 sign, weighted
+    by sublinear term frequency and L2-normalized. It needs no weights,
+    embeds a query in well under a millisecond, and never leaves the box.
+
+    This is a lexical model, not a semantic one: two texts are close only
+    when they share words or sub-word fragments, so synonyms and
+    paraphrases do not match. "Dense" search with it is a fuzzy keyword
+    search (tolerant of inflections and typos), and hybrid mode adds little
+    over BM25 alone. Use OnnxEmbedder ('local') for semantic search offline.
+    """
+
+    lexical = True
+
+    _WORD_RE = re.compile(r"[a-z0-9]+")
+
+    def __init__(self, dimensions: int = 1024):
+        self._dimensions = dimensions
+
+    @property
+    def name(self) -> str:
+        return "hashing"
+
+    @property
+    def model(self) -> str:
+        return f"hashing-ngram-{self._dimensions}"
+
+    @property
+    def dimensions(self) -> int:
+        return self._dimensions
+
+    def _features(self, text: str) -> list:
+        words = self._WORD_RE.findall(text.lower())
+        features = list(words)
+        features += [f"{a} {b}" for a, b in zip(words, words[1:])]
+        for word in words:
+            padded = f"#{word}#"
+            features += [padded[i:i + 3] for i in range(len(padded) - 2)]
+        return features
+
+    def _hash(self, feature: str) -> int:
+        # blake2b rather than hash(): stable across processes and restarts
+        return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+
+    def embed(self, texts: list) -> np.ndarray:
+        out = np.zeros((len(texts), self._dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            counts = {}
+            for feature in self._features(text):
+                counts[feature] = counts.get(feature, 0) + 1
+            if not counts:
+                continue
+            hashes = np.array([self._hash(f) for f in counts], dtype=np.uint64)
+            buckets = (hashes % np.uint64(self._dimensions)).astype(np.int64)
+            signs = np.where((hashes >> np.uint64(63)) & np.uint64(1), -1.0, 1.0).astype(np.float32)
+            weights = 1.0 + np.log(np.fromiter(counts.values(), dtype=np.float32))
+            np.add.at(out[row], buckets, signs * weights)
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        return out / np.maximum(norms, 1e-12)
+
+
+def create_embedder(spec: dict | str | None = None) -> Embedder:
+    """Build an embedder from a manifest entry or backend name.
+
+    Args:
+        spec: {"name": ..., "model": ..., "dimensions": ...}, a backend name
+            ('openai', 'local' or 'hashing'), or None for the OpenAI default
+
+    'openai' and 'local' (the ONNX sentence encoder, model files under
+    settings.local_encoder_dir/<model>) are semantic; 'hashing' is the
+    lexical n-gram fallback.
+    """
+    if spec is None or isinstance(spec, str):
+        spec = {"name": spec or "openai"}
+    name = spec.get("name", "openai")
+    model = spec.get("model") or ""
+    if name == "openai":
+        return OpenAIEmbedder(
+            model=model or "text-embedding-3-large",
+            dimensions=spec.get("dimensions", 3072),
+        )
+    # Indexes built before the ONNX encoder recorded hashing as "local"
+    if name == "hashing" or (name == "local" and model.startswith("hashing-ngram")):
+        return HashingEmbedder(dimensions=spec.get("dimensions", 1024))
+    if name == "local":
+        from config import settings
+        model = model or LOCAL_MODEL
+        return OnnxEmbedder(settings.local_encoder_dir / model, model=model,
+                            dimensions=spec.get("dimensions", LOCAL_DIMENSIONS))
+    raise ValueError(f"Unknown embedder: {name}. Use 'openai', 'local' or 'hashing'.")
@@ -1,39 +1,256 @@
-"""Generate embeddings for DIT framework chunks using OpenAI."""
+"""Generate embeddings for DIT framework chunks with a pluggable embedder.
+
+Batches are embedded concurrently (bounded in-flight requests), retried
+with adaptive backoff on rate limits and transient errors, and each
+finished batch is checkpointed to disk so an interrupted run resumes
+where it stopped.
+"""
+import hashlib
 import json
+import os
+import random
+import threading
 import numpy as np
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from openai import OpenAI
 
-MODEL = "text-embedding-3-large"
-DIMENSIONS = 3072
+from embeddings.embedder import Embedder, OpenAIEmbedder
+from embeddings.index import build_index
+from embeddings.chunker import content_hash
+from embeddings.store import LEGACY_FILE, open_vectors, save_vectors
+
 BATCH_SIZE = 100
+MAX_WORKERS = 4
+MAX_RETRIES = 6
+
+_RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class _Backoff:
+    """Cooldown shared by all workers: a rate limit on one batch slows every batch."""
+
+    def __init__(self, base: float = 0.5, cap: float = 60.0):
+        self.base = base
+        self.cap = cap
+        self._delay = base
+        self._until = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            remaining = self._until - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+
+    def penalize(self, retry_after: float | None = None):
+        with self._lock:
+            self._delay = min(self._delay * 2, self.cap)
+            delay = retry_after if retry_after else self._delay * random.uniform(0.5, 1.0)
+            self._until = max(self._until, time.monotonic() + delay)
+
+    def relax(self):
+        with self._lock:
+            self._delay = max(self.base, self._delay / 2)
+
+
+def _status_code(exc: Exception) -> int | None:
+    return getattr(exc, "status_code", None) or getattr(getattr(exc, "response", None), "status_code", None)
+
+
+def _is_retryable(exc: Exception) -> bool:
+    """Rate limits, timeouts, connection drops and 5xx are worth retrying."""
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return True
+    if type(exc).__name__ in ("APIConnectionError", "APITimeoutError", "RateLimitError"):
+        return True
+    return _status_code(exc) in _RETRYABLE_STATUS
+
+
+def _retry_after(exc: Exception) -> float | None:
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _batch_key(embedder: Embedder, batch: list) -> str:
+    """Checkpoint file key: content hash, so re-chunking never reuses a stale batch."""
+    digest = hashlib.sha256(embedder.model.encode("utf-8"))
+    for text in batch:
+        digest.update(b"\0" + text.encode("utf-8"))
+    return digest.hexdigest()[:24]
+
+
+def _embed_batch(embedder: Embedder, batch: list, backoff: _Backoff, max_retries: int) -> np.ndarray:
+    for attempt in range(max_retries + 1):
+        backoff.wait()
+        try:
+            vectors = embedder.embed(batch)
+        except Exception as e:
+            if attempt == max_retries or not _is_retryable(e):
+                raise
+            backoff.penalize(_retry_after(e))
+            print(f"  batch retry {attempt + 1}/{max_retries}: {type(e).__name__}")
+            continue
+        backoff.relax()
+        return vectors
+
 
-def get_embeddings(texts: list) -> np.ndarray:
-    """Embed texts using OpenAI API in batches."""
+def get_embeddings(texts: list, embedder: Embedder = None, max_workers: int = MAX_WORKERS,
+                   checkpoint_dir: Path = None, max_retries: int = MAX_RETRIES) -> np.ndarray:
+    """Embed texts in concurrent batches (OpenAI text-embedding-3-large by default).
+
+    Args:
+        texts: Texts to embed
+        embedder: Embedding backend
+        max_workers: Maximum batches in flight at once
+        checkpoint_dir: If set, each finished batch is saved here and reused
+            on the next run instead of being re-embedded
+        max_retries: Retries per batch on rate limits / transient errors
+    """
+    embedder = embedder or OpenAIEmbedder()
     if not texts:
-        return np.array([], dtype=np.float32).reshape(0, DIMENSIONS)
-    client = OpenAI()
-    all_embeddings = []
-    for i in range(0, len(texts), BATCH_SIZE):
-        batch = texts[i:i + BATCH_SIZE]
-        batch = [t[:8000] if len(t) > 8000 else t for t in batch]
-        response = client.embeddings.create(input=batch, model=MODEL)
-        embeddings = [r.embedding for r in response.data]
-        all_embeddings.extend(embeddings)
-        if i + BATCH_SIZE < len(texts):
-            time.sleep(0.2)
-    return np.array(all_embeddings, dtype=np.float32)
-
-def save_embeddings(embeddings: np.ndarray, manifest: list, output_dir: Path):
-    """Save embeddings.npy + manifest.json."""
+        return np.array([], dtype=np.float32).reshape(0, embedder.dimensions)
+    batches = [texts[i:i + BATCH_SIZE] for i in range(0, len(texts), BATCH_SIZE)]
+    if checkpoint_dir:
+        checkpoint_dir.mkdir(parents=True, exist_ok=True)
+    backoff = _Backoff()
+
+    def run(batch) -> tuple:
+        """(vectors, whether they came from a checkpoint)."""
+        path = checkpoint_dir / f"{_batch_key(embedder, batch)}.npy" if checkpoint_dir else None
+        if path and path.exists():
+            return np.load(path), True
+        vectors = np.asarray(_embed_batch(embedder, batch, backoff, max_retries), dtype=np.float32)
+        if path:
+            tmp = path.with_suffix(".tmp.npy")
+            np.save(tmp, vectors)
+            tmp.replace(path)
+        return vectors, False
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        outcomes = list(pool.map(run, batches))
+    results = [vectors for vectors, _ in outcomes]
+    # Counted here, on the calling thread, from the workers' results
+    resumed = sum(from_checkpoint for _, from_checkpoint in outcomes)
+    if resumed:
+        print(f"  resumed {resumed}/{len(batches)} batches from {checkpoint_dir}")
+    return np.concatenate(results).astype(np.float32)
+
+
+def clear_checkpoints(checkpoint_dir: Path):
+    """Remove batch checkpoints after a successful save."""
+    if not checkpoint_dir.exists():
+        return
+    for path in checkpoint_dir.glob("*.npy"):
+        path.unlink()
+    checkpoint_dir.rmdir()
+
+def save_embeddings(embeddings: np.ndarray, manifest: list, output_dir: Path,
+                    growth_paths: dict = None, growth_key: str = None, dtype: str = "float32",
+                    embedder: Embedder = None, index_type: str = "exact", **index_params):
+    """Save the normalized vector store, its search index, and manifest.json.
+
+    The growth-path index is included when given, with growth_key
+    (growth_paths_key(), to tell later runs whether it is still valid).
+    index_params are passed to
+    embeddings.index.build_index (e.g. n_lists for IVF).
+
+    The write is atomic: data files get new versioned names and
+    manifest.json is swapped in with os.replace. The files of the previous
+    manifest are kept, so a process that read it just before the swap can
+    still open them; only generations older than that are removed.
+    """
+    embedder = embedder or OpenAIEmbedder()
     output_dir.mkdir(parents=True, exist_ok=True)
-    np.save(output_dir / "embeddings.npy", embeddings)
-    with open(output_dir / "manifest.json", "w", encoding="utf-8") as f:
-        json.dump({
-            "model": MODEL,
-            "dimensions": DIMENSIONS,
-            "shape": list(embeddings.shape),
-            "chunks": manifest,
-        }, f, indent=2, ensure_ascii=False)
-    print(f"Saved {embeddings.shape[0]} embeddings ({embeddings.shape[1]}d) to {output_dir}")
+    store = save_vectors(embeddings, output_dir, dtype=dtype)
+    vectors = np.load(output_dir / store["file"], mmap_mode="r")
+    tag = Path(store["file"]).stem.removeprefix("vectors-")
+    index = build_index(index_type, vectors, **index_params).save(output_dir, tag)
+    data = {
+        "model": embedder.model,
+        "dimensions": embedder.dimensions,
+        "embedder": embedder.describe(),
+        "shape": list(embeddings.shape),
+        "store": store,
+        "index": index,
+        "chunks": manifest,
+    }
+    if growth_paths:
+        data["growth_paths"] = growth_paths
+        if growth_key:
+            data["growth_paths_key"] = growth_key
+    previous = _manifest_files(output_dir / "manifest.json")
+    tmp = output_dir / ".manifest.json.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, output_dir / "manifest.json")
+    _prune_stale_files(output_dir, {store["file"], index.get("file")} | previous)
+    print(f"Saved {embeddings.shape[0]} embeddings ({embeddings.shape[1]}d, {dtype}) to {output_dir}")
+
+
+def load_existing_vectors(output_dir: Path, embedder: Embedder) -> dict:
+    """Vectors from the current index keyed by chunk content hash.
+
+    Returns {} when there is no index or it was built with a different
+    embedder, since those vectors are not comparable.
+    """
+    man_path = output_dir / "manifest.json"
+    if not man_path.exists():
+        return {}
+    with open(man_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    previous = data.get("embedder") or {
+        "name": "openai", "model": data.get("model"), "dimensions": data.get("dimensions"),
+    }
+    if previous != embedder.describe():
+        print(f"Existing index was built with {previous}; re-embedding everything")
+        return {}
+    vectors = open_vectors(output_dir, data.get("store"))
+    if vectors is None:
+        return {}
+    # Older manifests have no stored hash; the chunk text is there to recompute it
+    return {
+        chunk.get("content_hash") or content_hash(chunk["text"]): np.asarray(vectors[i], dtype=np.float32)
+        for i, chunk in enumerate(data["chunks"])
+    }
+
+
+def growth_paths_key(embedder: Embedder, chunk_hashes: list, queries: list) -> str:
+    """Fingerprint of everything a growth-path index depends on."""
+    digest = hashlib.sha256(json.dumps(embedder.describe(), sort_keys=True).encode("utf-8"))
+    for item in chunk_hashes + queries:
+        digest.update(b"\0" + item.encode("utf-8"))
+    return digest.hexdigest()[:24]
+
+
+def load_existing_growth_paths(output_dir: Path, key: str) -> dict | None:
+    """The current manifest's growth paths if they were built for key, else None."""
+    man_path = output_dir / "manifest.json"
+    if not man_path.exists():
+        return None
+    with open(man_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if data.get("growth_paths_key") != key:
+        return None
+    return data.get("growth_paths")
+
+
+def _manifest_files(man_path: Path) -> set:
+    """Data file names referenced by a manifest (empty if there is none)."""
+    if not man_path.exists():
+        return set()
+    with open(man_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    store = data.get("store") or {"file": LEGACY_FILE}
+    return {store.get("file"), (data.get("index") or {}).get("file")} - {None}
+
+
+def _prune_stale_files(output_dir: Path, keep: set):
+    """Delete index data files referenced by neither the current nor the previous manifest."""
+    for pattern in ("vectors*.npy", "ivf*.npz", LEGACY_FILE):
+        for path in output_dir.glob(pattern):
+            if path.name not in keep:
+                path.unlink()
@@ -0,0 +1,46 @@
+"""Precomputed growth-path retrieval for every SAE x EPIAS matrix cell.
+
+The growth query for a placement depends only on (sae_level, epias_stage),
+so all 30 results can be resolved ahead of time and stored in manifest.json
+under "growth_paths" as {cell_key: [{"index": i, "score": s}, ...]}.
+"""
+import numpy as np
+
+from assessment.matrix import MATRIX_DATA
+from embeddings.store import normalize_rows
+
+
+def growth_query(sae_level: int, epias_stage: str) -> str:
+    """The search query used to find growth-path chunks for a cell."""
+    return f"growth path for SAE L{sae_level} {epias_stage}"
+
+
+def cell_key(sae_level: int, epias_stage: str) -> str:
+    """'2_P' style key, matching storage.py's cell_key."""
+    return f"{sae_level}_{epias_stage}"
+
+
+def all_cells() -> list:
+    """All (sae_level, epias_stage) pairs in the matrix."""
+    return sorted(MATRIX_DATA.keys())
+
+
+def build_growth_index(embeddings: np.ndarray, query_embeddings: np.ndarray, top_k: int = 5) -> dict:
+    """Rank chunks for every cell offline.
+
+    Args:
+        embeddings: (N, D) chunk embeddings
+        query_embeddings: (len(all_cells()), D) embeddings of growth_query() per cell, same order
+        top_k: Chunks to keep per cell
+
+    Returns:
+        {cell_key: [{"index": chunk_index, "score": cosine}, ...]}
+    """
+    scores = normalize_rows(query_embeddings) @ normalize_rows(embeddings).T
+    index = {}
+    for row, (level, stage) in enumerate(all_cells()):
+        top = np.argsort(scores[row])[::-1][:top_k]
+        index[cell_key(level, stage)] = [
+            {"index": int(i), "score": round(float(scores[row, i]), 6)} for i in top
+        ]
+    return index
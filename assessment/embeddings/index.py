@@ -0,0 +1,172 @@
+"""Pluggable vector index backends for SearchEngine.
+
+All backends work on the unit-normalized vectors from embeddings/store.py,
+so a dot product is cosine similarity.
+
+- ExactIndex: brute-force scoring of every row (default; exact results)
+- IVFIndex:   inverted-file index. Rows are clustered with spherical k-means
+              and only the ``nprobe`` closest clusters are scored per query.
+              Raising nprobe trades latency for recall.
+
+Indexes are built offline by scripts/generate_embeddings.py and recorded in
+manifest.json under "index", e.g. {"type": "ivf", "file": "ivf-<tag>.npz", "n_lists": 256},
+where <tag> matches the vector store file the index was built from.
+"""
+import os
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+import numpy as np
+
+from embeddings.ranking import top_k_indices
+from embeddings.store import cosine_scores
+
+DEFAULT_NPROBE = 8
+
+
+class VectorIndex(ABC):
+    """Abstract nearest-neighbour index over a fixed vector matrix."""
+
+    def __init__(self, vectors: np.ndarray):
+        self.vectors = vectors
+
+    @property
+    @abstractmethod
+    def name(self) -> str:
+        """Index type as stored in the manifest ('exact', 'ivf')."""
+        ...
+
+    @abstractmethod
+    def search(self, query: np.ndarray, top_k: int, mask: np.ndarray | None = None):
+        """Return (indices, scores) of the best top_k rows, best first.
+
+        Args:
+            query: Query embedding (need not be normalized)
+            top_k: Number of rows to return
+            mask: Optional boolean row mask; False rows are never returned
+        """
+        ...
+
+    def save(self, output_dir: Path, tag: str) -> dict:
+        """Write any index files (versioned by ``tag``) and return the manifest "index" entry."""
+        return {"type": self.name}
+
+
+class ExactIndex(VectorIndex):
+    """Brute-force cosine search over every row."""
+
+    @property
+    def name(self) -> str:
+        return "exact"
+
+    def search(self, query, top_k, mask=None):
+        scores = cosine_scores(self.vectors, query)
+        top = top_k_indices(scores, top_k, mask)
+        return top, scores[top]
+
+
+class IVFIndex(VectorIndex):
+    """Inverted-file index: k-means coarse quantizer + per-cluster row lists."""
+
+    def __init__(self, vectors: np.ndarray, centroids: np.ndarray,
+                 list_offsets: np.ndarray, list_ids: np.ndarray,
+                 nprobe: int = DEFAULT_NPROBE):
+        super().__init__(vectors)
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_ids = list_ids
+        self.nprobe = nprobe
+
+    @property
+    def name(self) -> str:
+        return "ivf"
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, n_lists: int | None = None, n_iter: int = 20,
+              nprobe: int = DEFAULT_NPROBE, seed: int = 0) -> "IVFIndex":
+        """Cluster vectors with spherical k-means.
+
+        n_lists defaults to ~sqrt(N), the usual IVF rule of thumb.
+        """
+        n = vectors.shape[0]
+        n_lists = max(1, min(n_lists or int(np.sqrt(n)), n))
+        rng = np.random.default_rng(seed)
+        data = np.asarray(vectors, dtype=np.float32)
+        centroids = data[rng.choice(n, n_lists, replace=False)].copy()
+        for _ in range(n_iter):
+            assign = _assign(data, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, data)
+            counts = np.bincount(assign, minlength=n_lists)
+            empty = counts == 0
+            # Re-seed empty clusters from random rows so every list stays useful
+            sums[empty] = data[rng.choice(n, int(empty.sum()))]
+            centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+        assign = _assign(data, centroids)
+        order = np.argsort(assign, kind="stable")
+        list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=n_lists))])
+        return cls(vectors, centroids.astype(np.float32), list_offsets.astype(np.int64),
+                   order.astype(np.int64), nprobe=nprobe)
+
+    @classmethod
+    def load(cls, vectors: np.ndarray, path: Path, nprobe: int = DEFAULT_NPROBE) -> "IVFIndex":
+        with np.load(path) as data:
+            return cls(vectors, data["centroids"], data["list_offsets"], data["list_ids"], nprobe=nprobe)
+
+    def save(self, output_dir: Path, tag: str) -> dict:
+        filename = f"ivf-{tag}.npz"
+        tmp = output_dir / f".{filename}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, centroids=self.centroids,
+                     list_offsets=self.list_offsets, list_ids=self.list_ids)
+        os.replace(tmp, output_dir / filename)
+        return {"type": self.name, "file": filename, "n_lists": self.n_lists}
+
+    def search(self, query, top_k, mask=None):
+        q = np.asarray(query, dtype=np.float32)
+        q = q / max(float(np.linalg.norm(q)), 1e-12)
+        probe = top_k_indices(self.centroids @ q, min(self.nprobe, self.n_lists))
+        candidates = np.concatenate([
+            self.list_ids[self.list_offsets[c]:self.list_offsets[c + 1]] for c in probe
+        ])
+        if mask is not None:
+            candidates = candidates[mask[candidates]]
+        if len(candidates) < top_k:
+            # Probed lists are too sparse (small corpus or narrow filter): be exact
+            return ExactIndex(self.vectors).search(query, top_k, mask)
+        candidates.sort()  # sequential reads from the memory-mapped store
+        scores = cosine_scores(self.vectors[candidates], q)
+        top = top_k_indices(scores, top_k)
+        return candidates[top], scores[top]
+
+
+def _assign(data: np.ndarray, centroids: np.ndarray, block: int = 16384) -> np.ndarray:
+    """Nearest centroid (by cosine) for every row, in blocks to bound memory."""
+    assign = np.empty(data.shape[0], dtype=np.int64)
+    for start in range(0, data.shape[0], block):
+        assign[start:start + block] = np.argmax(data[start:start + block] @ centroids.T, axis=1)
+    return assign
+
+
+def build_index(kind: str, vectors: np.ndarray, **params) -> VectorIndex:
+    """Build an index of the given type ('exact' or 'ivf')."""
+    if kind == "exact":
+        return ExactIndex(vectors)
+    if kind == "ivf":
+        return IVFIndex.build(vectors, **params)
+    raise ValueError(f"Unknown index type: {kind}. Use 'exact' or 'ivf'.")
+
+
+def load_index(vectors: np.ndarray, embeddings_dir: Path, entry: dict | None,
+               nprobe: int = DEFAULT_NPROBE) -> VectorIndex:
+    """Open the index recorded in the manifest, falling back to exact search."""
+    if entry and entry.get("type") == "ivf":
+        path = embeddings_dir / entry["file"]
+        if path.exists():
+            return IVFIndex.load(vectors, path, nprobe=nprobe)
+        print(f"SearchEngine: IVF index {path} missing, using exact search")
+    return ExactIndex(vectors)
@@ -0,0 +1,145 @@
+"""LRU cache for query embeddings, optionally persisted to disk."""
+import fcntl
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+
+def normalize_query(query: str) -> str:
+    """Case-fold and collapse whitespace so trivially different queries share a key."""
+    return re.sub(r"\s+", " ", query).strip().lower()
+
+
+class QueryEmbeddingCache:
+    """Bounded LRU map of (model, normalized query) -> embedding vector.
+
+    Thread-safe (gunicorn threads share one instance per worker). When
+    ``path`` is set, entries are loaded at startup and written back every
+    ``save_every`` misses, so a restarted worker starts warm. Workers sharing
+    one ``path`` merge their entries into it on save (under a file lock)
+    instead of overwriting each other's.
+    """
+
+    def __init__(self, max_size: int = 1024, path: Path | None = None, save_every: int = 16):
+        self.max_size = max_size
+        self.path = Path(path) if path else None
+        self.save_every = save_every
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple[str, str], np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        if self.path:
+            self._load()
+
+    def get(self, query: str, model: str):
+        """Return the cached vector for query, or None. Counts a hit or miss."""
+        key = (model, normalize_query(query))
+        with self._lock:
+            vec = self._entries.get(key)
+            if vec is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vec
+
+    def peek(self, query: str, model: str):
+        """Return the cached vector for query, or None, without touching LRU order or counters."""
+        with self._lock:
+            return self._entries.get((model, normalize_query(query)))
+
+    def put(self, query: str, model: str, vector: np.ndarray) -> None:
+        """Insert a vector, evicting the least recently used entry if full."""
+        key = (model, normalize_query(query))
+        vector = np.asarray(vector, dtype=np.float32)
+        vector.setflags(write=False)
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            self._unsaved += 1
+            should_save = self.path is not None and self._unsaved >= self.save_every
+        if should_save:
+            self.save()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "persistent": self.path is not None,
+            }
+
+    def save(self) -> None:
+        """Merge all entries into ``path`` and write it atomically (tempfile + rename).
+
+        Entries already in the file that this worker lacks (saved by another
+        worker) are kept, older than this worker's own; the newest
+        ``max_size`` are written.
+        """
+        if not self.path:
+            return
+        with self._lock:
+            if not self._entries:
+                return
+            entries = list(self._entries.items())
+            self._unsaved = 0
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path.with_name(self.path.name + ".lock"), "w") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                merged = OrderedDict(self._read())
+                for key, vec in entries:
+                    merged.pop(key, None)
+                    merged[key] = vec
+                self._write(list(merged.items())[-self.max_size:])
+        except OSError as e:
+            print(f"QueryEmbeddingCache: failed to save {self.path}: {e}")
+
+    def _write(self, entries: list) -> None:
+        models = np.array([k[0] for k, _ in entries])
+        queries = np.array([k[1] for k, _ in entries])
+        # Vectors may differ in size across models, so store them as an object-free ragged pair
+        lengths = np.array([len(v) for _, v in entries], dtype=np.int64)
+        flat = np.concatenate([v for _, v in entries]).astype(np.float32)
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, models=models, queries=queries, lengths=lengths, vectors=flat)
+        os.replace(tmp, self.path)
+
+    def _read(self) -> list:
+        """[((model, query), vector), ...] from ``path``, oldest first; [] if missing or unreadable."""
+        if not self.path.exists():
+            return []
+        try:
+            with np.load(self.path) as data:
+                models, queries = data["models"], data["queries"]
+                lengths, flat = data["lengths"], data["vectors"]
+        except Exception as e:
+            print(f"QueryEmbeddingCache: ignoring unreadable cache {self.path}: {e}")
+            return []
+        offsets = np.concatenate([[0], np.cumsum(lengths)])
+        entries = []
+        for i in range(len(queries)):
+            vec = flat[offsets[i]:offsets[i + 1]].copy()
+            vec.setflags(write=False)
+            entries.append(((str(models[i]), str(queries[i])), vec))
+        return entries
+
+    def _load(self) -> None:
+        # Keep the most recently used tail if the file holds more than max_size
+        for key, vec in self._read()[-self.max_size:]:
+            self._entries[key] = vec
+        if self._entries:
+            print(f"QueryEmbeddingCache loaded {len(self._entries)} entries from {self.path}")
@@ -0,0 +1,52 @@
+"""Top-k selection and metadata filtering shared by all search tiers."""
+import numpy as np
+
+# Manifest fields that can be used in search filters
+FILTER_FIELDS = ("sae_level", "epias_stage", "chunk_type", "source_file")
+
+
+def top_k_indices(scores: np.ndarray, k: int, mask: np.ndarray | None = None) -> np.ndarray:
+    """Indices of the k highest scores, best first.
+
+    Uses argpartition (O(N)) and only sorts the k survivors, instead of a
+    full O(N log N) argsort. Rows where ``mask`` is False are never selected.
+    """
+    if mask is not None:
+        candidates = np.flatnonzero(mask)
+        if len(candidates) == 0 or k <= 0:
+            return np.empty(0, dtype=np.intp)
+        return candidates[top_k_indices(scores[candidates], k)]
+    n = len(scores)
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    if k < n:
+        part = np.argpartition(scores, n - k)[n - k:]
+    else:
+        part = np.arange(n)
+    return part[np.argsort(scores[part])[::-1]]
+
+
+def build_metadata_columns(manifest: list) -> dict:
+    """Column arrays of the filterable manifest fields, built once at load time."""
+    return {
+        field: np.array([c.get(field) for c in manifest], dtype=object)
+        for field in FILTER_FIELDS
+    }
+
+
+def filter_mask(columns: dict, filters: dict | None) -> np.ndarray | None:
+    """Boolean row mask for filters like {"sae_level": 2, "epias_stage": ["P", "I"]}.
+
+    Returns None when there is nothing to filter on.
+    """
+    if not filters:
+        return None
+    mask = None
+    for field, wanted in filters.items():
+        if field not in columns:
+            raise ValueError(f"Unknown filter field: {field}. Use one of {list(columns)}")
+        values = wanted if isinstance(wanted, (list, tuple, set)) else [wanted]
+        field_mask = np.isin(columns[field], list(values))
+        mask = field_mask if mask is None else mask & field_mask
+    return mask
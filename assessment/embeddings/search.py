@@ -1,33 +1,73 @@
 """Semantic search over pre-computed DIT framework embeddings."""
+import atexit
 import json
 import numpy as np
 from pathlib import Path
 
+from embeddings.bm25 import BM25Index, reciprocal_rank_fusion
+from embeddings.embedder import create_embedder
+from embeddings.index import DEFAULT_NPROBE, load_index
+from embeddings.query_cache import QueryEmbeddingCache
+from embeddings.ranking import build_metadata_columns, filter_mask, top_k_indices
+from embeddings.store import open_vectors
+
+SEARCH_MODES = ("dense", "sparse", "hybrid")
+
+# Candidates taken from each ranking before reciprocal rank fusion
+_HYBRID_DEPTH = 50
+
 class SearchEngine:
-    """Search engine with 3 tiers: semantic (OpenAI), TF-IDF fallback, empty fallback."""
+    """Search engine with dense (embeddings), sparse (BM25) and hybrid (RRF) modes.
 
-    def __init__(self, embeddings_dir: Path = None):
+    Queries are embedded with the embedder recorded in the manifest (OpenAI
+    or the local CPU encoder). Dense and hybrid fall back to sparse when no
+    query embedding is available; with no chunks at all, searches return
+    empty results.
+    """
+
+    def __init__(self, embeddings_dir: Path = None, query_cache: QueryEmbeddingCache = None,
+                 nprobe: int = DEFAULT_NPROBE):
         self.embeddings_dir = embeddings_dir or Path(__file__).parent.parent / "data" / "embeddings"
+        self.nprobe = nprobe
+        self.query_cache = query_cache or QueryEmbeddingCache()
+        if self.query_cache.path:
+            atexit.register(self.query_cache.save)
         self._embeddings = None
+        self._embedder = None
+        self._index = None
         self._manifest = None
-        self._tfidf_matrix = None
-        self._tfidf_vectorizer = None
+        self._growth_index = {}
+        self._columns = {}
+        self._bm25 = None
+        self._warned_lexical_hybrid = False
         self._load()
 
     def _load(self):
-        """Load pre-computed embeddings and manifest from disk."""
-        emb_path = self.embeddings_dir / "embeddings.npy"
+        """Load the manifest and memory-map the pre-normalized vector store."""
         man_path = self.embeddings_dir / "manifest.json"
-        if emb_path.exists() and man_path.exists():
-            self._embeddings = np.load(emb_path)
+        if man_path.exists():
             with open(man_path, "r", encoding="utf-8") as f:
                 data = json.load(f)
-                self._manifest = data["chunks"]
-            self._build_tfidf_fallback()
-            print(f"SearchEngine loaded {len(self._manifest)} chunks ({self._embeddings.shape[1]}d)")
+            self._embeddings = open_vectors(self.embeddings_dir, data.get("store"))
+        if self._embeddings is not None:
+            # Manifests from before the "embedder" field were all built with OpenAI
+            self._embedder = create_embedder(data.get("embedder") or {
+                "name": "openai", "model": data["model"], "dimensions": data["dimensions"],
+            })
+            self._manifest = data["chunks"]
+            self._growth_index = data.get("growth_paths", {})
+            self._columns = build_metadata_columns(self._manifest)
+            self._index = load_index(self._embeddings, self.embeddings_dir, data.get("index"), nprobe=self.nprobe)
+            self._bm25 = BM25Index([c["text"] for c in self._manifest])
+            print(f"SearchEngine loaded {len(self._manifest)} chunks "
+                  f"({self._embeddings.shape[1]}d, {self._embeddings.dtype}, {self._index.name} index, "
+                  f"{self._embedder.name} embedder)")
+            if self._embedder.lexical:
+                print(f"SearchEngine: the {self._embedder.name} embedder is lexical n-gram hashing, "
+                      f"not semantic; dense search matches shared words and sub-words only")
         else:
-            print(f"SearchEngine: No embeddings found at {self.embeddings_dir}. Using TF-IDF only.")
-            # Load chunks from source files for TF-IDF-only mode
+            print(f"SearchEngine: No embeddings found at {self.embeddings_dir}. Using BM25 only.")
+            # Load chunks from source files for sparse-only mode
             self._load_from_source()
 
     def _load_from_source(self):
@@ -41,64 +81,191 @@ class SearchEngine:
         chunker = MarkdownChunker()
         chunks = chunker.chunk_all(source_dir)
         self._manifest = [asdict(c) for c in chunks]
-        self._build_tfidf_fallback()
-        print(f"SearchEngine loaded {len(self._manifest)} chunks from source (TF-IDF only)")
+        self._columns = build_metadata_columns(self._manifest)
+        self._bm25 = BM25Index([c["text"] for c in self._manifest])
+        print(f"SearchEngine loaded {len(self._manifest)} chunks from source (BM25 only)")
+
+    def search(self, query: str, top_k: int = 5, filters: dict = None, mode: str = "dense") -> list:
+        """Search for chunks most relevant to query.
 
-    def _build_tfidf_fallback(self):
-        """Build TF-IDF index for keyword-based fallback search."""
+        Args:
+            query: Free-text query
+            top_k: Number of chunks to return
+            filters: Optional manifest field filters, e.g. {"sae_level": 2}
+                (see embeddings.ranking.FILTER_FIELDS)
+            mode: "dense" (embeddings), "sparse" (BM25, no API call) or
+                "hybrid" (both, fused with reciprocal rank fusion)
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {mode}. Use one of {list(SEARCH_MODES)}")
         if not self._manifest:
-            return
-        from sklearn.feature_extraction.text import TfidfVectorizer
-        texts = [c["text"] for c in self._manifest]
-        self._tfidf_vectorizer = TfidfVectorizer(stop_words='english', max_features=5000)
-        self._tfidf_matrix = self._tfidf_vectorizer.fit_transform(texts)
+            return []
+        mask = filter_mask(self._columns, filters)
+        if mode == "sparse":
+            return self._sparse_search(query, top_k, mask)
+        # Dense and hybrid need a query embedding (OPENAI_API_KEY for the OpenAI embedder)
+        return self._rank(query, self._embed_query(query), top_k, mask, mode)
+
+    async def asearch(self, query: str, top_k: int = 5, filters: dict = None, mode: str = "dense") -> list:
+        """Async search() for the ASGI serving path.
 
-    def search(self, query: str, top_k: int = 5) -> list:
-        """Search for chunks most relevant to query."""
+        The query embedding is awaited on the embedder's async client; the
+        ranking itself is CPU-bound and short, so it runs inline.
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {mode}. Use one of {list(SEARCH_MODES)}")
         if not self._manifest:
             return []
+        mask = filter_mask(self._columns, filters)
+        if mode == "sparse":
+            return self._sparse_search(query, top_k, mask)
+        return self._rank(query, await self._aembed_query(query), top_k, mask, mode)
 
-        # Try semantic search first (requires OPENAI_API_KEY)
-        query_embedding = self._embed_query(query)
+    def _rank(self, query: str, query_embedding, top_k: int, mask, mode: str) -> list:
+        """Dense or hybrid ranking given an already-computed query embedding."""
+        if query_embedding is None or self._index is None:
+            return self._sparse_search(query, top_k, mask)
 
-        if query_embedding is not None and self._embeddings is not None:
-            from sklearn.metrics.pairwise import cosine_similarity
-            similarities = cosine_similarity(
-                query_embedding.reshape(1, -1),
-                self._embeddings
-            )[0]
-            top_indices = np.argsort(similarities)[::-1][:top_k]
+        if mode == "dense":
+            top_indices, scores = self._index.search(query_embedding, top_k, mask)
             return [
-                {**self._manifest[i], "score": float(similarities[i])}
-                for i in top_indices
+                {**self._manifest[i], "score": float(score)}
+                for i, score in zip(top_indices, scores)
             ]
 
-        # Fall back to TF-IDF
-        return self._tfidf_search(query, top_k)
+        if self._embedder.lexical and not self._warned_lexical_hybrid:
+            print("SearchEngine: hybrid mode with a lexical embedder fuses two keyword rankings; "
+                  "build the index with the openai embedder for semantic matching")
+            self._warned_lexical_hybrid = True
+
+        depth = max(top_k, _HYBRID_DEPTH)
+        dense_ids, _ = self._index.search(query_embedding, depth, mask)
+        sparse_scores = self._bm25.scores(query)
+        sparse_ids = [i for i in top_k_indices(sparse_scores, depth, mask) if sparse_scores[i] > 0]
+        fused = reciprocal_rank_fusion([dense_ids, sparse_ids])
+        ranked = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [
+            {**self._manifest[i], "score": round(score, 6)}
+            for i, score in ranked
+        ]
 
-    def _embed_query(self, query: str):
-        """Embed query using OpenAI. Returns None if unavailable."""
+    def growth_chunks(self, sae_level: int, epias_stage: str, top_k: int = 5) -> list:
+        """Growth-path chunks for a matrix cell.
+
+        Served from the precomputed index when available; otherwise resolved
+        with a live dense search once and memoized for the life of the
+        process. Results of the sparse fallback (no query embedding) are
+        returned but not memoized, so the cell is retried once embedding
+        works again.
+        """
+        from embeddings.growth import cell_key, growth_query
+        if not self._manifest:
+            return []
+        key = cell_key(sae_level, epias_stage)
+        entries = self._growth_index.get(key)
+        if entries is not None and len(entries) >= top_k:
+            return [
+                {**self._manifest[e["index"]], "score": e["score"]}
+                for e in entries[:top_k]
+            ]
+        query = growth_query(sae_level, epias_stage)
+        # Growth queries are ours, not the user's: keep them out of the cache stats
+        query_embedding = self._embed_query(query, count=False)
+        results = self._rank(query, query_embedding, top_k, filter_mask(self._columns, None), "dense")
+        if results and query_embedding is not None and self._index is not None:
+            by_id = {c["chunk_id"]: i for i, c in enumerate(self._manifest)}
+            self._growth_index[key] = [
+                {"index": by_id[r["chunk_id"]], "score": r["score"]} for r in results
+            ]
+        return results
+
+    def build_growth_index(self, top_k: int = 5) -> None:
+        """Resolve growth chunks for all 30 matrix cells (e.g. at app startup)."""
+        if not self._manifest:
+            return
+        from embeddings.growth import all_cells, cell_key, growth_query
+        cells = [
+            (level, stage) for level, stage in all_cells()
+            if len(self._growth_index.get(cell_key(level, stage), [])) < top_k
+        ]
+        if not cells:
+            return
+        self._embed_queries([growth_query(level, stage) for level, stage in cells])
+        for level, stage in cells:
+            self.growth_chunks(level, stage, top_k=top_k)
+        resolved = sum(len(self._growth_index.get(cell_key(level, stage), [])) >= top_k
+                       for level, stage in cells)
+        print(f"SearchEngine resolved growth paths for {resolved}/{len(cells)} matrix cells")
+
+    def _embed_queries(self, queries: list) -> None:
+        """Warm the query cache for several queries with one batched embed call."""
+        if self._embedder is None or not self._embedder.is_available():
+            return
+        model = self._embedder.model
+        missing = [q for q in queries if self.query_cache.peek(q, model) is None]
+        if not missing:
+            return
+        try:
+            vectors = self._embedder.embed(missing)
+        except Exception:
+            return
+        for q, vector in zip(missing, vectors):
+            self.query_cache.put(q, model, vector)
+
+    def _embed_query(self, query: str, count: bool = True):
+        """Embed query with the index's embedder, via the query cache. Returns None if unavailable.
+
+        count=False looks the cache up without recording a hit or miss.
+        """
+        if self._embedder is None:
+            return None
+        lookup = self.query_cache.get if count else self.query_cache.peek
+        cached = lookup(query, self._embedder.model)
+        if cached is not None:
+            return cached
+        if not self._embedder.is_available():
+            return None
+        try:
+            embedding = self._embedder.embed([query])[0]
+        except Exception:
+            return None
+        self.query_cache.put(query, self._embedder.model, embedding)
+        return embedding
+
+    async def _aembed_query(self, query: str):
+        """Async _embed_query(): cache hits return immediately, misses await the embedder."""
+        if self._embedder is None:
+            return None
+        cached = self.query_cache.get(query, self._embedder.model)
+        if cached is not None:
+            return cached
+        if not self._embedder.is_available():
+            return None
         try:
-            from openai import OpenAI
-            import os
-            if not os.environ.get("OPENAI_API_KEY"):
-                return None
-            client = OpenAI()
-            response = client.embeddings.create(input=[query], model="text-embedding-3-large")
-            return np.array(response.data[0].embedding)
+            embedding = (await self._embedder.aembed([query]))[0]
         except Exception:
             return None
+        self.query_cache.put(query, self._embedder.model, embedding)
+        return embedding
+
+    def cached_query_vector(self, query: str):
+        """The query's embedding if a search already computed it, else None (never embeds)."""
+        if self._embedder is None:
+            return None
+        return self.query_cache.peek(query, self._embedder.model)
+
+    def cache_stats(self) -> dict:
+        """Return query-embedding cache hit/miss counters."""
+        return self.query_cache.stats()
 
-    def _tfidf_search(self, query: str, top_k: int) -> list:
-        """Fallback keyword search using TF-IDF cosine similarity."""
-        if self._tfidf_vectorizer is None or self._tfidf_matrix is None:
+    def _sparse_search(self, query: str, top_k: int, mask: np.ndarray = None) -> list:
+        """Keyword search using BM25 over the local inverted index."""
+        if self._bm25 is None:
             return []
-        from sklearn.metrics.pairwise import cosine_similarity
-        query_vec = self._tfidf_vectorizer.transform([query])
-        similarities = cosine_similarity(query_vec, self._tfidf_matrix)[0]
-        top_indices = np.argsort(similarities)[::-1][:top_k]
+        scores = self._bm25.scores(query)
+        top_indices = top_k_indices(scores, top_k, mask)
         return [
-            {**self._manifest[i], "score": float(similarities[i])}
+            {**self._manifest[i], "score": float(scores[i])}
             for i in top_indices
-            if similarities[i] > 0
+            if scores[i] > 0
         ]
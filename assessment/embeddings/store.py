@@ -0,0 +1,77 @@
+"""On-disk vector store: unit-normalized vectors opened read-only with np.memmap.
+
+Vectors are L2-normalized at write time, so cosine similarity is a single
+matrix-vector dot product at query time. The file is memory-mapped, so
+gunicorn workers share the OS page cache instead of each holding a copy.
+
+manifest.json records the layout under "store":
+    {"file": "vectors-<tag>.npy", "dtype": "float32", "normalized": true}
+The file name carries a content tag, so a new index is written next to the
+old one and only becomes live when manifest.json is atomically replaced.
+Manifests without "store" are the legacy format (raw embeddings.npy).
+"""
+import hashlib
+import os
+import numpy as np
+from pathlib import Path
+
+LEGACY_FILE = "embeddings.npy"
+SUPPORTED_DTYPES = ("float32", "float16")
+
+# Rows scored per block for float16 stores, to bound the float32 upcast copy
+_BLOCK_ROWS = 8192
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize each row (zero rows stay zero)."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def content_tag(array: np.ndarray) -> str:
+    """Short digest of an array's bytes, used to version index files."""
+    return hashlib.sha256(np.ascontiguousarray(array).tobytes()).hexdigest()[:12]
+
+
+def save_vectors(embeddings: np.ndarray, output_dir: Path, dtype: str = "float32") -> dict:
+    """Normalize and write vectors to a versioned file; returns the manifest "store" entry."""
+    if dtype not in SUPPORTED_DTYPES:
+        raise ValueError(f"Unsupported store dtype: {dtype}. Use one of {SUPPORTED_DTYPES}")
+    vectors = normalize_rows(embeddings).astype(dtype)
+    filename = f"vectors-{content_tag(vectors)}.npy"
+    tmp = output_dir / f".{filename}.tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, vectors)
+    os.replace(tmp, output_dir / filename)
+    return {"file": filename, "dtype": dtype, "normalized": True}
+
+
+def open_vectors(embeddings_dir: Path, store: dict | None) -> np.ndarray | None:
+    """Open the vector matrix for a manifest.
+
+    New-format stores are memory-mapped read-only. Legacy embeddings.npy
+    files are loaded and normalized in memory (once, at startup).
+    """
+    if store:
+        path = embeddings_dir / store["file"]
+        if not path.exists():
+            return None
+        return np.load(path, mmap_mode="r")
+    path = embeddings_dir / LEGACY_FILE
+    if not path.exists():
+        return None
+    return normalize_rows(np.load(path))
+
+
+def cosine_scores(vectors: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """Cosine similarity of a query against pre-normalized vectors."""
+    q = np.asarray(query, dtype=np.float32)
+    q = q / max(float(np.linalg.norm(q)), 1e-12)
+    if vectors.dtype == np.float32:
+        return vectors @ q
+    scores = np.empty(vectors.shape[0], dtype=np.float32)
+    for start in range(0, vectors.shape[0], _BLOCK_ROWS):
+        block = vectors[start:start + _BLOCK_ROWS]
+        scores[start:start + len(block)] = block.astype(np.float32) @ q
+    return scores
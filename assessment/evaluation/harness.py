@@ -3,6 +3,9 @@ import json
 from datetime import datetime
 from pathlib import Path
 
+from chat_service import SYSTEM_PROMPT, build_user_turn, pack_chunks
+from config import settings
+from embeddings.context import context_tokens
 from evaluation.golden import GOLDEN_QUESTIONS
 from evaluation.metrics import theme_coverage_score, estimate_cost, response_length_score
 
@@ -10,14 +13,23 @@ from evaluation.metrics import theme_coverage_score, estimate_cost, response_len
 class EvaluationHarness:
     """Run golden questions against LLM providers and produce comparison report."""
 
-    def __init__(self, registry, search_engine):
+    def __init__(self, registry, search_engine, pack_context: bool = True):
         """
         Args:
             registry: ProviderRegistry instance
             search_engine: SearchEngine instance for RAG context
+            pack_context: Pack context into the model's token budget as chat
+                does (False = the full text of the top 5 chunks, for A/B runs)
         """
         self.registry = registry
         self.search_engine = search_engine
+        self.pack_context = pack_context
+
+    def _retrieve(self, question: str, model_id: str) -> list:
+        if not self.pack_context:
+            return self.search_engine.search(question, top_k=5)
+        chunks = self.search_engine.search(question, top_k=settings.context_candidates)
+        return pack_chunks(chunks, model_id)
 
     def run(self, providers: list = None, num_runs: int = 1) -> dict:
         """Run all golden questions against specified (or all available) providers.
@@ -52,21 +64,14 @@ class EvaluationHarness:
 
                 for run_idx in range(num_runs):
                     # Retrieve RAG context
-                    chunks = self.search_engine.search(question["question"], top_k=5)
-                    context = "\n\n---\n\n".join(c["text"] for c in chunks)
-
-                    system_prompt = (
-                        "You are an expert on the Design in Tech Report 2026 "
-                        "E-P-I-A-S x SAE Framework by John Maeda. "
-                        "Answer based on the framework content below. "
-                        "Be specific and cite SAE levels and EPIAS stages.\n\n"
-                        f"FRAMEWORK CONTEXT:\n{context}"
-                    )
+                    chunks = self._retrieve(question["question"], provider.default_model)
+                    # Same prompt layout as chat: static system prompt, context in the user turn
+                    user_turn = build_user_turn(chunks, question["question"])
 
                     try:
                         response = provider.generate(
-                            system_prompt=system_prompt,
-                            messages=[{"role": "user", "content": question["question"]}],
+                            system_prompt=SYSTEM_PROMPT,
+                            messages=[{"role": "user", "content": user_turn}],
                         )
 
                         coverage = theme_coverage_score(
@@ -74,7 +79,8 @@ class EvaluationHarness:
                         )
                         length = response_length_score(response.text)
                         cost = estimate_cost(
-                            provider_name, response.input_tokens, response.output_tokens
+                            provider_name, response.input_tokens, response.output_tokens,
+                            cached_input_tokens=response.cached_input_tokens,
                         )
 
                         run_results.append({
@@ -85,7 +91,9 @@ class EvaluationHarness:
                             "latency_ms": round(response.latency_ms, 1),
                             "cost_usd": round(cost, 6),
                             "input_tokens": response.input_tokens,
+                            "cached_input_tokens": response.cached_input_tokens,
                             "output_tokens": response.output_tokens,
+                            "context_tokens": context_tokens(chunks),
                             "error": None,
                         })
 
@@ -108,11 +116,13 @@ class EvaluationHarness:
                     avg_coverage = sum(coverages) / len(coverages)
                     consistency = 1.0 - (max(coverages) - min(coverages)) if len(coverages) > 1 else 1.0
                     avg_latency = sum(r["latency_ms"] for r in successful) / len(successful)
+                    avg_context = sum(r["context_tokens"] for r in successful) / len(successful)
                     total_cost = sum(r["cost_usd"] for r in run_results)
                 else:
                     avg_coverage = 0.0
                     consistency = 0.0
                     avg_latency = 0.0
+                    avg_context = 0.0
                     total_cost = 0.0
 
                 provider_results.append({
@@ -122,6 +132,7 @@ class EvaluationHarness:
                     "runs": run_results,
                     "avg_theme_coverage": round(avg_coverage, 3),
                     "avg_latency_ms": round(avg_latency, 1),
+                    "avg_context_tokens": round(avg_context, 1),
                     "total_cost_usd": round(total_cost, 6),
                     "consistency": round(consistency, 3),
                     "errors": sum(1 for r in run_results if r["error"]),
@@ -136,6 +147,7 @@ class EvaluationHarness:
                 "summary": {
                     "avg_theme_coverage": round(sum(q["avg_theme_coverage"] for q in provider_results) / n, 3),
                     "avg_latency_ms": round(sum(q["avg_latency_ms"] for q in provider_results) / n, 1),
+                    "avg_context_tokens": round(sum(q["avg_context_tokens"] for q in provider_results) / n, 1),
                     "total_cost_usd": round(sum(q["total_cost_usd"] for q in provider_results), 6),
                     "avg_consistency": round(sum(q["consistency"] for q in provider_results) / n, 3),
                     "total_errors": sum(q["errors"] for q in provider_results),
@@ -145,6 +157,7 @@ class EvaluationHarness:
         report = {
             "timestamp": datetime.now().isoformat(),
             "num_runs": num_runs,
+            "context_packing": self.pack_context,
             "num_questions": len(GOLDEN_QUESTIONS),
             "providers": results,
         }
@@ -165,6 +178,7 @@ class EvaluationHarness:
             print(f"\n  {p['provider'].upper()} ({p['model']})")
             print(f"    Theme Coverage: {s['avg_theme_coverage']:.1%}")
             print(f"    Avg Latency:    {s['avg_latency_ms']:.0f}ms")
+            print(f"    Avg Context:    {s['avg_context_tokens']:.0f} tokens")
             print(f"    Total Cost:     ${s['total_cost_usd']:.4f}")
             print(f"    Consistency:    {s['avg_consistency']:.1%}")
             print(f"    Errors:         {s['total_errors']}")
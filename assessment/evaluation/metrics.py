@@ -18,25 +18,29 @@ def theme_coverage_score(response_text: str, expected_themes: list) -> float:
     return hits / len(expected_themes)
 
 
-def estimate_cost(provider: str, input_tokens: int = None, output_tokens: int = None) -> float:
+def estimate_cost(provider: str, input_tokens: int = None, output_tokens: int = None,
+                  cached_input_tokens: int = None) -> float:
     """Estimate cost in USD based on provider pricing (approximate, early 2026).
 
     Args:
         provider: Provider name ('openai', 'anthropic', 'google', 'ollama')
-        input_tokens: Number of input tokens
+        input_tokens: Number of input tokens (including cached ones)
         output_tokens: Number of output tokens
+        cached_input_tokens: Input tokens read from the provider's prompt cache
 
     Returns:
         Estimated cost in USD
     """
     PRICING = {
-        "openai": {"input": 2.50 / 1_000_000, "output": 10.00 / 1_000_000},     # gpt-5.1
-        "anthropic": {"input": 3.00 / 1_000_000, "output": 15.00 / 1_000_000},   # claude-sonnet-4
-        "google": {"input": 0.15 / 1_000_000, "output": 0.60 / 1_000_000},       # gemini-2.5-flash
-        "ollama": {"input": 0.0, "output": 0.0},                                  # local
+        "openai": {"input": 2.50 / 1_000_000, "cached": 0.25 / 1_000_000, "output": 10.00 / 1_000_000},     # gpt-5.1
+        "anthropic": {"input": 3.00 / 1_000_000, "cached": 0.30 / 1_000_000, "output": 15.00 / 1_000_000},  # claude-sonnet-4
+        "google": {"input": 0.15 / 1_000_000, "cached": 0.0375 / 1_000_000, "output": 0.60 / 1_000_000},    # gemini-2.5-flash
+        "ollama": {"input": 0.0, "cached": 0.0, "output": 0.0},                                             # local
     }
-    rates = PRICING.get(provider, {"input": 0.0, "output": 0.0})
-    return (input_tokens or 0) * rates["input"] + (output_tokens or 0) * rates["output"]
+    rates = PRICING.get(provider, {"input": 0.0, "cached": 0.0, "output": 0.0})
+    cached = min(cached_input_tokens or 0, input_tokens or 0)
+    return (((input_tokens or 0) - cached) * rates["input"] + cached * rates["cached"]
+            + (output_tokens or 0) * rates["output"])
 
 
 def response_length_score(response_text: str, min_words: int = 50, max_words: int = 500) -> float:
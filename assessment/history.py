@@ -0,0 +1,132 @@
+"""Chat history compaction: a token-budgeted window of recent turns plus a rolling summary.
+
+The chat UI resends the whole conversation every turn. HistoryManager keeps
+the most recent turns that fit in ``token_budget`` (counted with tiktoken,
+like MarkdownChunker) and replaces everything older with a short summary,
+so per-request input tokens stay flat however long the session runs.
+
+Summaries are rolling and cached by a chained hash of the turns they
+cover. The window slides in blocks of turns, so most requests reuse the
+cached summary as is; when the boundary does move, the cached summary of
+the older prefix is extended with just the newly evicted turns instead of
+re-summarizing the whole conversation.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between a product "
+    "designer and an assistant about the Design in Tech Report 2026 "
+    "E-P-I-A-S x SAE framework. Merge the existing summary with the new "
+    "turns into one updated summary of at most {max_words} words. Keep the "
+    "designer's goals, their SAE level and EPIAS stage if mentioned, and any "
+    "advice already given. Reply with the summary only."
+)
+
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Token count with the same tiktoken encoding as MarkdownChunker."""
+    global _encoding
+    if _encoding is None:
+        import tiktoken
+        _encoding = tiktoken.encoding_for_model("gpt-4")
+    return len(_encoding.encode(text))
+
+
+def _chain(prev: str, turn: dict) -> str:
+    return hashlib.sha256(f"{prev}\x00{turn['role']}\x00{turn['content']}".encode("utf-8")).hexdigest()
+
+
+class HistoryManager:
+    """Sliding-window history with a cached rolling summary of older turns."""
+
+    def __init__(self, token_budget: int = 2000, summary_words: int = 200,
+                 evict_block: int = 4, cache_size: int = 512):
+        self.token_budget = token_budget
+        self.evict_block = evict_block
+        self.summary_words = summary_words
+        self.cache_size = cache_size
+        self._summaries: OrderedDict[str, str] = OrderedDict()  # prefix hash -> summary
+        self._lock = threading.Lock()
+
+    def window_start(self, history: list) -> int:
+        """Index of the oldest turn kept verbatim.
+
+        Walks back from the newest turn until the budget is spent, then
+        rounds up to a multiple of ``evict_block`` turns (so the summary
+        boundary, and with it the cached summary, only moves every few
+        turns) and to a user turn, so the window never opens on a reply.
+        """
+        used = 0
+        start = len(history)
+        for i in range(len(history) - 1, -1, -1):
+            used += count_tokens(history[i]["content"])
+            if used > self.token_budget:
+                break
+            start = i
+        if 0 < start < len(history):
+            start = min(len(history), -(-start // self.evict_block) * self.evict_block)
+        while start < len(history) and history[start]["role"] != "user":
+            start += 1
+        return start
+
+    def compact(self, history: list, provider) -> tuple:
+        """Compact a client-supplied history.
+
+        Args:
+            history: [{"role", "content"}, ...], oldest first, without the new message
+            provider: LLMProvider used to write summaries (its default model)
+
+        Returns:
+            (recent_turns, summary, usage): summary is None when nothing was
+            evicted (or summarizing failed: the old turns are then just
+            dropped), usage is (input_tokens, output_tokens) spent on summaries
+        """
+        start = self.window_start(history)
+        if start == 0:
+            return history, None, (0, 0)
+        older = history[:start]
+
+        # Chained prefix hashes: hashes[i] identifies older[:i + 1]
+        hashes, h = [], ""
+        for turn in older:
+            h = _chain(h, turn)
+            hashes.append(h)
+
+        with self._lock:
+            done, summary = 0, ""
+            for i in range(len(older), 0, -1):
+                cached = self._summaries.get(hashes[i - 1])
+                if cached is not None:
+                    self._summaries.move_to_end(hashes[i - 1])
+                    done, summary = i, cached
+                    break
+        if done == len(older):
+            return history[start:], summary, (0, 0)
+
+        try:
+            response = self._summarize(provider, summary, older[done:])
+        except Exception as e:
+            print(f"HistoryManager: summary failed, dropping {len(older)} old turns: {e}")
+            return history[start:], summary or None, (0, 0)
+
+        with self._lock:
+            self._summaries[hashes[-1]] = response.text
+            self._summaries.move_to_end(hashes[-1])
+            while len(self._summaries) > self.cache_size:
+                self._summaries.popitem(last=False)
+        return history[start:], response.text, (response.input_tokens or 0, response.output_tokens or 0)
+
+    def _summarize(self, provider, summary: str, turns: list):
+        transcript = "\n\n".join(f"{t['role'].upper()}: {t['content']}" for t in turns)
+        content = (
+            f"EXISTING SUMMARY:\n{summary or '(none)'}\n\n"
+            f"NEW TURNS:\n{transcript}"
+        )
+        return provider.generate(
+            system_prompt=SUMMARY_PROMPT.format(max_words=self.summary_words),
+            messages=[{"role": "user", "content": content}],
+        )
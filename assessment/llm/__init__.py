@@ -1,22 +1,114 @@
 """LLM provider registry with auto-detection."""
-from llm.base import LLMProvider, LLMResponse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from llm.base import LLMProvider, LLMResponse, LLMStreamChunk
 from llm.models import MODEL_CATALOG, get_models_for_provider
+from llm.routing import LatencyHistogram, RoutedProvider
 
 
-class ProviderRegistry:
-    """Registry of LLM providers with auto-detection."""
+class _Health:
+    """Cached availability of one provider."""
 
     def __init__(self):
+        self.available = False
+        self.checked_at = 0.0   # time.monotonic() of the last probe, 0 = never
+        self.next_check = 0.0
+        self.failures = 0
+
+
+class ProviderRegistry:
+    """Registry of LLM providers with auto-detection.
+
+    Availability is cached per provider: is_available() probes (Ollama's is
+    an HTTP request) run in a background health checker, never on the
+    request path. A healthy provider is re-probed every ``ttl`` seconds; an
+    unavailable one backs off exponentially up to ``max_backoff``.
+    """
+
+    def __init__(self, ttl: float = 30.0, max_backoff: float = 300.0, routing: dict | None = None):
         self._providers: dict[str, LLMProvider] = {}
+        self._health: dict[str, _Health] = {}
+        self._latency: dict[str, LatencyHistogram] = {}
+        # RoutedProvider options (mode, slo_ms, default_slo_ms, hedge_min_ms,
+        # max_fallbacks) and the size of the pool routed calls run on (workers)
+        self._routing = dict(routing or {"mode": "off"})
+        workers = self._routing.pop("workers", 32)
+        self._executor = None
+        if self._routing["mode"] != "off":
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm-route")
+        self._ttl = ttl
+        self._max_backoff = max_backoff
+        self._lock = threading.Lock()
+        self._probing: set = set()
+        self._checker = None
 
     def register(self, provider: LLMProvider):
         self._providers[provider.name] = provider
+        self._health[provider.name] = _Health()
+        self._latency[provider.name] = LatencyHistogram()
+        if not provider.probes_network:
+            # Key checks are instant: resolve them now so the first request sees them
+            self._probe(provider.name)
+
+    def _probe(self, name: str) -> bool:
+        """Run one availability probe and schedule the next (with failure backoff)."""
+        try:
+            available = bool(self._providers[name].is_available())
+        except Exception:
+            available = False
+        now = time.monotonic()
+        with self._lock:
+            health = self._health[name]
+            health.available = available
+            health.checked_at = now
+            health.failures = 0 if available else health.failures + 1
+            delay = self._ttl if available else min(self._ttl * 2 ** (health.failures - 1), self._max_backoff)
+            health.next_check = now + delay
+            self._probing.discard(name)
+        return available
+
+    def refresh(self, force: bool = False) -> None:
+        """Probe every provider whose cached status is due (or all, with force). Blocks."""
+        now = time.monotonic()
+        for name, health in list(self._health.items()):
+            if force or now >= health.next_check:
+                self._probe(name)
+
+    def start_health_checker(self, interval: float = 5.0) -> None:
+        """Start a daemon thread that calls refresh() every ``interval`` seconds."""
+        if self._checker is not None:
+            return
+
+        def loop():
+            while True:
+                self.refresh()
+                time.sleep(interval)
+
+        self._checker = threading.Thread(target=loop, name="provider-health", daemon=True)
+        self._checker.start()
+
+    def is_available(self, name: str) -> bool:
+        """Cached availability; never probes on the calling thread.
+
+        Without a running health checker, a stale entry is re-probed in a
+        one-off background thread and the last known value is returned.
+        """
+        health = self._health[name]
+        if self._checker is None and time.monotonic() >= health.next_check:
+            with self._lock:
+                start = name not in self._probing
+                self._probing.add(name)
+            if start:
+                threading.Thread(target=self._probe, args=(name,), daemon=True).start()
+        return health.available
 
     def get_provider(self, name: str = "auto") -> LLMProvider:
         """Get a provider by name, or auto-detect the first available one."""
         if name == "auto":
             for provider in self._providers.values():
-                if provider.is_available():
+                if self.is_available(provider.name):
                     return provider
             raise RuntimeError(
                 "No LLM providers available. "
@@ -26,14 +118,33 @@ class ProviderRegistry:
         if name not in self._providers:
             raise ValueError(f"Unknown provider: {name}. Available: {list(self._providers.keys())}")
         provider = self._providers[name]
-        if not provider.is_available():
+        if not self.is_available(name):
             raise RuntimeError(f"Provider '{name}' is not available. Check your API key or service.")
         return provider
 
+    def route(self, name: str = "auto") -> RoutedProvider:
+        """The provider get_provider(name) returns, wrapped for SLOs, fallback and hedging.
+
+        Fallbacks are the other available providers in registration order.
+        With routing mode "off" this only records latency.
+        """
+        primary = self.get_provider(name)
+        options = dict(self._routing)
+        max_fallbacks = options.pop("max_fallbacks", 1)
+        fallbacks = [
+            p for p in self._providers.values()
+            if p is not primary and self.is_available(p.name)
+        ][:max_fallbacks]
+        return RoutedProvider([primary] + fallbacks, self._latency, executor=self._executor, **options)
+
+    def latency_stats(self) -> dict:
+        """Per-provider latency histogram summaries (p50/p95/p99, errors, timeouts, prompt-cache hits)."""
+        return {name: h.snapshot() for name, h in self._latency.items()}
+
     def get_available_providers(self) -> list:
-        """List all registered providers with availability status."""
+        """List all registered providers with (cached) availability status."""
         return [
-            {"name": p.name, "model": p.default_model, "available": p.is_available()}
+            {"name": p.name, "model": p.default_model, "available": self.is_available(p.name)}
             for p in self._providers.values()
         ]
 
@@ -45,7 +156,7 @@ class ProviderRegistry:
         """
         result = {}
         for provider in self._providers.values():
-            if not provider.is_available():
+            if not self.is_available(provider.name):
                 continue
             if provider.name == "ollama":
                 # Ollama has dynamic models, add a single entry
@@ -62,7 +173,24 @@ class ProviderRegistry:
 
 def create_provider_registry() -> ProviderRegistry:
     """Create and populate the provider registry."""
-    registry = ProviderRegistry()
+    from config import settings
+    registry = ProviderRegistry(
+        ttl=settings.provider_health_ttl,
+        max_backoff=settings.provider_health_max_backoff,
+        routing={
+            "mode": settings.llm_routing,
+            "slo_ms": settings.llm_slo_ms,
+            "default_slo_ms": settings.llm_default_slo_ms,
+            "hedge_min_ms": settings.llm_hedge_min_ms,
+            "max_fallbacks": settings.llm_max_fallbacks,
+            "workers": settings.llm_routing_workers,
+        },
+    )
+
+    if settings.fake_llm_latency_ms is not None:
+        # Load-test mode: the fake provider comes first so "auto" picks it
+        from llm.fake_provider import FakeProvider
+        registry.register(FakeProvider(latency_ms=settings.fake_llm_latency_ms))
 
     # Register providers with graceful import fallback
     try:
@@ -85,7 +213,6 @@ def create_provider_registry() -> ProviderRegistry:
 
     try:
         from llm.ollama_provider import OllamaProvider
-        from config import settings
         registry.register(OllamaProvider(
             base_url=settings.ollama_base_url,
             model=settings.ollama_model,
@@ -1,9 +1,23 @@
-"""Anthropic Claude provider — supports multiple models + extended thinking."""
+"""Anthropic Claude provider — supports multiple models + extended thinking.
+
+Prompt caching: the system prompt and the conversation so far are marked
+with cache_control breakpoints, so follow-up turns re-read that prefix
+from cache. A breakpoint is only set once the prefix before it reaches the
+model's minimum cacheable length (prompt_cache_min_tokens in the catalog,
+estimated at ~4 characters per token); the short system prompt alone never
+does, so first turns are not cached. Measured hits are reported as
+cached_input_tokens (see /api/providers/latency).
+"""
 import os
 import time
-from llm.base import LLMProvider, LLMResponse
+from typing import Iterator
+
+from llm.base import LLMProvider, LLMResponse, LLMStreamChunk
+from llm.models import get_model_info
 
 DEFAULT_MODEL = "claude-sonnet-4-5"
+CACHE_CONTROL = {"type": "ephemeral"}
+DEFAULT_CACHE_MIN_TOKENS = 1024
 
 
 class AnthropicProvider(LLMProvider):
@@ -16,26 +30,32 @@ class AnthropicProvider(LLMProvider):
     def default_model(self) -> str:
         return DEFAULT_MODEL
 
-    def __init__(self):
-        self._client = None
-
     def _get_client(self):
-        if self._client is None:
-            import anthropic
-            self._client = anthropic.Anthropic()
-        return self._client
+        from llm.clients import anthropic_client
+        return anthropic_client()
 
-    def generate(self, system_prompt: str, messages: list,
-                 model: str | None = None,
-                 reasoning_config: dict | None = None) -> LLMResponse:
-        client = self._get_client()
-        model_id = model or DEFAULT_MODEL
+    def _get_async_client(self):
+        from llm.clients import async_anthropic_client
+        return async_anthropic_client()
 
+    def _build_kwargs(self, system_prompt: str, messages: list,
+                      model_id: str, reasoning_config: dict | None) -> dict:
+        api_messages = [{"role": m["role"], "content": m["content"]} for m in messages]
+        min_tokens = (get_model_info(model_id) or {}).get("prompt_cache_min_tokens", DEFAULT_CACHE_MIN_TOKENS)
+        system = {"type": "text", "text": system_prompt}
+        prefix_tokens = len(system_prompt) // 4
+        if prefix_tokens >= min_tokens:
+            system["cache_control"] = CACHE_CONTROL
+        prefix_tokens += sum(len(m["content"]) for m in api_messages[:-1]) // 4
+        if len(api_messages) > 1 and prefix_tokens >= min_tokens:
+            # Breakpoint on the last history turn: the next turn reuses everything up to it
+            prev = api_messages[-2]
+            prev["content"] = [{"type": "text", "text": prev["content"], "cache_control": CACHE_CONTROL}]
         kwargs = {
             "model": model_id,
             "max_tokens": 2000,
-            "system": system_prompt,
-            "messages": [{"role": m["role"], "content": m["content"]} for m in messages],
+            "system": [system],
+            "messages": api_messages,
         }
 
         # Extended thinking support
@@ -49,26 +69,89 @@ class AnthropicProvider(LLMProvider):
             kwargs["thinking"] = {"type": "enabled", "budget_tokens": budget}
             # Increase max_tokens to accommodate thinking + response
             kwargs["max_tokens"] = max(kwargs["max_tokens"], budget + 4000)
+        return kwargs
+
+    def generate(self, system_prompt: str, messages: list,
+                 model: str | None = None,
+                 reasoning_config: dict | None = None) -> LLMResponse:
+        client = self._get_client()
+        model_id = model or DEFAULT_MODEL
+        kwargs = self._build_kwargs(system_prompt, messages, model_id, reasoning_config)
 
         start = time.perf_counter()
         resp = client.messages.create(**kwargs)
         latency = (time.perf_counter() - start) * 1000
+        return _to_response(resp, model_id, latency)
 
-        # Extract text — skip thinking blocks, find the text block
-        text = ""
-        for block in resp.content:
-            if getattr(block, 'type', None) == 'text':
-                text = block.text
-                break
+    async def agenerate(self, system_prompt: str, messages: list,
+                        model: str | None = None,
+                        reasoning_config: dict | None = None) -> LLMResponse:
+        client = self._get_async_client()
+        model_id = model or DEFAULT_MODEL
+        kwargs = self._build_kwargs(system_prompt, messages, model_id, reasoning_config)
 
-        return LLMResponse(
-            text=text,
+        start = time.perf_counter()
+        resp = await client.messages.create(**kwargs)
+        latency = (time.perf_counter() - start) * 1000
+        return _to_response(resp, model_id, latency)
+
+    def stream(self, system_prompt: str, messages: list,
+               model: str | None = None,
+               reasoning_config: dict | None = None) -> Iterator[LLMStreamChunk]:
+        client = self._get_client()
+        model_id = model or DEFAULT_MODEL
+        kwargs = self._build_kwargs(system_prompt, messages, model_id, reasoning_config)
+
+        start = time.perf_counter()
+        first_token = None
+        parts = []
+        # text_stream yields only text deltas; thinking deltas are skipped
+        with client.messages.stream(**kwargs) as stream:
+            for delta in stream.text_stream:
+                if first_token is None:
+                    first_token = (time.perf_counter() - start) * 1000
+                parts.append(delta)
+                yield LLMStreamChunk(text=delta)
+            final = stream.get_final_message()
+        latency = (time.perf_counter() - start) * 1000
+
+        yield LLMStreamChunk(response=LLMResponse(
+            text="".join(parts),
             provider="anthropic",
             model=model_id,
             latency_ms=latency,
-            input_tokens=resp.usage.input_tokens,
-            output_tokens=resp.usage.output_tokens,
-        )
+            output_tokens=final.usage.output_tokens,
+            first_token_ms=first_token,
+            **_input_usage(final.usage),
+        ))
 
     def is_available(self) -> bool:
         return bool(os.environ.get("ANTHROPIC_API_KEY"))
+
+
+def _to_response(resp, model_id: str, latency: float) -> LLMResponse:
+    # Extract text — skip thinking blocks, find the text block
+    text = ""
+    for block in resp.content:
+        if getattr(block, 'type', None) == 'text':
+            text = block.text
+            break
+
+    return LLMResponse(
+        text=text,
+        provider="anthropic",
+        model=model_id,
+        latency_ms=latency,
+        output_tokens=resp.usage.output_tokens,
+        **_input_usage(resp.usage),
+    )
+
+
+def _input_usage(usage) -> dict:
+    """input_tokens (including cache reads/writes, as other providers count it) and cache hits."""
+    cache_read = getattr(usage, 'cache_read_input_tokens', None) or 0
+    cache_write = getattr(usage, 'cache_creation_input_tokens', None) or 0
+    return {
+        "input_tokens": usage.input_tokens + cache_read + cache_write,
+        "cached_input_tokens": cache_read,
+    }
@@ -1,7 +1,8 @@
 """Abstract LLM provider interface."""
+import asyncio
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import Optional
+from typing import Iterator, Optional
 
 
 @dataclass
@@ -14,6 +15,19 @@ class LLMResponse:
     input_tokens: Optional[int] = None
     output_tokens: Optional[int] = None
     cost_estimate_usd: Optional[float] = None
+    first_token_ms: Optional[float] = None
+    # Part of input_tokens served from the provider's prompt cache (billed at a discount)
+    cached_input_tokens: Optional[int] = None
+    # Set when the provider stopped early (e.g. "max_output_tokens"): the text
+    # is partial, so the response must not be cached
+    incomplete_reason: Optional[str] = None
+
+
+@dataclass
+class LLMStreamChunk:
+    """One item of a streamed response: a text delta, or (last) the final response."""
+    text: str = ""
+    response: Optional[LLMResponse] = None
 
 
 class LLMProvider(ABC):
@@ -48,7 +62,44 @@ class LLMProvider(ABC):
         """
         ...
 
+    async def agenerate(self, system_prompt: str, messages: list,
+                        model: str | None = None,
+                        reasoning_config: dict | None = None) -> LLMResponse:
+        """Async generate() for the ASGI serving path.
+
+        The default runs generate() in a worker thread; providers with an
+        async SDK client override it so no thread is held while waiting.
+        """
+        return await asyncio.to_thread(self.generate, system_prompt, messages,
+                                       model=model, reasoning_config=reasoning_config)
+
+    def stream(self, system_prompt: str, messages: list,
+               model: str | None = None,
+               reasoning_config: dict | None = None) -> Iterator[LLMStreamChunk]:
+        """Stream a response as text deltas.
+
+        Takes the same arguments as generate(). Yields LLMStreamChunk(text=...)
+        for each delta, then exactly one LLMStreamChunk(response=...) carrying
+        the full text, latency and token usage.
+
+        The default implementation wraps generate(); providers override it
+        with their native streaming API.
+        """
+        response = self.generate(system_prompt, messages, model=model,
+                                 reasoning_config=reasoning_config)
+        yield LLMStreamChunk(text=response.text)
+        yield LLMStreamChunk(response=response)
+
     @abstractmethod
     def is_available(self) -> bool:
-        """Check if this provider is configured and available."""
+        """Check if this provider is configured and available.
+
+        ProviderRegistry caches the result; call registry.is_available()
+        on the request path rather than this probe.
+        """
         ...
+
+    @property
+    def probes_network(self) -> bool:
+        """True if is_available() makes a network call (probed in the background)."""
+        return False
@@ -0,0 +1,120 @@
+"""Shared, long-lived HTTP clients for the LLM and embedding APIs.
+
+Every provider (and the OpenAI embedder) gets its client from here instead
+of building one per request, so connections are pooled and kept alive and
+TLS handshakes and SDK construction happen once per process, not once per
+call. Clients are created lazily under a lock and are safe to share across
+gunicorn threads; the async clients are shared by coroutines on the ASGI
+event loop.
+
+Pool size and timeouts come from Settings (HTTP_POOL_SIZE, HTTP_TIMEOUT,
+HTTP_CONNECT_TIMEOUT).
+"""
+import os
+import threading
+
+_lock = threading.Lock()
+_clients: dict = {}
+
+
+def _shared(key: str, factory):
+    """Return the client stored under key, building it once with factory()."""
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = factory()
+                _clients[key] = client
+    return client
+
+
+def _pool_options(limits_cls, timeout_cls) -> dict:
+    from config import settings
+    return {
+        "limits": limits_cls(
+            max_connections=settings.http_pool_size,
+            max_keepalive_connections=settings.http_pool_size,
+        ),
+        "timeout": timeout_cls(settings.http_timeout, connect=settings.http_connect_timeout),
+    }
+
+
+def _sdk_pool_options(sdk) -> dict:
+    """Pool options for an SDK's DefaultHttpxClient, built from the SDK's own
+    httpx types (SDK releases may bundle a different httpx than the app's)."""
+    return _pool_options(type(sdk.DEFAULT_CONNECTION_LIMITS), type(sdk.DEFAULT_TIMEOUT))
+
+
+def openai_client():
+    """Pooled OpenAI client (Responses API and embeddings share it)."""
+    def build():
+        import openai
+        return openai.OpenAI(http_client=openai.DefaultHttpxClient(**_sdk_pool_options(openai)))
+    return _shared("openai", build)
+
+
+def async_openai_client():
+    def build():
+        import openai
+        return openai.AsyncOpenAI(http_client=openai.DefaultAsyncHttpxClient(**_sdk_pool_options(openai)))
+    return _shared("openai-async", build)
+
+
+def anthropic_client():
+    def build():
+        import anthropic
+        return anthropic.Anthropic(http_client=anthropic.DefaultHttpxClient(**_sdk_pool_options(anthropic)))
+    return _shared("anthropic", build)
+
+
+def async_anthropic_client():
+    def build():
+        import anthropic
+        return anthropic.AsyncAnthropic(
+            http_client=anthropic.DefaultAsyncHttpxClient(**_sdk_pool_options(anthropic)))
+    return _shared("anthropic-async", build)
+
+
+def configure_genai():
+    """Configure the Gemini SDK once per process (and again only if the key changes).
+
+    genai.configure() rebuilds the SDK's underlying gRPC clients, so it must
+    not run per request; GenerativeModel objects built afterwards reuse them.
+    """
+    import google.generativeai as genai
+    api_key = os.environ["GOOGLE_API_KEY"]
+    if _clients.get("genai") != api_key:
+        with _lock:
+            if _clients.get("genai") != api_key:
+                genai.configure(api_key=api_key)
+                _clients["genai"] = api_key
+    return genai
+
+
+def http_session():
+    """Pooled requests.Session for plain HTTP backends (Ollama)."""
+    def build():
+        import requests
+        from requests.adapters import HTTPAdapter
+        from config import settings
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=settings.http_pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+    return _shared("http", build)
+
+
+def async_http_client():
+    """Pooled httpx.AsyncClient for plain HTTP backends (Ollama) on the ASGI path."""
+    def build():
+        import httpx
+        return httpx.AsyncClient(**_pool_options(httpx.Limits, httpx.Timeout))
+    return _shared("http-async", build)
+
+
+def http_timeout() -> tuple:
+    """(connect, read) timeout for requests calls made with http_session()."""
+    from config import settings
+    return (settings.http_connect_timeout, settings.http_timeout)
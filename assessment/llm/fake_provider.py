@@ -0,0 +1,50 @@
+"""Fake provider with a fixed simulated latency, for load tests.
+
+Registered only when FAKE_LLM_LATENCY_MS is set. It never makes a network
+call, so scripts/load_test.py can compare serving modes without API keys
+or cost: generate() blocks a thread for the latency (like a sync SDK call),
+agenerate() awaits it (like an async SDK call).
+"""
+import asyncio
+import time
+
+from llm.base import LLMProvider, LLMResponse
+
+
+class FakeProvider(LLMProvider):
+
+    def __init__(self, latency_ms: int = 1000):
+        self._latency_ms = latency_ms
+
+    @property
+    def name(self) -> str:
+        return "fake"
+
+    @property
+    def default_model(self) -> str:
+        return "fake-model"
+
+    def _response(self, messages: list, model: str | None) -> LLMResponse:
+        return LLMResponse(
+            text=f"Echo: {messages[-1]['content']}",
+            provider="fake",
+            model=model or self.default_model,
+            latency_ms=float(self._latency_ms),
+            input_tokens=0,
+            output_tokens=0,
+        )
+
+    def generate(self, system_prompt: str, messages: list,
+                 model: str | None = None,
+                 reasoning_config: dict | None = None) -> LLMResponse:
+        time.sleep(self._latency_ms / 1000)
+        return self._response(messages, model)
+
+    async def agenerate(self, system_prompt: str, messages: list,
+                        model: str | None = None,
+                        reasoning_config: dict | None = None) -> LLMResponse:
+        await asyncio.sleep(self._latency_ms / 1000)
+        return self._response(messages, model)
+
+    def is_available(self) -> bool:
+        return True
@@ -1,7 +1,13 @@
-"""Google Gemini provider — supports multiple models + thinking config."""
+"""Google Gemini provider — supports multiple models + thinking config.
+
+Gemini 2.5+ models cache repeated prompt prefixes implicitly; cache hits
+are reported as cached_content_token_count in the usage metadata.
+"""
 import os
 import time
-from llm.base import LLMProvider, LLMResponse
+from typing import Iterator
+
+from llm.base import LLMProvider, LLMResponse, LLMStreamChunk
 from llm.models import get_model_info
 
 DEFAULT_MODEL = "gemini-2.5-flash"
@@ -17,14 +23,12 @@ class GoogleProvider(LLMProvider):
     def default_model(self) -> str:
         return DEFAULT_MODEL
 
-    def generate(self, system_prompt: str, messages: list,
-                 model: str | None = None,
-                 reasoning_config: dict | None = None) -> LLMResponse:
-        import google.generativeai as genai
+    def _start_chat(self, system_prompt: str, messages: list,
+                    model_id: str, reasoning_config: dict | None):
         from google.generativeai import types
+        from llm.clients import configure_genai
 
-        genai.configure(api_key=os.environ["GOOGLE_API_KEY"])
-        model_id = model or DEFAULT_MODEL
+        genai = configure_genai()
         info = get_model_info(model_id)
 
         # Build generation config with thinking params
@@ -54,7 +58,13 @@ class GoogleProvider(LLMProvider):
             role = "user" if msg["role"] == "user" else "model"
             history.append({"role": role, "parts": [msg["content"]]})
 
-        chat = gen_model.start_chat(history=history)
+        return gen_model.start_chat(history=history)
+
+    def generate(self, system_prompt: str, messages: list,
+                 model: str | None = None,
+                 reasoning_config: dict | None = None) -> LLMResponse:
+        model_id = model or DEFAULT_MODEL
+        chat = self._start_chat(system_prompt, messages, model_id, reasoning_config)
 
         start = time.perf_counter()
         response = chat.send_message(messages[-1]["content"])
@@ -65,7 +75,69 @@ class GoogleProvider(LLMProvider):
             provider="google",
             model=model_id,
             latency_ms=latency,
+            **_usage(response),
+        )
+
+    async def agenerate(self, system_prompt: str, messages: list,
+                        model: str | None = None,
+                        reasoning_config: dict | None = None) -> LLMResponse:
+        model_id = model or DEFAULT_MODEL
+        chat = self._start_chat(system_prompt, messages, model_id, reasoning_config)
+
+        start = time.perf_counter()
+        response = await chat.send_message_async(messages[-1]["content"])
+        latency = (time.perf_counter() - start) * 1000
+
+        return LLMResponse(
+            text=response.text,
+            provider="google",
+            model=model_id,
+            latency_ms=latency,
+            **_usage(response),
         )
 
+    def stream(self, system_prompt: str, messages: list,
+               model: str | None = None,
+               reasoning_config: dict | None = None) -> Iterator[LLMStreamChunk]:
+        model_id = model or DEFAULT_MODEL
+        chat = self._start_chat(system_prompt, messages, model_id, reasoning_config)
+
+        start = time.perf_counter()
+        first_token = None
+        parts = []
+        response = chat.send_message(messages[-1]["content"], stream=True)
+        for chunk in response:
+            # Chunks carrying only safety/usage metadata have no text parts
+            try:
+                text = chunk.text
+            except ValueError:
+                continue
+            if not text:
+                continue
+            if first_token is None:
+                first_token = (time.perf_counter() - start) * 1000
+            parts.append(text)
+            yield LLMStreamChunk(text=text)
+        latency = (time.perf_counter() - start) * 1000
+
+        yield LLMStreamChunk(response=LLMResponse(
+            text="".join(parts),
+            provider="google",
+            model=model_id,
+            latency_ms=latency,
+            first_token_ms=first_token,
+            **_usage(response),
+        ))
+
     def is_available(self) -> bool:
         return bool(os.environ.get("GOOGLE_API_KEY"))
+
+
+def _usage(response) -> dict:
+    """Token counts from a Gemini response's usage metadata, if reported."""
+    usage = getattr(response, "usage_metadata", None)
+    return {
+        "input_tokens": getattr(usage, "prompt_token_count", None),
+        "output_tokens": getattr(usage, "candidates_token_count", None),
+        "cached_input_tokens": getattr(usage, "cached_content_token_count", None),
+    }
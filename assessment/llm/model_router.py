@@ -0,0 +1,154 @@
+"""Adaptive model choice: cheap models for simple questions, stronger ones for hard ones.
+
+ModelRouter classifies a chat question from signals that are already on
+hand (no extra LLM call): its length, which golden-set category it looks
+like (evaluation/golden.py), and how retrieval scored (one dominant hit is
+a lookup; strong hits spread over several source files need synthesis).
+The resulting tier picks a model and reasoning setting for the provider
+from ROUTE_TABLE.
+
+As the day's token budget runs down the ceiling drops: below
+``reserve`` of the budget remaining complex questions get the standard
+tier, below ``economy`` everything gets the simple tier.
+
+Modes:
+- off:   the client's model (or the provider default) is used as is
+- auto:  route requests that do not name a model (simple chat mode)
+- force: route every request, overriding the client's model choice
+"""
+import re
+
+MODEL_ROUTING_MODES = ("off", "auto", "force")
+
+TIERS = ("simple", "standard", "complex")
+
+# (model, reasoning value as the chat UI sends it) per provider and tier
+ROUTE_TABLE = {
+    "openai": {
+        "simple": ("gpt-5-mini", "low"),
+        "standard": ("gpt-5-mini", "medium"),
+        "complex": ("gpt-5.1", "medium"),
+    },
+    "anthropic": {
+        "simple": ("claude-haiku-4-5", "off"),
+        "standard": ("claude-haiku-4-5", "1024"),
+        "complex": ("claude-sonnet-4-5", "4096"),
+    },
+    "google": {
+        "simple": ("gemini-2.5-flash", "0"),
+        "standard": ("gemini-2.5-flash", "1024"),
+        "complex": ("gemini-2.5-pro", "4096"),
+    },
+}
+
+# Question shapes of the golden-set categories, with the score each adds:
+# definitions and tool lists are lookups, placing yourself on the matrix
+# and planning a transition need the framework applied to a situation
+CATEGORY_PATTERNS = [
+    ("role_description", -1, r"\bwhat (does it mean|is an?|are)\b|\bdefine\b|\bdescribe\b"),
+    ("tooling", -1, r"\b(what|which) tools?\b|\btools? do\b"),
+    ("level_distinction", 0, r"\bdifference between\b|\bdiffer\b|\bvs\.?\b|\bversus\b"),
+    ("epias_distinction", 0, r"\b(explorer|practitioner|integrator|architect|steward)s?\b.*\b(and|or|vs)\b"),
+    ("level_identification", 1, r"\b(am i|which level|what level|where do i)\b"),
+    ("transition_guidance", 1, r"\bhow (do|can|should) i\b|\b(move|transition|progress|get) (from|to)\b"),
+    ("growth_actions", 1, r"\bwhat (concrete|specific)\b|\bsteps?\b|\bplan\b"),
+    ("framework_principles", 1, r"\bshould i\b|\bis an? .+ more\b|\bwhy\b|\bskip\b"),
+]
+
+_COMPILED = [(name, weight, re.compile(pattern, re.IGNORECASE)) for name, weight, pattern in CATEGORY_PATTERNS]
+
+# Chunks scoring at least this fraction of the top hit count as strong
+_STRONG_HIT = 0.8
+
+
+def classify(question: str, chunks: list) -> tuple:
+    """Complexity tier of a question.
+
+    Args:
+        question: The user's message
+        chunks: Search results for it, best first (each with "score" and "source_file")
+
+    Returns:
+        (tier, signals): tier is one of TIERS, signals the inputs that decided it
+    """
+    words = len(question.split())
+    categories = [name for name, _, rx in _COMPILED if rx.search(question)]
+    score = sum(weight for name, weight, _ in _COMPILED if name in categories)
+    score += (words > 25) + (words > 45) + (question.count("?") > 1)
+
+    strong_sources = 0
+    if chunks:
+        top = chunks[0].get("score", 0.0)
+        strong = [c for c in chunks if top > 0 and c.get("score", 0.0) >= _STRONG_HIT * top]
+        strong_sources = len({c.get("source_file") for c in strong})
+        if len(strong) == 1:
+            score -= 1  # one dominant hit: the answer is in a single chunk
+        elif strong_sources >= 3:
+            score += 1  # strong hits across several documents: synthesis
+
+    tier = "simple" if score <= 0 else "standard" if score <= 2 else "complex"
+    return tier, {"score": score, "words": words, "categories": categories,
+                  "strong_sources": strong_sources}
+
+
+class ModelRouter:
+    """Picks model and reasoning per request from question complexity and remaining budget."""
+
+    def __init__(self, mode: str = "auto", reserve: float = 0.5, economy: float = 0.2):
+        """
+        Args:
+            mode: "auto" or "force" (see module docstring)
+            reserve: Below this fraction of the daily budget left, cap at "standard"
+            economy: Below this fraction left, cap at "simple"
+        """
+        if mode not in MODEL_ROUTING_MODES or mode == "off":
+            raise ValueError(f"Unknown model routing mode: {mode}. Use 'auto' or 'force'.")
+        self.mode = mode
+        self.reserve = reserve
+        self.economy = economy
+
+    @staticmethod
+    def budget_left() -> float:
+        """Fraction of today's token budget still available (a local read)."""
+        from usage_tracker import get_usage_stats
+        stats = get_usage_stats()
+        return stats["remaining"] / stats["budget"] if stats["budget"] else 0.0
+
+    def ceiling(self) -> str:
+        """Most expensive tier the remaining budget allows."""
+        left = self.budget_left()
+        if left < self.economy:
+            return "simple"
+        if left < self.reserve:
+            return "standard"
+        return "complex"
+
+    def choose(self, provider_name: str, data: dict, chunks: list) -> dict | None:
+        """Model choice for a chat request, or None to leave it as the client sent it.
+
+        Args:
+            provider_name: The concrete provider that will answer
+            data: Chat request body ("message", optional "model")
+            chunks: Search results for the message, best first
+
+        Returns:
+            {"tier", "model", "reasoning", "signals"} or None when the request
+            names a model (in auto mode) or the provider has no route table
+        """
+        table = ROUTE_TABLE.get(provider_name)
+        if table is None or (self.mode == "auto" and data.get("model")):
+            return None
+        tier, signals = classify(data["message"], chunks)
+        ceiling = self.ceiling()
+        if TIERS.index(tier) > TIERS.index(ceiling):
+            signals["capped_from"] = tier
+            tier = ceiling
+        model, reasoning = table[tier]
+        return {"tier": tier, "model": model, "reasoning": reasoning, "signals": signals}
+
+
+def create_model_router(mode: str, reserve: float = 0.5, economy: float = 0.2) -> ModelRouter | None:
+    """Build the configured model router, or None when mode is 'off'."""
+    if mode == "off":
+        return None
+    return ModelRouter(mode, reserve=reserve, economy=economy)
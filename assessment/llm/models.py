@@ -1,4 +1,10 @@
-"""Model catalog — defines every available model, its provider, and reasoning parameters."""
+"""Model catalog — defines every available model, its provider, and reasoning parameters.
+
+Optional "context_budget" caps the RAG context (in tokens) packed into the
+prompt for that model; models without one use Settings.context_token_budget.
+Optional "prompt_cache_min_tokens" is the shortest prefix the provider will
+cache with an explicit breakpoint (Anthropic; 1024 when not given).
+"""
 
 MODEL_CATALOG = {
     # ── OpenAI (Responses API) ──────────────────────────────────────
@@ -28,12 +34,14 @@ MODEL_CATALOG = {
         "provider": "openai",
         "label": "GPT-4.1 Mini",
         "description": "Fast and affordable",
+        "context_budget": 800,
         "reasoning_param": None,
     },
     "gpt-5-mini": {
         "provider": "openai",
         "label": "GPT-5 Mini",
         "description": "Fast GPT-5 class model",
+        "context_budget": 800,
         "reasoning_param": "effort",
         "reasoning_options": ["none", "low", "medium", "high"],
         "reasoning_default": "medium",
@@ -59,6 +67,7 @@ MODEL_CATALOG = {
         "provider": "anthropic",
         "label": "Claude Opus 4.6",
         "description": "Latest flagship — 1M context, adaptive thinking",
+        "prompt_cache_min_tokens": 4096,
         "reasoning_param": "thinking",
         "reasoning_options": ["off", "1024", "4096", "10000", "32000"],
         "reasoning_labels": {
@@ -71,6 +80,7 @@ MODEL_CATALOG = {
         "provider": "anthropic",
         "label": "Claude Sonnet 4.5",
         "description": "Strong general purpose",
+        "prompt_cache_min_tokens": 1024,
         "reasoning_param": "thinking",
         "reasoning_options": ["off", "1024", "4096", "10000", "32000"],
         "reasoning_labels": {
@@ -83,6 +93,8 @@ MODEL_CATALOG = {
         "provider": "anthropic",
         "label": "Claude Haiku 4.5",
         "description": "Fast and affordable",
+        "prompt_cache_min_tokens": 4096,
+        "context_budget": 800,
         "reasoning_param": "thinking",
         "reasoning_options": ["off", "1024", "4096", "10000"],
         "reasoning_labels": {
@@ -108,6 +120,7 @@ MODEL_CATALOG = {
         "provider": "google",
         "label": "Gemini 2.5 Flash",
         "description": "Fast and affordable",
+        "context_budget": 800,
         "reasoning_param": "thinking_budget",
         "reasoning_options": ["0", "1024", "4096", "8192", "-1"],
         "reasoning_labels": {
@@ -146,3 +159,9 @@ def get_models_for_provider(provider_name: str) -> dict:
 def get_model_info(model_id: str) -> dict | None:
     """Return model info dict or None."""
     return MODEL_CATALOG.get(model_id)
+
+
+def get_context_budget(model_id: str | None, default: int) -> int:
+    """Token budget for RAG context sent to a model."""
+    info = MODEL_CATALOG.get(model_id) if model_id else None
+    return info.get("context_budget", default) if info else default
@@ -1,7 +1,10 @@
 """Ollama local model provider."""
+import json
 import time
-import requests
-from llm.base import LLMProvider, LLMResponse
+from typing import Iterator
+
+from llm.base import LLMProvider, LLMResponse, LLMStreamChunk
+from llm.clients import async_http_client, http_session, http_timeout
 
 
 class OllamaProvider(LLMProvider):
@@ -26,10 +29,33 @@ class OllamaProvider(LLMProvider):
         api_messages.extend(messages)
 
         start = time.perf_counter()
-        resp = requests.post(
+        resp = http_session().post(
+            f"{self._base_url}/api/chat",
+            json={"model": use_model, "messages": api_messages, "stream": False},
+            timeout=http_timeout(),
+        )
+        resp.raise_for_status()
+        data = resp.json()
+        latency = (time.perf_counter() - start) * 1000
+
+        return LLMResponse(
+            text=data["message"]["content"],
+            provider="ollama",
+            model=use_model,
+            latency_ms=latency,
+        )
+
+    async def agenerate(self, system_prompt: str, messages: list,
+                        model: str | None = None,
+                        reasoning_config: dict | None = None) -> LLMResponse:
+        use_model = model or self._model
+        api_messages = [{"role": "system", "content": system_prompt}]
+        api_messages.extend(messages)
+
+        start = time.perf_counter()
+        resp = await async_http_client().post(
             f"{self._base_url}/api/chat",
             json={"model": use_model, "messages": api_messages, "stream": False},
-            timeout=120,
         )
         resp.raise_for_status()
         data = resp.json()
@@ -42,9 +68,56 @@ class OllamaProvider(LLMProvider):
             latency_ms=latency,
         )
 
+    def stream(self, system_prompt: str, messages: list,
+               model: str | None = None,
+               reasoning_config: dict | None = None) -> Iterator[LLMStreamChunk]:
+        use_model = model or self._model
+        api_messages = [{"role": "system", "content": system_prompt}]
+        api_messages.extend(messages)
+
+        start = time.perf_counter()
+        first_token = None
+        parts = []
+        final = {}
+        with http_session().post(
+            f"{self._base_url}/api/chat",
+            json={"model": use_model, "messages": api_messages, "stream": True},
+            timeout=http_timeout(),
+            stream=True,
+        ) as resp:
+            resp.raise_for_status()
+            # Ollama streams newline-delimited JSON objects; the last has done=true + counts
+            for line in resp.iter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+                delta = data.get("message", {}).get("content", "")
+                if delta:
+                    if first_token is None:
+                        first_token = (time.perf_counter() - start) * 1000
+                    parts.append(delta)
+                    yield LLMStreamChunk(text=delta)
+                if data.get("done"):
+                    final = data
+        latency = (time.perf_counter() - start) * 1000
+
+        yield LLMStreamChunk(response=LLMResponse(
+            text="".join(parts),
+            provider="ollama",
+            model=use_model,
+            latency_ms=latency,
+            input_tokens=final.get("prompt_eval_count"),
+            output_tokens=final.get("eval_count"),
+            first_token_ms=first_token,
+        ))
+
+    @property
+    def probes_network(self) -> bool:
+        return True
+
     def is_available(self) -> bool:
         try:
-            resp = requests.get(f"{self._base_url}/api/tags", timeout=2)
+            resp = http_session().get(f"{self._base_url}/api/tags", timeout=2)
             return resp.status_code == 200
         except Exception:
             return False
@@ -1,7 +1,17 @@
-"""OpenAI provider using the Responses API — supports multiple models."""
+"""OpenAI provider using the Responses API — supports multiple models.
+
+Prompt caching is automatic for identical prompt prefixes of 1024+ tokens;
+prompt_cache_key (derived from the static system prompt) routes requests
+that share a prefix to the same cache. The system prompt alone is well
+under that minimum; follow-up turns carrying history can reach it. Hits are
+reported as cached_input_tokens.
+"""
+import hashlib
 import os
 import time
-from llm.base import LLMProvider, LLMResponse
+from typing import Iterator
+
+from llm.base import LLMProvider, LLMResponse, LLMStreamChunk
 from llm.models import get_model_info
 
 DEFAULT_MODEL = "gpt-5-mini"
@@ -17,20 +27,16 @@ class OpenAIProvider(LLMProvider):
     def default_model(self) -> str:
         return DEFAULT_MODEL
 
-    def __init__(self):
-        self._client = None
-
     def _get_client(self):
-        if self._client is None:
-            from openai import OpenAI
-            self._client = OpenAI()
-        return self._client
+        from llm.clients import openai_client
+        return openai_client()
 
-    def generate(self, system_prompt: str, messages: list,
-                 model: str | None = None,
-                 reasoning_config: dict | None = None) -> LLMResponse:
-        client = self._get_client()
-        model_id = model or DEFAULT_MODEL
+    def _get_async_client(self):
+        from llm.clients import async_openai_client
+        return async_openai_client()
+
+    def _build_kwargs(self, system_prompt: str, messages: list,
+                      model_id: str, reasoning_config: dict | None) -> dict:
         info = get_model_info(model_id)
 
         # Build Responses API input format
@@ -49,49 +55,123 @@ class OpenAIProvider(LLMProvider):
             "model": model_id,
             "input": api_input,
             "max_output_tokens": 2000,
+            # Sent via extra_body so older SDKs without the parameter still work
+            "extra_body": {
+                "prompt_cache_key": "dit-" + hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:16],
+            },
         }
 
         # Add reasoning if this model supports it
         if info and info.get("reasoning_param") == "effort":
-            effort = "high"  # default
+            effort = "high"  # default; the model router always sends its own effort
             if reasoning_config and "effort" in reasoning_config:
                 effort = reasoning_config["effort"]
             if effort != "none":
                 kwargs["reasoning"] = {"effort": effort}
+        return kwargs
+
+    def generate(self, system_prompt: str, messages: list,
+                 model: str | None = None,
+                 reasoning_config: dict | None = None) -> LLMResponse:
+        client = self._get_client()
+        model_id = model or DEFAULT_MODEL
+        kwargs = self._build_kwargs(system_prompt, messages, model_id, reasoning_config)
 
         start = time.perf_counter()
         resp = client.responses.create(**kwargs)
         latency = (time.perf_counter() - start) * 1000
+        return _to_response(resp, model_id, latency)
 
-        # Extract text — try output_text first, then walk blocks
-        text = ""
-        if getattr(resp, 'output_text', None):
-            text = resp.output_text.strip()
-        else:
-            for block in getattr(resp, 'output', []) or []:
-                content = getattr(block, 'content', None)
-                if not content:
-                    continue
-                for item in content:
-                    t = getattr(item, 'text', None)
-                    if t:
-                        text = t.strip()
-
-        # Extract usage if available
-        input_tokens = None
-        output_tokens = None
-        if hasattr(resp, 'usage') and resp.usage:
-            input_tokens = getattr(resp.usage, 'input_tokens', None)
-            output_tokens = getattr(resp.usage, 'output_tokens', None)
-
-        return LLMResponse(
-            text=text,
-            provider="openai",
-            model=model_id,
-            latency_ms=latency,
-            input_tokens=input_tokens,
-            output_tokens=output_tokens,
-        )
+    async def agenerate(self, system_prompt: str, messages: list,
+                        model: str | None = None,
+                        reasoning_config: dict | None = None) -> LLMResponse:
+        client = self._get_async_client()
+        model_id = model or DEFAULT_MODEL
+        kwargs = self._build_kwargs(system_prompt, messages, model_id, reasoning_config)
+
+        start = time.perf_counter()
+        resp = await client.responses.create(**kwargs)
+        latency = (time.perf_counter() - start) * 1000
+        return _to_response(resp, model_id, latency)
+
+    def stream(self, system_prompt: str, messages: list,
+               model: str | None = None,
+               reasoning_config: dict | None = None) -> Iterator[LLMStreamChunk]:
+        client = self._get_client()
+        model_id = model or DEFAULT_MODEL
+        kwargs = self._build_kwargs(system_prompt, messages, model_id, reasoning_config)
+
+        start = time.perf_counter()
+        first_token = None
+        parts = []
+        final = None
+        for event in client.responses.create(**kwargs, stream=True):
+            if event.type == "response.output_text.delta":
+                if first_token is None:
+                    first_token = (time.perf_counter() - start) * 1000
+                parts.append(event.delta)
+                yield LLMStreamChunk(text=event.delta)
+            elif event.type in ("response.completed", "response.incomplete"):
+                final = event.response
+            elif event.type == "response.failed":
+                error = getattr(event.response, 'error', None)
+                raise RuntimeError(f"OpenAI response failed: {getattr(error, 'message', None) or error}")
+            elif event.type == "error":
+                raise RuntimeError(f"OpenAI stream error: {getattr(event, 'message', event)}")
+        if final is None:
+            raise RuntimeError("OpenAI stream ended without a final response")
+        latency = (time.perf_counter() - start) * 1000
+
+        # Usage (and, if no deltas arrived, the text) come from the final
+        # payload, which is also sent for incomplete responses
+        response = _to_response(final, model_id, latency)
+        response.text = "".join(parts).strip() or response.text
+        response.first_token_ms = first_token
+        yield LLMStreamChunk(response=response)
 
     def is_available(self) -> bool:
         return bool(os.environ.get("OPENAI_API_KEY"))
+
+
+def _to_response(resp, model_id: str, latency: float) -> LLMResponse:
+    # Extract text — try output_text first, then walk blocks
+    text = ""
+    if getattr(resp, 'output_text', None):
+        text = resp.output_text.strip()
+    else:
+        for block in getattr(resp, 'output', []) or []:
+            content = getattr(block, 'content', None)
+            if not content:
+                continue
+            for item in content:
+                t = getattr(item, 'text', None)
+                if t:
+                    text = t.strip()
+
+    input_tokens, output_tokens, cached_tokens = _usage(resp)
+
+    incomplete_reason = None
+    if getattr(resp, 'status', None) == "incomplete":
+        details = getattr(resp, 'incomplete_details', None)
+        incomplete_reason = getattr(details, 'reason', None) or "incomplete"
+
+    return LLMResponse(
+        text=text,
+        provider="openai",
+        model=model_id,
+        latency_ms=latency,
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        cached_input_tokens=cached_tokens,
+        incomplete_reason=incomplete_reason,
+    )
+
+
+def _usage(resp) -> tuple:
+    """(input_tokens, output_tokens, cached_input_tokens) from a Responses API response, if reported."""
+    usage = getattr(resp, 'usage', None)
+    if not usage:
+        return None, None, None
+    details = getattr(usage, 'input_tokens_details', None)
+    return (getattr(usage, 'input_tokens', None), getattr(usage, 'output_tokens', None),
+            getattr(details, 'cached_tokens', None))
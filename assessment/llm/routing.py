@@ -0,0 +1,385 @@
+"""Latency-aware routing across providers: SLO timeouts, fallback and hedging.
+
+RoutedProvider wraps a primary provider plus fallbacks from the registry
+and behaves like a single LLMProvider:
+
+- off:      call the primary directly on the caller's thread (latency is
+            still recorded)
+- fallback: give each provider its latency SLO; on an error or an SLO
+            timeout, retry on the next provider
+- hedge:    as fallback, and also fire the next provider once the primary
+            has been running longer than its observed p95, taking
+            whichever answers first
+
+Streams are held to the same SLO for their first token: a provider that
+has not started answering by then is abandoned for the next one (hedged
+streams start the next one halfway there). Once a token has been sent to
+the client there is no switching.
+
+Fallback providers run with their own default model (a model ID is only
+valid for the provider it belongs to). A call that overruns its SLO is
+abandoned, not killed: its worker thread finishes in the background,
+bounded by the HTTP client timeout (HTTP_TIMEOUT). Provider calls run on
+the executor the registry passes in (LLM_ROUTING_WORKERS threads).
+"""
+import asyncio
+import bisect
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Executor, wait
+from typing import Iterator
+
+from llm.base import LLMProvider, LLMResponse, LLMStreamChunk
+
+ROUTING_MODES = ("off", "fallback", "hedge")
+
+# Samples needed before the histogram's p95 is trusted as the hedge delay
+_MIN_SAMPLES_FOR_P95 = 20
+
+
+class LatencyHistogram:
+    """Thread-safe histogram of call latencies in log-spaced buckets (10 ms .. 10 min).
+
+    Also totals the input tokens of finished calls and how many of them
+    were read from the provider's prompt cache.
+    """
+
+    BOUNDS_MS = [10 * 1.5 ** i for i in range(28)]
+
+    def __init__(self):
+        self._counts = [0] * (len(self.BOUNDS_MS) + 1)
+        self._lock = threading.Lock()
+        self.errors = 0
+        self.timeouts = 0
+        self.input_tokens = 0
+        self.cached_input_tokens = 0
+
+    def record(self, latency_ms: float, response: LLMResponse | None = None) -> None:
+        with self._lock:
+            self._counts[bisect.bisect_left(self.BOUNDS_MS, latency_ms)] += 1
+            if response is not None:
+                self.input_tokens += response.input_tokens or 0
+                self.cached_input_tokens += response.cached_input_tokens or 0
+
+    def record_error(self, timeout: bool = False) -> None:
+        with self._lock:
+            if timeout:
+                self.timeouts += 1
+            else:
+                self.errors += 1
+
+    @property
+    def count(self) -> int:
+        return sum(self._counts)
+
+    def quantile(self, q: float) -> float | None:
+        """Upper bound (ms) of the bucket holding the q-quantile, or None if empty."""
+        with self._lock:
+            total = sum(self._counts)
+            if not total:
+                return None
+            target = q * total
+            seen = 0
+            for i, n in enumerate(self._counts):
+                seen += n
+                if seen >= target:
+                    return self.BOUNDS_MS[min(i, len(self.BOUNDS_MS) - 1)]
+        return None
+
+    def snapshot(self) -> dict:
+        p50, p95, p99 = self.quantile(0.5), self.quantile(0.95), self.quantile(0.99)
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "p50_ms": round(p50) if p50 else None,
+            "p95_ms": round(p95) if p95 else None,
+            "p99_ms": round(p99) if p99 else None,
+            "input_tokens": self.input_tokens,
+            "cached_input_tokens": self.cached_input_tokens,
+            "prompt_cache_hit_rate": (round(self.cached_input_tokens / self.input_tokens, 3)
+                                      if self.input_tokens else None),
+        }
+
+
+class RoutedProvider(LLMProvider):
+    """A primary provider with SLO-bounded fallback and optional hedging."""
+
+    def __init__(self, chain: list, histograms: dict, mode: str = "fallback",
+                 slo_ms: dict | None = None, default_slo_ms: float = 60000,
+                 hedge_min_ms: float = 2000, executor: Executor | None = None):
+        if mode not in ROUTING_MODES:
+            raise ValueError(f"Unknown routing mode: {mode}. Use one of {list(ROUTING_MODES)}")
+        if mode != "off" and executor is None:
+            raise ValueError(f"Routing mode {mode!r} needs an executor")
+        self._executor = executor
+        self._chain = chain if mode != "off" else chain[:1]
+        self._histograms = histograms
+        self._mode = mode
+        self._slo_ms = slo_ms or {}
+        self._default_slo_ms = default_slo_ms
+        self._hedge_min_ms = hedge_min_ms
+
+    @property
+    def name(self) -> str:
+        return self._chain[0].name
+
+    @property
+    def default_model(self) -> str:
+        return self._chain[0].default_model
+
+    def is_available(self) -> bool:
+        return True
+
+    def _slo(self, provider: LLMProvider) -> float | None:
+        """Seconds a provider may take before it is abandoned (None = no limit)."""
+        if self._mode == "off":
+            return None
+        return self._slo_ms.get(provider.name, self._default_slo_ms) / 1000
+
+    def _hedge_delay(self) -> float | None:
+        """Seconds to wait on the primary before hedging (None = never hedge)."""
+        if self._mode != "hedge" or len(self._chain) < 2:
+            return None
+        histogram = self._histograms[self.name]
+        p95 = histogram.quantile(0.95) if histogram.count >= _MIN_SAMPLES_FOR_P95 else None
+        return max(p95 or self._slo(self._chain[0]) * 1000 / 2, self._hedge_min_ms) / 1000
+
+    def _calls(self, model, reasoning_config) -> list:
+        """(provider, model, reasoning_config) per chain entry; fallbacks use their defaults."""
+        return [(p, model, reasoning_config) if i == 0 else (p, None, None)
+                for i, p in enumerate(self._chain)]
+
+    def _timed(self, provider, system_prompt, messages, model, reasoning_config) -> LLMResponse:
+        start = time.perf_counter()
+        try:
+            response = provider.generate(system_prompt, messages, model=model,
+                                         reasoning_config=reasoning_config)
+        except Exception:
+            self._histograms[provider.name].record_error()
+            raise
+        self._histograms[provider.name].record((time.perf_counter() - start) * 1000, response)
+        return response
+
+    def generate(self, system_prompt: str, messages: list,
+                 model: str | None = None,
+                 reasoning_config: dict | None = None) -> LLMResponse:
+        calls = self._calls(model, reasoning_config)
+        if self._mode == "off":
+            return self._timed(calls[0][0], system_prompt, messages, model, reasoning_config)
+        hedge_delay = self._hedge_delay()
+        pending = {}  # future -> (provider, deadline)
+        errors = []
+        next_call = 0
+        started = time.monotonic()
+
+        def launch():
+            nonlocal next_call
+            provider, m, rc = calls[next_call]
+            next_call += 1
+            slo = self._slo(provider)
+            future = self._executor.submit(self._timed, provider, system_prompt, messages, m, rc)
+            pending[future] = (provider, time.monotonic() + slo if slo else float("inf"))
+
+        launch()
+        while pending:
+            now = time.monotonic()
+            wake = min(deadline for _, deadline in pending.values())
+            hedge_due = hedge_delay is not None and next_call == 1 and next_call < len(calls)
+            if hedge_due:
+                wake = min(wake, started + hedge_delay)
+            timeout = None if wake == float("inf") else max(0.0, wake - now)
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                provider, _ = pending.pop(future)
+                try:
+                    return future.result()
+                except Exception as e:
+                    errors.append(f"{provider.name}: {e}")
+            now = time.monotonic()
+            for future, (provider, deadline) in list(pending.items()):
+                if now >= deadline:
+                    del pending[future]
+                    self._histograms[provider.name].record_error(timeout=True)
+                    errors.append(f"{provider.name}: no answer within its SLO")
+            if next_call < len(calls) and (not pending or (hedge_due and now >= started + hedge_delay)):
+                if pending:
+                    print(f"RoutedProvider: hedging {self.name} with {calls[next_call][0].name}")
+                launch()
+        raise RuntimeError(f"All providers failed: {'; '.join(errors)}")
+
+    async def agenerate(self, system_prompt: str, messages: list,
+                        model: str | None = None,
+                        reasoning_config: dict | None = None) -> LLMResponse:
+        calls = self._calls(model, reasoning_config)
+        hedge_delay = self._hedge_delay()
+        pending = {}  # task -> (provider, deadline)
+        errors = []
+        next_call = 0
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+
+        async def timed(provider, m, rc):
+            start = time.perf_counter()
+            try:
+                response = await provider.agenerate(system_prompt, messages, model=m, reasoning_config=rc)
+            except Exception:
+                self._histograms[provider.name].record_error()
+                raise
+            self._histograms[provider.name].record((time.perf_counter() - start) * 1000, response)
+            return response
+
+        def launch():
+            nonlocal next_call
+            provider, m, rc = calls[next_call]
+            next_call += 1
+            slo = self._slo(provider)
+            task = asyncio.ensure_future(timed(provider, m, rc))
+            pending[task] = (provider, loop.time() + slo if slo else float("inf"))
+
+        launch()
+        try:
+            while pending:
+                wake = min(deadline for _, deadline in pending.values())
+                hedge_due = hedge_delay is not None and next_call == 1 and next_call < len(calls)
+                if hedge_due:
+                    wake = min(wake, started + hedge_delay)
+                timeout = None if wake == float("inf") else max(0.0, wake - loop.time())
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    provider, _ = pending.pop(task)
+                    try:
+                        return task.result()
+                    except Exception as e:
+                        errors.append(f"{provider.name}: {e}")
+                now = loop.time()
+                for task, (provider, deadline) in list(pending.items()):
+                    if now >= deadline:
+                        del pending[task]
+                        task.cancel()
+                        self._histograms[provider.name].record_error(timeout=True)
+                        errors.append(f"{provider.name}: no answer within its SLO")
+                if next_call < len(calls) and (not pending or (hedge_due and now >= started + hedge_delay)):
+                    launch()
+        finally:
+            # The losing hedge (or anything left on error) is cancelled, not awaited
+            for task in pending:
+                task.cancel()
+        raise RuntimeError(f"All providers failed: {'; '.join(errors)}")
+
+    def _pump(self, provider, system_prompt, messages, model, reasoning_config,
+              key: int, out: queue.Queue, stop: threading.Event) -> None:
+        """Feed one provider's stream into out as (key, item); an exception or None ends it."""
+        start = time.perf_counter()
+        try:
+            chunks = provider.stream(system_prompt, messages, model=model, reasoning_config=reasoning_config)
+            try:
+                for item in chunks:
+                    if stop.is_set():
+                        return
+                    if item.response is not None:
+                        latency = (time.perf_counter() - start) * 1000
+                        self._histograms[provider.name].record(latency, item.response)
+                    out.put((key, item))
+            finally:
+                chunks.close()
+        except Exception as e:
+            if not stop.is_set():
+                self._histograms[provider.name].record_error()
+            out.put((key, e))
+            return
+        out.put((key, None))
+
+    def stream(self, system_prompt: str, messages: list,
+               model: str | None = None,
+               reasoning_config: dict | None = None) -> Iterator[LLMStreamChunk]:
+        """Stream from the first provider that starts answering within its SLO.
+
+        A provider that errors, or sends no token within its SLO, before
+        its first token is replaced by the next one (with hedging, the next
+        one starts at half the SLO and the first to send a token wins).
+        Once tokens have been sent to the client there is no switching, so
+        later errors propagate.
+        """
+        calls = self._calls(model, reasoning_config)
+        if self._mode == "off":
+            provider = calls[0][0]
+            start = time.perf_counter()
+            try:
+                for item in provider.stream(system_prompt, messages, model=model,
+                                            reasoning_config=reasoning_config):
+                    if item.response is not None:
+                        latency = (time.perf_counter() - start) * 1000
+                        self._histograms[provider.name].record(latency, item.response)
+                    yield item
+            except Exception:
+                self._histograms[provider.name].record_error()
+                raise
+            return
+
+        out = queue.Queue()
+        stops = []
+        pending = {}  # key -> (provider, first-token deadline)
+        errors = []
+        started = time.monotonic()
+        hedge_at = None
+        if self._mode == "hedge" and len(calls) > 1:
+            hedge_at = started + max(self._slo(calls[0][0]) / 2, self._hedge_min_ms / 1000)
+
+        def launch():
+            key = len(stops)
+            provider, m, rc = calls[key]
+            stops.append(threading.Event())
+            self._executor.submit(self._pump, provider, system_prompt, messages, m, rc, key, out, stops[key])
+            pending[key] = (provider, time.monotonic() + self._slo(provider))
+
+        try:
+            launch()
+            chosen = None
+            while chosen is None:
+                if not pending:
+                    if len(stops) == len(calls):
+                        raise RuntimeError(f"All providers failed: {'; '.join(errors)}")
+                    launch()
+                wake = min(deadline for _, deadline in pending.values())
+                if hedge_at is not None and len(stops) == 1:
+                    wake = min(wake, hedge_at)
+                try:
+                    key, item = out.get(timeout=max(0.0, wake - time.monotonic()))
+                except queue.Empty:
+                    key, item = None, None
+                now = time.monotonic()
+                if key in pending:
+                    provider, _ = pending[key]
+                    if isinstance(item, LLMStreamChunk):
+                        chosen = key
+                    else:
+                        del pending[key]
+                        errors.append(f"{provider.name}: {item or 'stream ended without a response'}")
+                for k, (provider, deadline) in list(pending.items()):
+                    if k != chosen and now >= deadline:
+                        del pending[k]
+                        stops[k].set()
+                        self._histograms[provider.name].record_error(timeout=True)
+                        errors.append(f"{provider.name}: no first token within its SLO")
+                if (chosen is None and hedge_at is not None and len(stops) == 1 and pending
+                        and now >= hedge_at):
+                    print(f"RoutedProvider: hedging stream of {self.name} with {calls[1][0].name}")
+                    launch()
+
+            # The losing hedge (if any) is abandoned; its output is ignored
+            for k in pending:
+                if k != chosen:
+                    stops[k].set()
+            while True:
+                if key == chosen:
+                    if item is None:
+                        return
+                    if isinstance(item, Exception):
+                        raise item
+                    yield item
+                key, item = out.get()
+        finally:
+            for stop in stops:
+                stop.set()
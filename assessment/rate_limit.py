@@ -0,0 +1,216 @@
+"""Per-client chat rate limiting with a sliding-window counter.
+
+Each key (client IP) keeps just three numbers: the start of the current
+fixed window and the request counts of the current and previous windows.
+The sliding-window estimate weights the previous window by how much of
+it still overlaps the last ``window`` seconds:
+
+    estimate = previous * (1 - elapsed / window) + current
+
+so memory per key is constant, however many requests a client makes.
+
+Backends:
+- memory: per-process LRU (each gunicorn worker enforces its own limit)
+- sqlite: a local SQLite file shared by every worker on the instance, so
+  the limit holds per instance rather than per worker
+
+Keys idle for two windows carry no state worth keeping and are evicted.
+
+Select with RATE_LIMIT_BACKEND=memory|sqlite (default memory).
+"""
+import math
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+
+from sqlite_conn import SQLiteConnections
+
+
+@dataclass
+class RateLimitResult:
+    """Outcome of one rate-limit check."""
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_after: float   # seconds until the current window ends
+    retry_after: float   # seconds until a request would be allowed (0 if allowed)
+
+    def headers(self) -> dict:
+        """Standard rate-limit response headers."""
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(math.ceil(self.reset_after)),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(math.ceil(self.retry_after))
+        return headers
+
+
+def _slide(state: tuple | None, now: float, window: float) -> tuple:
+    """Advance (window_start, previous, current) to the window containing now."""
+    start = now - now % window
+    if state is None:
+        return start, 0, 0
+    old_start, previous, current = state
+    if start == old_start:
+        return state
+    if start - old_start == window:
+        return start, current, 0
+    return start, 0, 0  # idle for a whole window or more
+
+
+def _decide(state: tuple, now: float, window: float, limit: int) -> tuple:
+    """(allowed, new_state, result fields) for one request against a slid state."""
+    start, previous, current = state
+    elapsed = now - start
+    weight = 1 - elapsed / window
+    estimate = previous * weight + current
+    allowed = estimate + 1 <= limit
+    if allowed:
+        current += 1
+        estimate += 1
+        retry_after = 0.0
+    elif current < limit and previous:
+        # Within this window, once enough of the previous one has slid out
+        retry_after = max(0.0, window * (1 - (limit - current - 1) / previous) - elapsed)
+    else:
+        # Only in the next window, once enough of this one has slid out
+        retry_after = (window - elapsed) + window * max(0.0, 1 - (limit - 1) / max(current, 1))
+    remaining = max(0, math.floor(limit - estimate))
+    return allowed, (start, previous, current), remaining, window - elapsed, retry_after
+
+
+class RateLimitBackend(ABC):
+    """Stores (window_start, previous, current) per key and applies one request atomically."""
+
+    name = ""
+
+    @abstractmethod
+    def hit(self, key: str, now: float, window: float, limit: int) -> tuple:
+        """Count a request for key if allowed.
+
+        Returns:
+            (allowed, remaining, reset_after, retry_after)
+        """
+        ...
+
+    @abstractmethod
+    def size(self) -> int:
+        """Number of keys currently tracked."""
+        ...
+
+
+class MemoryBackend(RateLimitBackend):
+    """In-process LRU of key -> window state, bounded by max_keys."""
+
+    name = "memory"
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._states: OrderedDict[str, tuple] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key, now, window, limit):
+        with self._lock:
+            state = _slide(self._states.get(key), now, window)
+            allowed, state, remaining, reset_after, retry_after = _decide(state, now, window, limit)
+            self._states[key] = state
+            self._states.move_to_end(key)
+            # Least recently used first: evict keys idle for two windows, and
+            # the oldest beyond max_keys
+            while self._states:
+                oldest_key, (start, _, _) = next(iter(self._states.items()))
+                if start > now - 2 * window and len(self._states) <= self.max_keys:
+                    break
+                del self._states[oldest_key]
+        return allowed, remaining, reset_after, retry_after
+
+    def size(self):
+        with self._lock:
+            return len(self._states)
+
+
+class SQLiteBackend(RateLimitBackend):
+    """SQLite table shared across worker processes (WAL mode, one connection per thread)."""
+
+    name = "sqlite"
+
+    # Share of hits that also sweep idle keys out of the table
+    _SWEEP_PROBABILITY = 0.01
+
+    def __init__(self, path: Path):
+        self.db = SQLiteConnections(path)
+        self.path = self.db.path
+        self.db.conn().execute(
+            "CREATE TABLE IF NOT EXISTS rate_limits ("
+            " key TEXT PRIMARY KEY, window_start REAL NOT NULL,"
+            " previous INTEGER NOT NULL, current INTEGER NOT NULL)"
+        )
+
+    def hit(self, key, now, window, limit):
+        # The write transaction takes the lock up front, so the read-modify-write
+        # below is atomic across worker processes
+        def decide(conn):
+            row = conn.execute(
+                "SELECT window_start, previous, current FROM rate_limits WHERE key = ?", (key,)
+            ).fetchone()
+            state = _slide(tuple(row) if row else None, now, window)
+            allowed, state, remaining, reset_after, retry_after = _decide(state, now, window, limit)
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_limits (key, window_start, previous, current) VALUES (?, ?, ?, ?)",
+                (key, *state),
+            )
+            if random.random() < self._SWEEP_PROBABILITY:
+                conn.execute("DELETE FROM rate_limits WHERE window_start <= ?", (now - 2 * window,))
+            return allowed, remaining, reset_after, retry_after
+
+        return self.db.write(decide)
+
+    def size(self):
+        return self.db.conn().execute("SELECT COUNT(*) FROM rate_limits").fetchone()[0]
+
+
+class RateLimiter:
+    """Allows ``limit`` requests per key in any sliding ``window`` seconds."""
+
+    def __init__(self, backend: RateLimitBackend, limit: int = 30, window: float = 3600):
+        self.backend = backend
+        self.limit = limit
+        self.window = window
+
+    def check(self, key: str) -> RateLimitResult:
+        """Count a request for key and report whether it is allowed.
+
+        If the backend fails the request is allowed: a broken limiter must
+        not take chat down with it.
+        """
+        try:
+            allowed, remaining, reset_after, retry_after = self.backend.hit(
+                key, time.time(), self.window, self.limit)
+        except Exception as e:
+            print(f"RateLimiter: check failed, allowing request: {e}")
+            return RateLimitResult(True, self.limit, self.limit, self.window, 0.0)
+        return RateLimitResult(allowed, self.limit, remaining, reset_after, retry_after)
+
+
+def create_rate_limiter(backend: str, limit: int = 30, window: float = 3600,
+                        path: Path | None = None, max_keys: int = 100000) -> RateLimiter:
+    """Build the configured rate limiter.
+
+    Args:
+        backend: 'memory' (per worker) or 'sqlite' (shared by the workers on an instance)
+        limit: Requests allowed per key per window
+        window: Window length in seconds
+        path: SQLite file for the sqlite backend
+        max_keys: Most keys the memory backend tracks before evicting the least recent
+    """
+    if backend == "memory":
+        return RateLimiter(MemoryBackend(max_keys), limit=limit, window=window)
+    if backend == "sqlite":
+        return RateLimiter(SQLiteBackend(path), limit=limit, window=window)
+    raise ValueError(f"Unknown rate limit backend: {backend}. Use 'memory' or 'sqlite'.")
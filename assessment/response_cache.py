@@ -0,0 +1,287 @@
+"""Opt-in cache of finished chat responses.
+
+A response is reused only when everything that shaped it matches: the
+provider, model, reasoning config, normalized question and the IDs of the
+retrieved chunks (so re-indexing the framework naturally invalidates old
+answers). Only first-turn questions are cached; with history the answer
+depends on the conversation.
+
+Backends:
+- memory: per-process LRU with TTL (each gunicorn worker has its own)
+- sqlite: a local SQLite file shared by every worker on the instance
+
+Enable with RESPONSE_CACHE_BACKEND=memory|sqlite (default off).
+
+With RESPONSE_CACHE_SIMILARITY set, a miss on the exact key falls back to
+a semantic lookup: SemanticIndex holds the query embeddings of cached
+questions (the vectors SearchEngine already computed for retrieval) and
+returns the answer of the nearest one above the cosine threshold, for the
+same provider, model and reasoning config. Paraphrased questions then hit
+the cache even when retrieval picks slightly different chunks.
+"""
+import hashlib
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import asdict, replace
+from pathlib import Path
+
+import numpy as np
+
+from embeddings.query_cache import normalize_query
+from llm.base import LLMResponse
+from sqlite_conn import SQLiteConnections
+
+
+class ResponseCacheBackend(ABC):
+    """Key/value store of JSON-serializable responses with TTL and a size bound."""
+
+    name = ""
+
+    @abstractmethod
+    def get(self, key: str) -> dict | None:
+        """Return the stored value, or None if missing or expired."""
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: dict, ttl: float) -> None:
+        """Store value for ttl seconds, evicting least recently used entries if full."""
+        ...
+
+    @abstractmethod
+    def size(self) -> int:
+        ...
+
+
+class MemoryBackend(ResponseCacheBackend):
+    """In-process LRU of key -> (expires_at, value)."""
+
+    name = "memory"
+
+    def __init__(self, max_size: int = 2048):
+        self.max_size = max_size
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def size(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class SQLiteBackend(ResponseCacheBackend):
+    """SQLite table shared across worker processes (WAL mode, one connection per thread)."""
+
+    name = "sqlite"
+
+    def __init__(self, path: Path, max_size: int = 2048):
+        self.db = SQLiteConnections(path)
+        self.path = self.db.path
+        self.max_size = max_size
+        conn = self.db.conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+
+    def get(self, key):
+        now = time.time()
+        conn = self.db.conn()
+        row = conn.execute(
+            "SELECT value FROM responses WHERE key = ? AND expires_at >= ?", (key, now)
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl):
+        now = time.time()
+
+        def write(conn):
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now + ttl, now),
+            )
+            conn.execute("DELETE FROM responses WHERE expires_at < ?", (now,))
+            conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                " SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_size,),
+            )
+
+        self.db.write(write)
+
+    def size(self):
+        return self.db.conn().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+
+class SemanticIndex:
+    """Bounded in-process vector index: question embedding -> exact cache key.
+
+    A fixed-size ring buffer (oldest entries are overwritten) scored with
+    one matrix-vector product; at a few thousand entries a lookup costs
+    well under a millisecond.
+    """
+
+    def __init__(self, max_size: int = 2048, threshold: float = 0.95):
+        self.max_size = max_size
+        self.threshold = threshold
+        self._vectors = None  # allocated on first add, once the dimension is known
+        self._keys = [None] * max_size
+        self._scopes = [None] * max_size
+        self._expires = np.zeros(max_size)
+        self._next = 0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def add(self, scope: str, vector: np.ndarray, key: str, expires_at: float) -> None:
+        v = np.asarray(vector, dtype=np.float32)
+        v = v / max(float(np.linalg.norm(v)), 1e-12)
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != len(v):
+                # First entry, or the embedder changed: start over
+                self._vectors = np.zeros((self.max_size, len(v)), dtype=np.float32)
+                self._next = self._count = 0
+            i = self._next
+            self._vectors[i] = v
+            self._keys[i] = key
+            self._scopes[i] = scope
+            self._expires[i] = expires_at
+            self._next = (i + 1) % self.max_size
+            self._count = min(self._count + 1, self.max_size)
+
+    def nearest(self, scope: str, vector: np.ndarray) -> str | None:
+        """Exact cache key of the most similar live question in scope, if above threshold."""
+        q = np.asarray(vector, dtype=np.float32)
+        q = q / max(float(np.linalg.norm(q)), 1e-12)
+        with self._lock:
+            if not self._count or self._vectors.shape[1] != len(q):
+                return None
+            scores = self._vectors[:self._count] @ q
+            live = self._expires[:self._count] >= time.time()
+            in_scope = np.fromiter((s == scope for s in self._scopes[:self._count]), dtype=bool,
+                                   count=self._count)
+            scores[~(live & in_scope)] = -1.0
+            best = int(np.argmax(scores))
+            return self._keys[best] if scores[best] >= self.threshold else None
+
+
+class ResponseCache:
+    """Chat response cache over a pluggable backend, with hit/miss counters."""
+
+    def __init__(self, backend: ResponseCacheBackend, ttl: float = 86400,
+                 semantic: SemanticIndex | None = None):
+        self.backend = backend
+        self.ttl = ttl
+        self.semantic = semantic
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def scope(provider: str, model: str, reasoning_config: dict | None) -> str:
+        """Everything besides the question that must match for an answer to be reused."""
+        return json.dumps([provider, model, reasoning_config], sort_keys=True)
+
+    @staticmethod
+    def key(scope: str, question: str, chunk_ids: list) -> str:
+        payload = json.dumps([scope, normalize_query(question), chunk_ids])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _fetch(self, key: str) -> dict | None:
+        try:
+            return self.backend.get(key)
+        except Exception as e:
+            print(f"ResponseCache: lookup failed: {e}")
+            return None
+
+    def get(self, key: str, scope: str | None = None, query_vector=None) -> LLMResponse | None:
+        """Cached response for key, else for the nearest similar question; None on a miss.
+
+        The returned latency is the lookup time.
+        """
+        start = time.perf_counter()
+        value = self._fetch(key)
+        semantic = False
+        if value is None and self.semantic is not None and query_vector is not None:
+            similar = self.semantic.nearest(scope, query_vector)
+            if similar is not None:
+                value = self._fetch(similar)
+                semantic = value is not None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.semantic_hits += 1 if semantic else 0
+        return replace(LLMResponse(**value), latency_ms=(time.perf_counter() - start) * 1000,
+                       first_token_ms=None)
+
+    def put(self, key: str, response: LLMResponse, scope: str | None = None, query_vector=None) -> None:
+        try:
+            self.backend.set(key, asdict(response), self.ttl)
+        except Exception as e:
+            print(f"ResponseCache: store failed: {e}")
+            return
+        if self.semantic is not None and query_vector is not None:
+            self.semantic.add(scope, query_vector, key, time.time() + self.ttl)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            hits, semantic_hits, misses = self.hits, self.semantic_hits, self.misses
+        try:
+            size = self.backend.size()
+        except Exception:
+            size = None
+        return {
+            "backend": self.backend.name,
+            "size": size,
+            "hits": hits,
+            "semantic_hits": semantic_hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "ttl": self.ttl,
+            "similarity_threshold": self.semantic.threshold if self.semantic else None,
+        }
+
+
+def create_response_cache(backend: str, max_size: int = 2048, ttl: float = 86400,
+                          path: Path | None = None,
+                          similarity: float | None = None) -> ResponseCache | None:
+    """Build the configured response cache, or None when backend is 'off'.
+
+    Args:
+        similarity: Cosine threshold for semantic hits, or None for exact matching only
+    """
+    if backend == "off":
+        return None
+    semantic = SemanticIndex(max_size, similarity) if similarity is not None else None
+    if backend == "memory":
+        return ResponseCache(MemoryBackend(max_size), ttl=ttl, semantic=semantic)
+    if backend == "sqlite":
+        return ResponseCache(SQLiteBackend(path, max_size), ttl=ttl, semantic=semantic)
+    raise ValueError(f"Unknown response cache backend: {backend}. Use 'off', 'memory' or 'sqlite'.")
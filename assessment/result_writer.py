@@ -0,0 +1,226 @@
+"""Write-behind persistence of assessment results.
+
+submit_assessment only enqueues its result; a background flusher writes
+queued results to storage in bulk (storage.store_results: one commit per
+batch instead of one write RPC per submission), so submission latency no
+longer depends on the datastore.
+
+Bounds:
+- a flush runs once ``batch_size`` results are queued, or ``flush_interval``
+  seconds after the first one, whichever comes first
+- at most ``max_queue`` results wait in memory; beyond that they are
+  appended to the spill directory
+
+When a flush fails (datastore down, quota), the batch is spilled to a
+JSONL file in ``spill_dir`` and retried with exponential backoff; spilled
+files from any worker on the instance are replayed once writes succeed
+again. close() (registered with atexit, so it runs on a graceful worker
+shutdown) flushes what is left, spilling it if the datastore is still down.
+
+Spill files and their life cycle (one writer per file, so no cross-process
+locking is needed):
+- ``spill-<pid>-<seq>.jsonl.open``: appended to by worker <pid> only
+- ``spill-<pid>-<seq>.jsonl``: closed (rotated by its owner before it
+  replays); any worker may claim it
+- ``spill-<pid>-<seq>.jsonl.replay-<claimer>``: being replayed
+
+A worker claims a file by renaming it, which only one worker can win. Open
+and replaying files whose owning process no longer exists (a crash) are
+claimed like closed ones. Replay is at-least-once: a crash mid-replay may
+write some results of a batch twice.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+_MAX_BACKOFF = 60.0
+
+
+class ResultWriter:
+    """Bounded in-memory queue of results with a background bulk flusher."""
+
+    def __init__(self, store_fn, spill_dir: Path, batch_size: int = 200,
+                 flush_interval: float = 2.0, max_queue: int = 10000):
+        """
+        Args:
+            store_fn: Writes a list of result dicts in bulk (storage.store_results)
+            spill_dir: Directory for results that could not be written yet
+            batch_size: Results per flush (and the queue length that triggers one)
+            flush_interval: Maximum seconds a result waits before being flushed
+            max_queue: Results held in memory before new ones go straight to disk
+        """
+        self.store_fn = store_fn
+        self.spill_dir = Path(spill_dir)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self._queue: list = []
+        self._cond = threading.Condition()
+        self._spill_lock = threading.Lock()
+        self._pid = os.getpid()
+        self._spill_seq = 0
+        self._closed = False
+        self._backoff = 0.0
+        self._thread = threading.Thread(target=self._run, name="result-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, sae_level: int, epias_stage: str) -> None:
+        """Queue one result for writing; never blocks on the datastore."""
+        result = {"sae_level": sae_level, "epias_stage": epias_stage,
+                  "timestamp": datetime.now(timezone.utc).isoformat()}
+        with self._cond:
+            if len(self._queue) < self.max_queue and not self._closed:
+                self._queue.append(result)
+                # Wake the flusher on the first result, so its flush_interval
+                # starts now rather than after the flusher's idle wait
+                if len(self._queue) == 1 or len(self._queue) >= self.batch_size:
+                    self._cond.notify()
+                return
+        self._spill([result])
+
+    def _take(self) -> list:
+        """Wait until a batch is due, then remove it from the queue."""
+        with self._cond:
+            deadline = None
+            while not self._closed:
+                if len(self._queue) >= self.batch_size and not self._backoff:
+                    break
+                if self._queue and deadline is None:
+                    deadline = time.monotonic() + max(self.flush_interval, self._backoff)
+                timeout = None if deadline is None else deadline - time.monotonic()
+                if timeout is not None and timeout <= 0:
+                    break
+                # Wake periodically even when idle, to replay spilled results
+                self._cond.wait(timeout if timeout is not None else max(self.flush_interval, self._backoff))
+                if deadline is None and self._has_spilled():
+                    break
+            batch = self._queue[:self.batch_size]
+            del self._queue[:self.batch_size]
+            return batch
+
+    def _run(self):
+        while not self._closed:
+            batch = self._take()
+            if self._closed:
+                # close() flushes whatever is left, including this batch
+                with self._cond:
+                    self._queue[:0] = batch
+                return
+            if self._flush(batch):
+                self._replay()
+
+    def _flush(self, batch: list) -> bool:
+        """Write a batch; on failure spill it and back off. True if the datastore is up."""
+        if not batch:
+            return True
+        try:
+            self.store_fn(batch)
+        except Exception as e:
+            self._backoff = min(_MAX_BACKOFF, max(self.flush_interval, self._backoff * 2))
+            print(f"ResultWriter: write of {len(batch)} results failed, spilled to disk "
+                  f"(retry in {self._backoff:g}s): {e}")
+            self._spill(batch)
+            return False
+        self._backoff = 0.0
+        return True
+
+    def _open_spill_path(self) -> Path:
+        return self.spill_dir / f"spill-{self._pid}-{self._spill_seq}.jsonl.open"
+
+    def _spill(self, results: list) -> None:
+        if not results:
+            return
+        with self._spill_lock:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+            with open(self._open_spill_path(), "a", encoding="utf-8") as f:
+                f.writelines(json.dumps(r) + "\n" for r in results)
+
+    def _rotate(self) -> None:
+        """Close this worker's spill file, making it claimable; later spills start a new one."""
+        with self._spill_lock:
+            path = self._open_spill_path()
+            if path.exists():
+                os.replace(path, path.with_suffix(""))
+                self._spill_seq += 1
+
+    def _has_spilled(self) -> bool:
+        return self.spill_dir.exists() and any(self.spill_dir.glob("spill-*"))
+
+    def _claimable(self) -> list:
+        """Closed spill files, plus open or replaying ones left behind by dead workers."""
+        if not self.spill_dir.exists():
+            return []
+        files = sorted(self.spill_dir.glob("spill-*.jsonl"))
+        for path in sorted(self.spill_dir.glob("spill-*.jsonl.*")):
+            if path.suffix == ".open":
+                owner = path.name.split("-")[1]
+            else:
+                owner = path.suffix.removeprefix(".replay-")
+            if owner.isdigit() and int(owner) != self._pid and not _pid_alive(int(owner)):
+                files.append(path)
+        return files
+
+    def _replay(self) -> None:
+        """Write spilled results from every worker, claiming each file by renaming it."""
+        self._rotate()
+        for path in self._claimable():
+            base = path.name[:path.name.index(".jsonl") + len(".jsonl")]
+            claimed = path.with_name(f"{base}.replay-{self._pid}")
+            try:
+                os.rename(path, claimed)
+            except OSError:
+                continue  # another worker claimed it
+            with open(claimed, encoding="utf-8") as f:
+                results = [json.loads(line) for line in f if line.strip()]
+            for start in range(0, len(results), self.batch_size):
+                if not self._flush(results[start:start + self.batch_size]):
+                    # _flush spilled the failed batch; keep the rest for later too
+                    self._spill(results[start + self.batch_size:])
+                    claimed.unlink()
+                    return
+            claimed.unlink()
+            print(f"ResultWriter: replayed {len(results)} spilled results")
+
+    def close(self) -> None:
+        """Stop the flusher and write (or spill) everything still queued."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout=10)
+        with self._cond:
+            remaining, self._queue = self._queue, []
+        for start in range(0, len(remaining), self.batch_size):
+            if not self._flush(remaining[start:start + self.batch_size]):
+                self._spill(remaining[start + self.batch_size:])
+                break
+        self._rotate()
+
+
+def _pid_alive(pid: int) -> bool:
+    """Whether a process with this pid exists (on this host)."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # exists, owned by another user
+    except OSError:
+        return True  # can't tell: leave its files alone
+    return True
+
+
+def create_result_writer(spill_dir: Path, batch_size: int = 200, flush_interval: float = 2.0,
+                         max_queue: int = 10000) -> ResultWriter | None:
+    """Write-behind writer for storage.store_results, or None when storage is off."""
+    from storage import get_storage, store_results
+    if get_storage() is None:
+        return None
+    return ResultWriter(store_results, spill_dir, batch_size=batch_size,
+                        flush_interval=flush_interval, max_queue=max_queue)
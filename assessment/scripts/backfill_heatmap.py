@@ -0,0 +1,50 @@
+"""Backfill or reconcile the materialized heatmap counters.
+
+Counts every stored assessment result once and compares the totals with
+the aggregate counters that /api/heatmap reads (sharded documents in
+Firestore, the heatmap_counts table in SQLite). With --apply the
+differences are written; in Firestore the counters are also marked
+complete, after which heatmap reads stop falling back to scanning all
+results. Safe to run while the app is serving: results and counters are
+read at the same point in time (a single transaction in SQLite, a
+read_time snapshot in Firestore).
+
+Usage:
+    cd assessment
+    STORAGE_BACKEND=firestore python scripts/backfill_heatmap.py          # report only
+    STORAGE_BACKEND=firestore python scripts/backfill_heatmap.py --apply
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# Add package root to path
+pkg_root = Path(__file__).parent.parent
+sys.path.insert(0, str(pkg_root))
+
+from dotenv import load_dotenv
+load_dotenv(pkg_root / ".env")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill/reconcile heatmap counters")
+    parser.add_argument("--apply", action="store_true",
+                        help="Write the corrections (default: only report differences)")
+    args = parser.parse_args()
+
+    from storage import reconcile_heatmap
+
+    print("Counting stored results and reading counters...")
+    diff = reconcile_heatmap(apply=args.apply)
+    if not diff:
+        print("Counters match the stored results.")
+    for key, n in sorted(diff.items()):
+        print(f"  {key}: {n:+d}")
+    if args.apply:
+        print(f"Applied {len(diff)} correction(s).")
+    elif diff:
+        print("Re-run with --apply to write these corrections.")
+
+
+if __name__ == "__main__":
+    main()
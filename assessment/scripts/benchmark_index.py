@@ -0,0 +1,87 @@
+"""Recall@k and latency of the IVF index against exact search.
+
+Uses a synthetic clustered corpus by default (the shipped index is too small
+for approximate search to matter), or the real vector store with --real.
+
+Usage:
+    cd assessment
+    python scripts/benchmark_index.py
+    python scripts/benchmark_index.py --n 50000 --dim 768 --nprobe 1 4 8 16 32
+    python scripts/benchmark_index.py --real
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Add package root to path
+pkg_root = Path(__file__).parent.parent
+sys.path.insert(0, str(pkg_root))
+
+from embeddings.index import ExactIndex, IVFIndex
+from embeddings.store import normalize_rows
+
+
+def synthetic_corpus(n: int, dim: int, n_topics: int, rng) -> np.ndarray:
+    """Unit vectors scattered around random topic directions, like real embeddings."""
+    topics = normalize_rows(rng.standard_normal((n_topics, dim)))
+    assign = rng.integers(0, n_topics, n)
+    return normalize_rows(topics[assign] + 1.5 * rng.standard_normal((n, dim)) / np.sqrt(dim))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IVF recall@k / latency benchmark")
+    parser.add_argument("--n", type=int, default=20_000, help="Synthetic corpus size")
+    parser.add_argument("--dim", type=int, default=512, help="Synthetic vector dimensions")
+    parser.add_argument("--topics", type=int, default=200, help="Synthetic topic clusters")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--n-lists", type=int, default=None, help="IVF clusters (default: ~sqrt(N))")
+    parser.add_argument("--nprobe", nargs="+", type=int, default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--real", action="store_true", help="Use data/embeddings/vectors.npy")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.real:
+        from config import settings
+        from embeddings.store import open_vectors
+        import json
+        with open(settings.embeddings_dir / "manifest.json", "r", encoding="utf-8") as f:
+            store = json.load(f).get("store")
+        vectors = np.asarray(open_vectors(settings.embeddings_dir, store), dtype=np.float32)
+    else:
+        vectors = synthetic_corpus(args.n, args.dim, args.topics, rng)
+    # Queries are perturbed corpus rows, so each has a meaningful neighbourhood
+    picks = rng.integers(0, len(vectors), args.queries)
+    queries = normalize_rows(vectors[picks] + 0.05 * rng.standard_normal((args.queries, vectors.shape[1])))
+
+    print(f"Corpus: {vectors.shape[0]} x {vectors.shape[1]}, {args.queries} queries, k={args.top_k}")
+    start = time.perf_counter()
+    ivf = IVFIndex.build(vectors, n_lists=args.n_lists)
+    print(f"IVF build: {ivf.n_lists} lists in {time.perf_counter() - start:.1f}s\n")
+
+    exact = ExactIndex(vectors)
+    truth = []
+    start = time.perf_counter()
+    for q in queries:
+        truth.append(set(exact.search(q, args.top_k)[0].tolist()))
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    print(f"{'index':>12} {'recall@k':>9} {'ms/query':>9} {'speedup':>8}")
+    print(f"{'exact':>12} {1.0:>9.3f} {exact_ms:>9.3f} {1.0:>7.1f}x")
+    for nprobe in args.nprobe:
+        ivf.nprobe = nprobe
+        hits = 0
+        start = time.perf_counter()
+        results = [ivf.search(q, args.top_k)[0] for q in queries]
+        ivf_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        for found, expected in zip(results, truth):
+            hits += len(expected.intersection(found.tolist()))
+        recall = hits / (len(queries) * args.top_k)
+        print(f"{'ivf/' + str(nprobe):>12} {recall:>9.3f} {ivf_ms:>9.3f} {exact_ms / ivf_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Micro-benchmark: latency of the storage operations behind assessments and chat.
+
+Times the calls the app makes against a storage backend: a batched result
+write (the write-behind flush), a heatmap read, and the usage accountant's
+lease, flush and read. The sqlite backend runs against a fresh temporary
+file, so numbers are reproducible on a laptop or in CI; firestore uses the
+project from the environment and writes real documents, but into
+collections named with a per-run prefix (benchmark_<time>_assessment_results,
+...), never the live ones the heatmap and usage budget read. Delete them
+afterwards. An empty --collection-prefix (the live collections) is refused
+unless --allow-live-collections is given.
+
+Usage:
+    cd assessment
+    python scripts/benchmark_storage.py
+    python scripts/benchmark_storage.py --batch-sizes 1 50 400 --prefill 100000
+    python scripts/benchmark_storage.py --backend firestore --repeats 5
+"""
+import argparse
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Add package root to path
+pkg_root = Path(__file__).parent.parent
+sys.path.insert(0, str(pkg_root))
+
+from dotenv import load_dotenv
+load_dotenv(pkg_root / ".env")
+
+
+def _time_ms(fn, repeats: int) -> float:
+    """Median wall time of fn() in milliseconds."""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def _results(n: int) -> list:
+    now = datetime.now(timezone.utc).isoformat()
+    return [{"sae_level": random.randrange(6), "epias_stage": random.choice("EPIAS"), "timestamp": now}
+            for _ in range(n)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Storage backend operation latency")
+    parser.add_argument("--backend", choices=["sqlite", "firestore"], default="sqlite")
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 10, 100, 400])
+    parser.add_argument("--prefill", type=int, default=10000,
+                        help="Results stored before timing reads (default: 10000)")
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--collection-prefix", default=f"benchmark_{int(time.time())}_",
+                        help="Firestore collection prefix (default: benchmark_<time>_)")
+    parser.add_argument("--allow-live-collections", action="store_true",
+                        help="Permit an empty --collection-prefix, i.e. writing fake results "
+                             "and usage into the live collections")
+    args = parser.parse_args()
+    if args.backend == "firestore" and not args.collection_prefix and not args.allow_live_collections:
+        parser.error("an empty --collection-prefix writes into the live collections; "
+                     "pass --allow-live-collections if that is really intended")
+
+    from storage import create_storage_backend
+
+    path = Path(tempfile.mkdtemp()) / "benchmark.sqlite3"
+    backend = create_storage_backend(args.backend, path, collection_prefix=args.collection_prefix)
+    if backend.name == "sqlite":
+        print(f"backend=sqlite ({path})")
+    else:
+        print(f"backend=firestore (collections {backend.results_collection}, "
+              f"{backend.counters_collection}, {backend.usage_collection})")
+
+    print(f"\n{'batch':>6} {'write ms':>10} {'ms/result':>10}")
+    for size in args.batch_sizes:
+        ms = _time_ms(lambda: backend.store_results(_results(size)), args.repeats)
+        print(f"{size:>6} {ms:>10.3f} {ms / size:>10.4f}")
+
+    for start in range(0, args.prefill, 400):
+        backend.store_results(_results(min(400, args.prefill - start)))
+    total = sum(backend.heatmap_counts().values())
+    print(f"\nheatmap read over {total} results: {_time_ms(backend.heatmap_counts, args.repeats):.3f} ms")
+
+    day = f"benchmark-{int(time.time())}"
+    lease = _time_ms(lambda: backend.lease_tokens(day, 20000, 10**12), args.repeats)
+    add = _time_ms(lambda: backend.add_usage(day, 1500, 1, 0), args.repeats)
+    read = _time_ms(lambda: backend.read_usage(day), args.repeats)
+    print(f"usage lease: {lease:.3f} ms   flush: {add:.3f} ms   read: {read:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Micro-benchmark: full argsort vs argpartition top-k as the corpus grows.
+
+Usage:
+    cd assessment
+    python scripts/benchmark_topk.py
+    python scripts/benchmark_topk.py --sizes 1000 100000 1000000 --top-k 10
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Add package root to path
+pkg_root = Path(__file__).parent.parent
+sys.path.insert(0, str(pkg_root))
+
+from embeddings.ranking import top_k_indices
+
+
+def _time_ms(fn, repeats: int) -> float:
+    """Median wall time of fn() in milliseconds."""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Top-k selection latency vs corpus size")
+    parser.add_argument("--sizes", nargs="+", type=int,
+                        default=[100, 1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--filter-fraction", type=float, default=0.2,
+                        help="Fraction of rows kept by the filter mask column (default: 0.2)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"top_k={args.top_k}, median of {args.repeats} runs (ms)")
+    print(f"{'N':>10} {'argsort':>10} {'argpart':>10} {'speedup':>8} {'masked':>10}")
+    for n in args.sizes:
+        scores = rng.standard_normal(n).astype(np.float32)
+        mask = rng.random(n) < args.filter_fraction
+        baseline = _time_ms(lambda: np.argsort(scores)[::-1][:args.top_k], args.repeats)
+        partial = _time_ms(lambda: top_k_indices(scores, args.top_k), args.repeats)
+        masked = _time_ms(lambda: top_k_indices(scores, args.top_k, mask), args.repeats)
+        assert list(top_k_indices(scores, args.top_k)) == list(np.argsort(scores)[::-1][:args.top_k])
+        print(f"{n:>10} {baseline:>10.3f} {partial:>10.3f} {baseline / partial:>7.1f}x {masked:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
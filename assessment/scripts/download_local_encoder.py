@@ -0,0 +1,63 @@
+"""Download the local sentence encoder used by the 'local' embedder.
+
+Fetches the ONNX export of sentence-transformers/all-MiniLM-L6-v2
+(model.onnx, ~90 MB) and its tokenizer.json from the Hugging Face hub into
+LOCAL_ENCODER_DIR/all-MiniLM-L6-v2/. The Docker image runs this at build
+time, so the encoder ships with the app and queries never leave the box.
+
+Usage:
+    cd assessment
+    python scripts/download_local_encoder.py
+    python scripts/generate_embeddings.py --embedder local
+"""
+import argparse
+import sys
+from pathlib import Path
+
+import httpx
+
+# Add package root to path
+pkg_root = Path(__file__).parent.parent
+sys.path.insert(0, str(pkg_root))
+
+from dotenv import load_dotenv
+load_dotenv(pkg_root / ".env")
+
+REPO_URL = "https://huggingface.co/sentence-transformers/{model}/resolve/main"
+FILES = {"model.onnx": "onnx/model.onnx", "tokenizer.json": "tokenizer.json"}
+
+
+def download(url: str, dest: Path) -> None:
+    tmp = dest.with_suffix(dest.suffix + ".tmp")
+    with httpx.stream("GET", url, follow_redirects=True, timeout=60) as resp:
+        resp.raise_for_status()
+        with open(tmp, "wb") as f:
+            for block in resp.iter_bytes(1 << 20):
+                f.write(block)
+    tmp.replace(dest)
+
+
+def main():
+    from config import settings
+    from embeddings.embedder import LOCAL_MODEL
+
+    parser = argparse.ArgumentParser(description="Download the local ONNX sentence encoder")
+    parser.add_argument("--model", default=LOCAL_MODEL,
+                        help=f"sentence-transformers model with an ONNX export (default: {LOCAL_MODEL})")
+    parser.add_argument("--force", action="store_true", help="Download even if the files exist")
+    args = parser.parse_args()
+
+    out = settings.local_encoder_dir / args.model
+    out.mkdir(parents=True, exist_ok=True)
+    for name, remote in FILES.items():
+        dest = out / name
+        if dest.exists() and not args.force:
+            print(f"  {dest} exists, skipping")
+            continue
+        print(f"  {remote} -> {dest}")
+        download(f"{REPO_URL.format(model=args.model)}/{remote}", dest)
+    print(f"Local encoder ready in {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,35 @@
 """Generate pre-computed embeddings for the DIT framework.
 
-Run once with OPENAI_API_KEY set:
+Run once with OPENAI_API_KEY set (or use --embedder local to stay offline,
+after scripts/download_local_encoder.py):
     cd assessment
     python scripts/generate_embeddings.py
+    python scripts/generate_embeddings.py --embedder local
+    python scripts/generate_embeddings.py --dtype float16
+    python scripts/generate_embeddings.py --index ivf --n-lists 256
+    python scripts/generate_embeddings.py --convert   # legacy embeddings.npy -> vectors-<tag>.npy, no API calls
+    python scripts/generate_embeddings.py --workers 8 # more batches in flight
+
+Runs are incremental: every chunk carries a content hash, vectors for
+unchanged chunks are reused from the current index, and only new or edited
+text is sent to the embedding API; the growth-path queries are only
+re-embedded when a chunk, a query or the embedder changed. Finished batches are checkpointed under
+data/embeddings/.checkpoints/, so re-running after an interruption only
+embeds the batches that are missing. Use --full to re-embed everything.
 
 Reads markdown from ../v-0.0.1/ (the repo's versioned content).
-Outputs:
-    data/embeddings/embeddings.npy   (N x 3072 float32)
-    data/embeddings/manifest.json    (chunk metadata)
+Outputs (<tag> is a per-run version, so a new index never overwrites the
+files a running server has open; the previous run's files are kept and
+older ones are removed):
+    data/embeddings/vectors-<tag>.npy  (N x D, unit-normalized float32 or float16)
+    data/embeddings/ivf-<tag>.npz      (only with --index ivf)
+    data/embeddings/manifest.json      (chunk metadata, data file names + growth-path index)
 """
+import argparse
+import json
 import sys
+
+import numpy as np
 from pathlib import Path
 from dataclasses import asdict
 
@@ -21,13 +41,74 @@ from dotenv import load_dotenv
 load_dotenv(pkg_root / ".env")
 
 from embeddings.chunker import MarkdownChunker
-from embeddings.generator import get_embeddings, save_embeddings
+from embeddings.embedder import create_embedder
+from embeddings.generator import (
+    MAX_WORKERS, clear_checkpoints, get_embeddings, growth_paths_key, load_existing_growth_paths,
+    load_existing_vectors, save_embeddings,
+)
+from embeddings.growth import all_cells, build_growth_index, growth_query
+from embeddings.store import LEGACY_FILE, SUPPORTED_DTYPES
 from config import settings
 
 
+def convert_legacy(dtype: str, index_params: dict):
+    """Rewrite a legacy embeddings.npy index in the normalized store format."""
+    out = settings.embeddings_dir
+    with open(out / "manifest.json", "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if data.get("store"):
+        print(f"{out} is already in the store format ({data['store']['dtype']})")
+        return
+    embeddings = np.load(out / LEGACY_FILE)
+    embedder = create_embedder({"name": "openai", "model": data["model"], "dimensions": data["dimensions"]})
+    save_embeddings(embeddings, data["chunks"], out, growth_paths=data.get("growth_paths"),
+                    dtype=dtype, embedder=embedder, **index_params)
+    print(f"Converted {LEGACY_FILE} and removed it")
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Generate DIT framework embeddings")
+    parser.add_argument("--dtype", choices=SUPPORTED_DTYPES, default="float32",
+                        help="Storage dtype for the vector store (default: float32)")
+    parser.add_argument("--convert", action="store_true",
+                        help="Convert an existing legacy embeddings.npy without re-embedding")
+    parser.add_argument("--index", choices=["exact", "ivf"], default="exact",
+                        help="Search index to build (default: exact brute force)")
+    parser.add_argument("--n-lists", type=int, default=None,
+                        help="IVF cluster count (default: ~sqrt(N))")
+    parser.add_argument("--embedder", choices=["openai", "local", "hashing"], default="openai",
+                        help="Embedding backend (default: openai; local is the ONNX MiniLM "
+                             "sentence encoder on CPU; hashing is lexical n-grams, not semantic)")
+    parser.add_argument("--dimensions", type=int, default=None,
+                        help="Embedding dimensions (default: 3072 for openai, 384 for local, "
+                             "1024 for hashing)")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS,
+                        help=f"Concurrent embedding batches in flight (default: {MAX_WORKERS})")
+    parser.add_argument("--full", action="store_true",
+                        help="Ignore the existing index and re-embed every chunk")
+    args = parser.parse_args()
+
+    index_params = {"index_type": args.index}
+    if args.index == "ivf" and args.n_lists:
+        index_params["n_lists"] = args.n_lists
+
+    if args.convert:
+        convert_legacy(args.dtype, index_params)
+        return
+
+    spec = {"name": args.embedder}
+    if args.embedder == "openai":
+        spec.update(model=settings.embedding_model, dimensions=settings.embedding_dimensions)
+    if args.dimensions:
+        spec["dimensions"] = args.dimensions
+    embedder = create_embedder(spec)
+    if embedder.name == "local" and not embedder.is_available():
+        parser.error(f"local encoder not found in {embedder.model_dir} (or onnxruntime/tokenizers "
+                     f"missing): run scripts/download_local_encoder.py")
+
     print(f"Source dir: {settings.source_dir}")
     print(f"Output dir: {settings.embeddings_dir}")
+    print(f"Embedder:   {embedder.name} ({embedder.model}, {embedder.dimensions}d)")
 
     # 1. Chunk all source markdown files
     chunker = MarkdownChunker()
@@ -41,12 +122,38 @@ def main():
     texts = [c.text for c in chunks]
     manifest = [asdict(c) for c in chunks]
 
-    # 3. Generate embeddings
-    print(f"\nGenerating embeddings for {len(texts)} chunks...")
-    embeddings = get_embeddings(texts)
+    # 3. Reuse vectors for unchanged chunks; embed only new or edited text
+    existing = {} if args.full else load_existing_vectors(settings.embeddings_dir, embedder)
+    todo = [i for i, c in enumerate(chunks) if c.content_hash not in existing]
+    print(f"\nReusing {len(chunks) - len(todo)} unchanged chunks, embedding {len(todo)} new/changed")
+    checkpoint_dir = settings.embeddings_dir / ".checkpoints"
+    fresh = get_embeddings([texts[i] for i in todo], embedder,
+                           max_workers=args.workers, checkpoint_dir=checkpoint_dir)
+    embeddings = np.zeros((len(chunks), embedder.dimensions), dtype=np.float32)
+    for row, i in enumerate(todo):
+        embeddings[i] = fresh[row]
+    for i, c in enumerate(chunks):
+        if c.content_hash in existing:
+            embeddings[i] = existing[c.content_hash]
+
+    # 4. Precompute growth-path retrieval for all matrix cells (one batched call),
+    #    unless the chunks, queries and embedder are exactly those of the current index
+    cells = all_cells()
+    queries = [growth_query(level, stage) for level, stage in cells]
+    growth_key = growth_paths_key(embedder, [c.content_hash for c in chunks], queries)
+    growth_paths = None if args.full else load_existing_growth_paths(settings.embeddings_dir, growth_key)
+    if growth_paths is not None:
+        print(f"Reusing growth paths for {len(cells)} matrix cells (nothing changed)")
+    else:
+        print(f"Resolving growth paths for {len(cells)} matrix cells...")
+        query_embeddings = get_embeddings(queries, embedder, checkpoint_dir=checkpoint_dir)
+        growth_paths = build_growth_index(embeddings, query_embeddings)
 
-    # 4. Save
-    save_embeddings(embeddings, manifest, settings.embeddings_dir)
+    # 5. Save
+    save_embeddings(embeddings, manifest, settings.embeddings_dir,
+                    growth_paths=growth_paths, growth_key=growth_key, dtype=args.dtype,
+                    embedder=embedder, **index_params)
+    clear_checkpoints(checkpoint_dir)
     print(f"\nDone! Embeddings saved to {settings.embeddings_dir}")
 
 
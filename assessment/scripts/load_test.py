@@ -0,0 +1,144 @@
+"""Compare chat throughput of the sync (gunicorn) and async (uvicorn) serving modes.
+
+Both servers run with the fake LLM provider (FAKE_LLM_LATENCY_MS) and no
+API keys, so the test is free and measures only how many slow provider
+calls an instance can hold in flight. Each request gets a distinct
+X-Forwarded-For address so the per-IP chat rate limit does not interfere.
+With --endpoint stream the SSE endpoint is measured instead: a request
+counts as ok once its "done" event has arrived.
+
+Usage:
+    cd assessment
+    python scripts/load_test.py
+    python scripts/load_test.py --requests 500 --concurrency 200 --latency-ms 2000
+    python scripts/load_test.py --modes async
+    python scripts/load_test.py --storage sqlite   # include the usage/results store
+    python scripts/load_test.py --endpoint stream  # /chat/api/message/stream (SSE)
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+pkg_root = Path(__file__).parent.parent
+
+# Mirrors the Dockerfile CMD
+SERVERS = {
+    "sync": ["gunicorn", "--workers", "2", "--threads", "4", "--timeout", "300",
+             "--bind", "127.0.0.1:{port}", "app:create_app()"],
+    "async": ["uvicorn", "asgi:app", "--host", "127.0.0.1", "--port", "{port}",
+              "--log-level", "warning"],
+}
+
+
+def start_server(mode: str, port: int, latency_ms: int, storage: str = "off") -> subprocess.Popen:
+    env = {k: v for k, v in os.environ.items()
+           if k not in ("OPENAI_API_KEY", "ANTHROPIC_API_KEY", "GOOGLE_API_KEY")}
+    # Empty keys override anything load_dotenv() would read from .env
+    env.update({
+        "FAKE_LLM_LATENCY_MS": str(latency_ms),
+        "OPENAI_API_KEY": "", "ANTHROPIC_API_KEY": "", "GOOGLE_API_KEY": "",
+        "FIRESTORE_ENABLED": "false",
+        "STORAGE_BACKEND": storage,
+        "STORAGE_PATH": str(Path(tempfile.gettempdir()) / f"dit-load-test-{port}.sqlite3"),
+        "DAILY_TOKEN_BUDGET": str(10**12),
+    })
+    cmd = [part.format(port=port) for part in SERVERS[mode]]
+    return subprocess.Popen(cmd, cwd=pkg_root, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+async def wait_ready(url: str, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(f"{url}/api/providers")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.25)
+    raise RuntimeError(f"Server at {url} did not start within {timeout}s")
+
+
+ENDPOINTS = {"message": "/chat/api/message", "stream": "/chat/api/message/stream"}
+
+
+async def run_load(url: str, n_requests: int, concurrency: int, endpoint: str = "message") -> dict:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one(i: int, client: httpx.AsyncClient):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                async with client.stream(
+                    "POST", f"{url}{ENDPOINTS[endpoint]}",
+                    json={"message": "How do I move from SAE L2 to L3?", "provider": "fake"},
+                    headers={"X-Forwarded-For": f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}"},
+                ) as resp:
+                    body = await resp.aread()
+                if resp.status_code != 200 or (endpoint == "stream" and b'"type": "done"' not in body):
+                    errors += 1
+                    return
+            except httpx.HTTPError:
+                errors += 1
+                return
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    async with httpx.AsyncClient(timeout=600, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i, client) for i in range(n_requests)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    pct = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else 0.0
+    return {
+        "ok": len(latencies),
+        "errors": errors,
+        "seconds": elapsed,
+        "rps": len(latencies) / elapsed,
+        "p50": statistics.median(latencies) if latencies else 0.0,
+        "p95": pct(0.95),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync vs async serving load test")
+    parser.add_argument("--modes", nargs="+", choices=list(SERVERS), default=list(SERVERS))
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--latency-ms", type=int, default=1000, help="Fake provider latency")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--storage", choices=["off", "sqlite"], default="off",
+                        help="Storage backend for usage and results (default: off)")
+    parser.add_argument("--endpoint", choices=list(ENDPOINTS), default="message",
+                        help="Chat endpoint to load (default: message)")
+    args = parser.parse_args()
+
+    print(f"{args.requests} {ENDPOINTS[args.endpoint]} requests, {args.concurrency} concurrent, "
+          f"fake provider latency {args.latency_ms}ms\n")
+    print(f"{'mode':<8}{'ok':>6}{'errors':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}")
+    for mode in args.modes:
+        server = start_server(mode, args.port, args.latency_ms, args.storage)
+        url = f"http://127.0.0.1:{args.port}"
+        try:
+            asyncio.run(wait_ready(url))
+            r = asyncio.run(run_load(url, args.requests, args.concurrency, args.endpoint))
+        finally:
+            server.terminate()
+            server.wait()
+        print(f"{mode:<8}{r['ok']:>6}{r['errors']:>8}{r['rps']:>9.1f}{r['p50']:>10.0f}{r['p95']:>10.0f}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,6 +6,7 @@ Usage:
     python scripts/run_evaluation.py --providers openai anthropic
     python scripts/run_evaluation.py --runs 3
     python scripts/run_evaluation.py --output evaluation_report.json
+    python scripts/run_evaluation.py --no-packing   # baseline without context packing
 """
 import argparse
 import json
@@ -24,6 +25,8 @@ def main():
     parser = argparse.ArgumentParser(description="DIT Framework LLM Evaluation Harness")
     parser.add_argument("--providers", nargs="+", help="Provider names to evaluate (default: all available)")
     parser.add_argument("--runs", type=int, default=1, help="Number of runs per question (default: 1)")
+    parser.add_argument("--no-packing", action="store_true",
+                        help="Send the full top-5 chunks instead of budget-packed context (A/B baseline)")
     parser.add_argument("--output", type=str, default=None, help="Output JSON file path")
     args = parser.parse_args()
 
@@ -37,6 +40,7 @@ def main():
 
     print("Initializing LLM providers...")
     registry = create_provider_registry()
+    registry.refresh(force=True)
 
     available = [p for p in registry.get_available_providers() if p["available"]]
     print(f"Available providers: {[p['name'] for p in available]}")
@@ -46,7 +50,7 @@ def main():
         sys.exit(1)
 
     # Run evaluation
-    harness = EvaluationHarness(registry, search_engine)
+    harness = EvaluationHarness(registry, search_engine, pack_context=not args.no_packing)
     report = harness.run(providers=args.providers, num_runs=args.runs)
 
     # Print summary
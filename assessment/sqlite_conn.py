@@ -0,0 +1,49 @@
+"""Per-thread SQLite connections to a file shared by the worker processes.
+
+Used by the SQLite backends of storage.py, rate_limit.py and
+response_cache.py. Connections use WAL mode (readers never block the
+writer) with synchronous=NORMAL, and run in autocommit mode: multi-statement
+writes go through write(), which holds the database write lock from the
+first statement (BEGIN IMMEDIATE), so a read-modify-write is atomic across
+processes.
+"""
+import sqlite3
+import threading
+from pathlib import Path
+
+
+class SQLiteConnections:
+    """One connection per thread to a WAL-mode SQLite file."""
+
+    def __init__(self, path: Path, timeout: float = 5.0):
+        """
+        Args:
+            path: Database file (its directory is created if missing)
+            timeout: Seconds to wait for another process's write lock
+        """
+        self.path = Path(path)
+        self.timeout = timeout
+        self._local = threading.local()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def conn(self) -> sqlite3.Connection:
+        """This thread's connection (autocommit: each statement commits on its own)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def write(self, fn):
+        """Run fn(conn) in one write transaction and return its result."""
+        conn = self.conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return result
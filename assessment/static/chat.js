@@ -264,26 +264,54 @@
         }
 
         try {
-            const resp = await fetch('/chat/api/message', {
+            const resp = await fetch('/chat/api/message/stream', {
                 method: 'POST',
                 headers: {'Content-Type': 'application/json'},
                 body: JSON.stringify(body),
             });
 
-            removeTypingIndicator();
-
             if (!resp.ok) {
+                removeTypingIndicator();
                 const err = await resp.json().catch(() => ({error: 'Unknown error'}));
                 addMessage('assistant', `Error: ${err.error || resp.statusText}. Please try again.`);
                 return;
             }
 
-            const data = await resp.json();
-
-            addMessage('assistant', data.response);
-            conversationHistory.push({role: 'assistant', content: data.response});
-
-            showMeta(data);
+            // Read Server-Sent Events: one JSON object per "data:" line
+            const reader = resp.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            let text = '';
+            let contentDiv = null;
+
+            while (true) {
+                const {value, done} = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, {stream: true});
+                const events = buffer.split('\n\n');
+                buffer = events.pop();
+                for (const raw of events) {
+                    if (!raw.startsWith('data: ')) continue;
+                    const event = JSON.parse(raw.slice(6));
+                    if (event.type === 'delta') {
+                        if (!contentDiv) {
+                            removeTypingIndicator();
+                            addMessage('assistant', '');
+                            contentDiv = messagesEl.lastElementChild.querySelector('.message-content');
+                        }
+                        text += event.text;
+                        contentDiv.innerHTML = formatMarkdown(text);
+                    } else if (event.type === 'done') {
+                        removeTypingIndicator();
+                        if (!contentDiv) addMessage('assistant', event.response);
+                        conversationHistory.push({role: 'assistant', content: event.response});
+                        showMeta(event);
+                    } else if (event.type === 'error') {
+                        removeTypingIndicator();
+                        addMessage('assistant', `Error: ${event.error} Please try again.`);
+                    }
+                }
+            }
 
         } catch (e) {
             removeTypingIndicator();
@@ -1,61 +1,432 @@
-"""Firestore storage for anonymous assessment results."""
+"""Storage for anonymous assessment results and daily token usage.
 
-import os
-from datetime import datetime, timezone
+Backends (STORAGE_BACKEND):
+- firestore: Google Cloud Firestore, shared by every instance
+- sqlite:    a local SQLite file in WAL mode, shared by the workers of one
+             instance (single-node deployments, laptops, CI, load tests)
+- off:       nothing is stored; the heatmap stays empty and usage is
+             tracked per process
 
+Unset, STORAGE_BACKEND follows FIRESTORE_ENABLED (firestore or off).
 
-def _is_enabled():
-    return os.environ.get("FIRESTORE_ENABLED", "").lower() in ("1", "true")
+Heatmap counts are materialized: every stored result also increments an
+aggregate counter in the same write, so a heatmap read costs the same
+however many assessments have been taken. In Firestore the counter is
+spread over HEATMAP_SHARDS documents (chosen at random, so concurrent
+submissions rarely contend on the same document); results stored before
+the counters existed are folded in once with scripts/backfill_heatmap.py,
+which also marks the counters as complete. Until then Firestore reads fall
+back to counting the results collection.
 
+Daily usage (usage_tracker) is one record per UTC date holding
+total_tokens, request_count, cache_hits and leased_tokens.
+"""
+
+import random
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from sqlite_conn import SQLiteConnections
 
 COLLECTION = "assessment_results"
+COUNTERS_COLLECTION = "heatmap_counters"
+USAGE_COLLECTION = "usage_daily"
+HEATMAP_SHARDS = 30
+# Written by reconcile_heatmap(); its presence means the shards cover all results
+_META_DOC = "_meta"
 
-_client = None
 
+def _empty_counts() -> dict:
+    return {f"{level}_{stage}": 0 for level in range(6) for stage in ["E", "P", "I", "A", "S"]}
 
-def _get_client():
-    global _client
-    if _client is None:
-        from google.cloud import firestore
-        _client = firestore.Client()
-    return _client
 
+def _cell_key(result: dict) -> str:
+    return f"{result['sae_level']}_{result['epias_stage']}"
 
-def store_result(sae_level: int, epias_stage: str) -> None:
-    """Store a single anonymous assessment result."""
-    if not _is_enabled():
-        return
-    from google.cloud import firestore as fs
-    db = _get_client()
-    db.collection(COLLECTION).add({
-        "sae_level": sae_level,
-        "epias_stage": epias_stage,
-        "cell_key": f"{sae_level}_{epias_stage}",
-        "timestamp": fs.SERVER_TIMESTAMP,
-        "app_version": "1.0",
-    })
 
+class StorageBackend(ABC):
+    """Persists assessment results, their heatmap aggregate and daily usage."""
 
-def get_heatmap_data() -> dict:
-    """Aggregate all results into a 6x5 count grid."""
-    counts = {}
-    for level in range(6):
-        for stage in ["E", "P", "I", "A", "S"]:
-            counts[f"{level}_{stage}"] = 0
+    name = ""
+
+    @abstractmethod
+    def store_results(self, results: list) -> None:
+        """Store results and count them in the heatmap.
+
+        Args:
+            results: [{"sae_level", "epias_stage", "timestamp" (ISO 8601)}, ...]
+        """
+        ...
+
+    @abstractmethod
+    def heatmap_counts(self) -> dict:
+        """{cell_key: count} for every cell of the 6x5 grid."""
+        ...
+
+    @abstractmethod
+    def reconcile_heatmap(self, apply: bool = False) -> dict:
+        """{cell_key: results - counted} for cells whose aggregate is off; fix them if apply.
+
+        Results and counters are read at one consistent point, so it is safe
+        to run while results are being written.
+        """
+        ...
+
+    @abstractmethod
+    def lease_tokens(self, day: str, tokens: int, budget: int) -> int:
+        """Atomically lease up to tokens of the day's budget; returns the amount granted."""
+        ...
+
+    @abstractmethod
+    def add_usage(self, day: str, tokens: int, requests: int, cache_hits: int, leased: int = 0) -> None:
+        """Add to the day's usage counters (leased may be negative to return a lease)."""
+        ...
+
+    @abstractmethod
+    def read_usage(self, day: str) -> dict:
+        """The day's {"tokens", "requests", "cache_hits", "leased"}."""
+        ...
+
+
+class FirestoreBackend(StorageBackend):
+    """Google Cloud Firestore.
+
+    collection_prefix namespaces every collection (e.g. "benchmark_"), so
+    tools can write to the project without touching the live data.
+    """
 
-    total = 0
+    name = "firestore"
 
-    if _is_enabled():
-        db = _get_client()
-        docs = db.collection(COLLECTION).select(["cell_key"]).stream()
-        for doc in docs:
+    def __init__(self, collection_prefix: str = ""):
+        from google.cloud import firestore
+        self.db = firestore.Client()
+        self.results_collection = collection_prefix + COLLECTION
+        self.counters_collection = collection_prefix + COUNTERS_COLLECTION
+        self.usage_collection = collection_prefix + USAGE_COLLECTION
+        self._warned_not_backfilled = False
+
+    def _shard_ref(self, shard: int):
+        return self.db.collection(self.counters_collection).document(f"shard_{shard}")
+
+    def store_results(self, results):
+        from google.cloud import firestore as fs
+        # A Firestore batch holds at most 500 writes: one per result plus one
+        # merged counter increment
+        for start in range(0, len(results), 400):
+            chunk = results[start:start + 400]
+            batch = self.db.batch()
+            increments = {}
+            for result in chunk:
+                cell_key = _cell_key(result)
+                increments[cell_key] = increments.get(cell_key, 0) + 1
+                batch.set(self.db.collection(self.results_collection).document(), {
+                    "sae_level": result["sae_level"],
+                    "epias_stage": result["epias_stage"],
+                    "cell_key": cell_key,
+                    "timestamp": datetime.fromisoformat(result["timestamp"]),
+                    "app_version": "1.0",
+                })
+            batch.set(self._shard_ref(random.randrange(HEATMAP_SHARDS)), {
+                "counts": {key: fs.Increment(n) for key, n in increments.items()},
+            }, merge=True)
+            batch.commit()
+
+    def _count_results(self, read_time=None) -> dict:
+        """Count results per cell by scanning the whole results collection (slow).
+
+        With read_time, the collection is read as of that instant.
+        """
+        counts = _empty_counts()
+        for doc in self.db.collection(self.results_collection).select(["cell_key"]).stream(read_time=read_time):
             key = doc.to_dict().get("cell_key")
             if key in counts:
                 counts[key] += 1
-                total += 1
+        return counts
+
+    def _read_shards(self, read_time=None) -> tuple:
+        """(counts summed over all shards, whether the counters were backfilled)."""
+        refs = [self._shard_ref(i) for i in range(HEATMAP_SHARDS)]
+        refs.append(self.db.collection(self.counters_collection).document(_META_DOC))
+        counts = _empty_counts()
+        backfilled = False
+        for snapshot in self.db.get_all(refs, read_time=read_time):
+            if not snapshot.exists:
+                continue
+            if snapshot.id == _META_DOC:
+                backfilled = True
+                continue
+            for key, n in (snapshot.to_dict().get("counts") or {}).items():
+                if key in counts:
+                    counts[key] += n
+        return counts, backfilled
+
+    def heatmap_counts(self):
+        counts, backfilled = self._read_shards()
+        if backfilled:
+            return counts
+        if not self._warned_not_backfilled:
+            print("storage: heatmap counters not backfilled yet, counting all results "
+                  "(run scripts/backfill_heatmap.py)")
+            self._warned_not_backfilled = True
+        return self._count_results()
+
+    def reconcile_heatmap(self, apply=False):
+        from google.cloud import firestore as fs
+        # Shards and results are read at the same instant: store_results()
+        # commits a result and its shard increment in one batch, so the
+        # snapshot is consistent, and writes after it change both sides
+        # equally. The diff is applied as an increment, which keeps it correct
+        # while writes continue. Firestore keeps old versions for an hour, so
+        # the scan must finish within that; a second back avoids clock skew.
+        read_time = datetime.now(timezone.utc) - timedelta(seconds=1)
+        counted, _ = self._read_shards(read_time=read_time)
+        actual = self._count_results(read_time=read_time)
+        diff = {key: actual[key] - counted[key] for key in actual if actual[key] != counted[key]}
+        if apply:
+            batch = self.db.batch()
+            if diff:
+                batch.set(self._shard_ref(0), {
+                    "counts": {key: fs.Increment(n) for key, n in diff.items()},
+                }, merge=True)
+            batch.set(self.db.collection(self.counters_collection).document(_META_DOC), {
+                "backfilled_at": fs.SERVER_TIMESTAMP,
+                "shards": HEATMAP_SHARDS,
+            }, merge=True)
+            batch.commit()
+        return diff
+
+    def _usage_ref(self, day: str):
+        return self.db.collection(self.usage_collection).document(day)
+
+    def lease_tokens(self, day, tokens, budget):
+        from google.cloud import firestore
+
+        @firestore.transactional
+        def take(transaction, ref):
+            snapshot = ref.get(transaction=transaction)
+            data = snapshot.to_dict() if snapshot.exists else {}
+            # Documents written before leasing existed only carry total_tokens
+            leased = max(data.get("leased_tokens", 0), data.get("total_tokens", 0))
+            granted = max(0, min(tokens, budget - leased))
+            if granted:
+                transaction.set(ref, {"leased_tokens": leased + granted, "date": day}, merge=True)
+            return granted
+
+        return take(self.db.transaction(), self._usage_ref(day))
+
+    def add_usage(self, day, tokens, requests, cache_hits, leased=0):
+        from google.cloud.firestore_v1 import transforms
+        update = {
+            "total_tokens": transforms.Increment(tokens),
+            "request_count": transforms.Increment(requests),
+            "cache_hits": transforms.Increment(cache_hits),
+            "date": day,
+        }
+        if leased:
+            update["leased_tokens"] = transforms.Increment(leased)
+        self._usage_ref(day).set(update, merge=True)
+
+    def read_usage(self, day):
+        doc = self._usage_ref(day).get()
+        data = doc.to_dict() if doc.exists else {}
+        return {
+            "tokens": data.get("total_tokens", 0),
+            "requests": data.get("request_count", 0),
+            "cache_hits": data.get("cache_hits", 0),
+            "leased": data.get("leased_tokens", 0),
+        }
+
+
+class SQLiteBackend(StorageBackend):
+    """Local SQLite file (WAL mode, one connection per thread) with aggregate tables.
 
+    heatmap_counts and usage_daily are keyed (and so indexed) by cell and
+    date, and updated in the same transaction as the rows they summarize.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: Path):
+        self.db = SQLiteConnections(path, timeout=10)
+        self.path = self.db.path
+        self.db.conn().executescript("""
+            CREATE TABLE IF NOT EXISTS assessment_results (
+                id INTEGER PRIMARY KEY,
+                sae_level INTEGER NOT NULL,
+                epias_stage TEXT NOT NULL,
+                cell_key TEXT NOT NULL,
+                timestamp TEXT NOT NULL,
+                app_version TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS assessment_results_cell_key ON assessment_results (cell_key);
+            CREATE TABLE IF NOT EXISTS heatmap_counts (
+                cell_key TEXT PRIMARY KEY,
+                count INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS usage_daily (
+                date TEXT PRIMARY KEY,
+                total_tokens INTEGER NOT NULL DEFAULT 0,
+                request_count INTEGER NOT NULL DEFAULT 0,
+                cache_hits INTEGER NOT NULL DEFAULT 0,
+                leased_tokens INTEGER NOT NULL DEFAULT 0
+            );
+        """)
+
+    def store_results(self, results):
+        increments = {}
+        for result in results:
+            increments[_cell_key(result)] = increments.get(_cell_key(result), 0) + 1
+
+        def write(conn):
+            conn.executemany(
+                "INSERT INTO assessment_results (sae_level, epias_stage, cell_key, timestamp, app_version)"
+                " VALUES (?, ?, ?, ?, '1.0')",
+                [(r["sae_level"], r["epias_stage"], _cell_key(r), r["timestamp"]) for r in results],
+            )
+            conn.executemany(
+                "INSERT INTO heatmap_counts (cell_key, count) VALUES (?, ?)"
+                " ON CONFLICT (cell_key) DO UPDATE SET count = count + excluded.count",
+                list(increments.items()),
+            )
+
+        self.db.write(write)
+
+    def heatmap_counts(self):
+        counts = _empty_counts()
+        for key, n in self.db.conn().execute("SELECT cell_key, count FROM heatmap_counts"):
+            if key in counts:
+                counts[key] = n
+        return counts
+
+    def reconcile_heatmap(self, apply=False):
+        def reconcile(conn):
+            actual = _empty_counts()
+            for key, n in conn.execute(
+                    "SELECT cell_key, COUNT(*) FROM assessment_results GROUP BY cell_key"):
+                if key in actual:
+                    actual[key] = n
+            counted = _empty_counts()
+            for key, n in conn.execute("SELECT cell_key, count FROM heatmap_counts"):
+                if key in counted:
+                    counted[key] = n
+            diff = {key: actual[key] - counted[key] for key in actual if actual[key] != counted[key]}
+            if apply:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO heatmap_counts (cell_key, count) VALUES (?, ?)",
+                    [(key, actual[key]) for key in diff],
+                )
+            return diff
+
+        # One transaction, so no result can land between the count and the fix
+        return self.db.write(reconcile)
+
+    def lease_tokens(self, day, tokens, budget):
+        def take(conn):
+            row = conn.execute("SELECT leased_tokens FROM usage_daily WHERE date = ?", (day,)).fetchone()
+            leased = row[0] if row else 0
+            granted = max(0, min(tokens, budget - leased))
+            if granted:
+                conn.execute(
+                    "INSERT INTO usage_daily (date, leased_tokens) VALUES (?, ?)"
+                    " ON CONFLICT (date) DO UPDATE SET leased_tokens = leased_tokens + excluded.leased_tokens",
+                    (day, granted),
+                )
+            return granted
+
+        return self.db.write(take)
+
+    def add_usage(self, day, tokens, requests, cache_hits, leased=0):
+        self.db.write(lambda conn: conn.execute(
+            "INSERT INTO usage_daily (date, total_tokens, request_count, cache_hits, leased_tokens)"
+            " VALUES (?, ?, ?, ?, ?) ON CONFLICT (date) DO UPDATE SET"
+            " total_tokens = total_tokens + excluded.total_tokens,"
+            " request_count = request_count + excluded.request_count,"
+            " cache_hits = cache_hits + excluded.cache_hits,"
+            " leased_tokens = leased_tokens + excluded.leased_tokens",
+            (day, tokens, requests, cache_hits, leased),
+        ))
+
+    def read_usage(self, day):
+        row = self.db.conn().execute(
+            "SELECT total_tokens, request_count, cache_hits, leased_tokens FROM usage_daily WHERE date = ?",
+            (day,),
+        ).fetchone() or (0, 0, 0, 0)
+        return dict(zip(("tokens", "requests", "cache_hits", "leased"), row))
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def create_storage_backend(backend: str, path: Path | None = None,
+                           collection_prefix: str = "") -> StorageBackend | None:
+    """Build a storage backend, or None for 'off'.
+
+    collection_prefix applies to Firestore only (see FirestoreBackend).
+    """
+    if backend == "off":
+        return None
+    if backend == "firestore":
+        return FirestoreBackend(collection_prefix=collection_prefix)
+    if backend == "sqlite":
+        return SQLiteBackend(path)
+    raise ValueError(f"Unknown storage backend: {backend}. Use 'off', 'firestore' or 'sqlite'.")
+
+
+def get_storage() -> StorageBackend | None:
+    """The configured backend (created on first use), or None when storage is off."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            from config import settings
+            name = settings.storage_backend or ("firestore" if settings.firestore_enabled else "off")
+            _backend = create_storage_backend(name, settings.storage_path)
+        return _backend
+
+
+def store_result(sae_level: int, epias_stage: str) -> None:
+    """Store a single anonymous assessment result and count it in the heatmap."""
+    store_results([{"sae_level": sae_level, "epias_stage": epias_stage,
+                    "timestamp": datetime.now(timezone.utc).isoformat()}])
+
+
+def store_results(results: list) -> None:
+    """Store a batch of results (see StorageBackend.store_results); no-op when storage is off."""
+    backend = get_storage()
+    if backend is None or not results:
+        return
+    backend.store_results(results)
+
+
+def get_heatmap_data() -> dict:
+    """Aggregate all results into a 6x5 count grid."""
+    backend = get_storage()
+    counts = backend.heatmap_counts() if backend is not None else _empty_counts()
     return {
         "counts": counts,
-        "total": total,
+        "total": sum(counts.values()),
         "updated_at": datetime.now(timezone.utc).isoformat(),
     }
+
+
+def reconcile_heatmap(apply: bool = False) -> dict:
+    """Compare the heatmap aggregate with a full count of stored results.
+
+    Args:
+        apply: Correct the aggregate (and, in Firestore, mark the counters
+            as backfilled); otherwise only report the differences
+
+    Returns:
+        {cell_key: results - counters} for every cell that differs.
+
+    Safe to run while results are being written: counters and results are
+    compared at one consistent point (a single transaction in SQLite, one
+    read_time snapshot in Firestore), and corrections are applied as
+    increments, so later writes are not counted twice or lost.
+    """
+    backend = get_storage()
+    if backend is None:
+        raise RuntimeError("Storage is off (set STORAGE_BACKEND=firestore|sqlite)")
+    return backend.reconcile_heatmap(apply=apply)
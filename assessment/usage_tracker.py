@@ -1,111 +1,279 @@
 """Token usage tracking with daily budget limits.
 
-Uses Firestore when available, falls back to in-memory tracking.
+Uses the configured storage backend (Firestore or SQLite, see storage.py)
+when there is one, falls back to in-memory tracking.
+
+Budget checks are local. Each worker leases token allowances in blocks of
+USAGE_LEASE_TOKENS from the shared daily record (a transaction on
+``leased_tokens``, which never exceeds the budget) and charges requests
+against its lease in memory. Chat requests reserve their estimated cost up
+front and settle it with the actual usage afterwards. Usage counters are
+flushed to the shared record in one write every USAGE_FLUSH_INTERVAL
+seconds by a background thread, which also tops up the lease before it
+runs out, so a chat message normally makes no storage call at all.
+
+Accuracy across workers and instances:
+- spend cannot exceed the budget by more than the error of in-flight
+  reservations (actual usage above the estimate)
+- up to one unused block per worker may be left over when the budget runs
+  out (leases are returned on graceful shutdown)
+- reported usage lags other workers by at most the flush interval
+- usage recorded before UTC midnight is flushed under that day, even when
+  the flush runs after it
 """
 
+import atexit
 import os
+import threading
+import time
 from datetime import datetime, timezone
 
 # Daily budget in tokens (input + output combined). Default ~500K tokens.
 DAILY_TOKEN_BUDGET = int(os.environ.get("DAILY_TOKEN_BUDGET", "500000"))
 
-# In-memory fallback
-_daily_usage: dict[str, dict] = {}  # {"2026-02-11": {"tokens": N, "requests": N}}
-
 
 def _today() -> str:
     return datetime.now(timezone.utc).strftime("%Y-%m-%d")
 
 
-def _firestore_enabled() -> bool:
-    return os.environ.get("FIRESTORE_ENABLED", "").lower() in ("1", "true")
+class _MemoryStore:
+    """Per-process stand-in for the shared daily usage record (storage off)."""
 
+    def __init__(self):
+        self._days: dict[str, dict] = {}  # {"2026-02-11": {"tokens", "requests", "cache_hits", "leased"}}
+        self._lock = threading.Lock()
 
-def _get_db():
-    if not _firestore_enabled():
-        return None
-    try:
-        from storage import _get_client
-        return _get_client()
-    except Exception:
-        return None
+    def _day(self, day: str) -> dict:
+        return self._days.setdefault(day, {"tokens": 0, "requests": 0, "cache_hits": 0, "leased": 0})
 
+    def lease_tokens(self, day: str, tokens: int, budget: int) -> int:
+        with self._lock:
+            doc = self._day(day)
+            granted = max(0, min(tokens, budget - doc["leased"]))
+            doc["leased"] += granted
+            return granted
 
-def record_usage(input_tokens: int, output_tokens: int) -> dict:
-    """Record token usage for a request. Returns usage summary."""
-    total = (input_tokens or 0) + (output_tokens or 0)
-    today = _today()
+    def add_usage(self, day: str, tokens: int, requests: int, cache_hits: int, leased: int = 0) -> None:
+        with self._lock:
+            doc = self._day(day)
+            doc["tokens"] += tokens
+            doc["requests"] += requests
+            doc["cache_hits"] += cache_hits
+            doc["leased"] += leased
 
-    db = _get_db()
-    if db:
-        try:
-            from google.cloud.firestore_v1 import transforms
-            doc_ref = db.collection("usage_daily").document(today)
-            doc_ref.set({
-                "total_tokens": transforms.Increment(total),
-                "request_count": transforms.Increment(1),
-                "date": today,
-            }, merge=True)
-        except Exception:
-            pass
-
-    # Always update in-memory too (used as fallback and for immediate reads)
-    if today not in _daily_usage:
-        _daily_usage[today] = {"tokens": 0, "requests": 0}
-    _daily_usage[today]["tokens"] += total
-    _daily_usage[today]["requests"] += 1
-
-    return get_usage_stats()
-
-
-def check_budget() -> bool:
-    """Return True if under daily budget."""
-    today = _today()
-
-    db = _get_db()
-    if db:
+    def read_usage(self, day: str) -> dict:
+        with self._lock:
+            return dict(self._day(day))
+
+
+class BudgetAccountant:
+    """Local budget checks against leased token blocks, with batched usage flushes."""
+
+    def __init__(self, store, budget: int = DAILY_TOKEN_BUDGET, lease_tokens: int = 20000,
+                 flush_interval: float = 2.0):
+        self.store = store
+        self.budget = budget
+        self.lease_tokens = lease_tokens
+        self.flush_interval = flush_interval
+        self._day = _today()
+        self._lease = 0       # leased tokens not yet spent (negative = spent beyond the lease)
+        self._reserved = 0    # part of the lease held by in-flight requests
+        self._pending = {"tokens": 0, "requests": 0, "cache_hits": 0}
+        self._unflushed = []  # (day, pending) left over from days that have ended
+        self._shared = {"tokens": 0, "requests": 0, "cache_hits": 0}  # as of the last flush
+        self._exhausted_at = None  # monotonic time a lease last came back empty
+        self._lock = threading.Lock()
+        self._lease_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="usage-flusher", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _roll_day(self) -> None:
+        """Start a fresh lease at UTC midnight (caller holds _lock).
+
+        Usage still pending for the day that ended is set aside to be
+        flushed under that day.
+        """
+        today = _today()
+        if today != self._day:
+            if self._pending["requests"]:
+                self._unflushed.append((self._day, self._pending))
+            self._pending = {"tokens": 0, "requests": 0, "cache_hits": 0}
+            self._day, self._lease, self._reserved = today, 0, 0
+            self._exhausted_at = None
+            self._shared = {"tokens": 0, "requests": 0, "cache_hits": 0}
+
+    def _acquire(self, tokens: int) -> None:
+        """Lease at least one block (more if tokens needs it) from the shared budget."""
+        with self._lease_lock:
+            with self._lock:
+                self._roll_day()
+                day, free = self._day, self._lease - self._reserved
+            if free >= tokens:
+                return  # another thread just topped the lease up
+            if self._exhausted_at is not None and time.monotonic() - self._exhausted_at < self.flush_interval:
+                return  # the budget was spent moments ago: don't ask again on every request
+            try:
+                granted = self.store.lease_tokens(day, max(self.lease_tokens, tokens - free), self.budget)
+            except Exception as e:
+                print(f"BudgetAccountant: lease failed: {e}")
+                return
+            with self._lock:
+                if day == self._day:
+                    self._lease += granted
+                    self._exhausted_at = None if granted else time.monotonic()
+
+    def reserve(self, tokens: int) -> bool:
+        """Hold tokens of the budget for a request; False when the budget is spent.
+
+        A successful reservation must be settled with record() or release().
+        """
+        needed = max(tokens, 1)
+        for attempt in range(2):
+            with self._lock:
+                self._roll_day()
+                if self._lease - self._reserved >= needed:
+                    self._reserved += tokens
+                    return True
+            if attempt == 0:
+                self._acquire(needed)
+        return False
+
+    def release(self, tokens: int) -> None:
+        """Return an unused reservation (the request failed)."""
+        with self._lock:
+            self._reserved = max(0, self._reserved - tokens)
+
+    def record(self, tokens: int, cache_hit: bool = False, reserved: int = 0) -> None:
+        """Charge a finished request, settling its reservation."""
+        with self._lock:
+            self._roll_day()
+            self._reserved = max(0, self._reserved - reserved)
+            self._lease -= tokens
+            self._pending["tokens"] += tokens
+            self._pending["requests"] += 1
+            self._pending["cache_hits"] += 1 if cache_hit else 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._roll_day()
+            tokens_used = self._shared["tokens"] + self._pending["tokens"]
+            return {
+                "date": self._day,
+                "tokens_used": tokens_used,
+                "requests": self._shared["requests"] + self._pending["requests"],
+                "cache_hits": self._shared["cache_hits"] + self._pending["cache_hits"],
+                "budget": self.budget,
+                "remaining": max(0, self.budget - tokens_used),
+            }
+
+    def flush(self, return_lease: bool = False) -> None:
+        """Write pending usage to the shared store in one update and refresh the shared totals.
+
+        Args:
+            return_lease: Also give unspent leased tokens back (on shutdown)
+        """
+        with self._lock:
+            self._roll_day()
+            day = self._day
+            batches = self._unflushed + [(day, self._pending)]
+            self._unflushed = []
+            self._pending = {"tokens": 0, "requests": 0, "cache_hits": 0}
+            returned = max(0, self._lease - self._reserved) if return_lease else 0
+            self._lease -= returned
+        # Each day's usage goes to its own record; today's batch is last
+        for i, (batch_day, pending) in enumerate(batches):
+            leased = -returned if batch_day == day else 0
+            if not (pending["requests"] or leased):
+                continue
+            try:
+                self.store.add_usage(batch_day, pending["tokens"], pending["requests"], pending["cache_hits"],
+                                     leased=leased)
+            except Exception as e:
+                print(f"BudgetAccountant: usage flush failed: {e}")
+                self._requeue(batches[i:], returned)
+                return
         try:
-            doc = db.collection("usage_daily").document(today).get()
-            if doc.exists:
-                return doc.to_dict().get("total_tokens", 0) < DAILY_TOKEN_BUDGET
-            return True
-        except Exception:
-            pass
+            shared = self.store.read_usage(day)
+        except Exception as e:
+            print(f"BudgetAccountant: usage read failed: {e}")
+            return
+        with self._lock:
+            if day == self._day:
+                self._shared = {key: shared[key] for key in ("tokens", "requests", "cache_hits")}
 
-    return _daily_usage.get(today, {}).get("tokens", 0) < DAILY_TOKEN_BUDGET
+    def _requeue(self, batches: list, returned: int) -> None:
+        """Put back usage (and a returned lease) whose flush failed, to retry next time."""
+        with self._lock:
+            for batch_day, pending in batches:
+                if batch_day != self._day:
+                    self._unflushed.append((batch_day, pending))
+                    continue
+                for key, n in pending.items():
+                    self._pending[key] += n
+            self._lease += returned
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+            with self._lock:
+                low = self._lease - self._reserved < self.lease_tokens // 4
+            if low:
+                # Top up before the lease runs out, off the request path
+                self._acquire(self.lease_tokens // 4)
+
+    def close(self) -> None:
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._thread.join(timeout=5)
+        self.flush(return_lease=True)
+
+
+_accountant = None
+_accountant_lock = threading.Lock()
+
+
+def _get_accountant() -> BudgetAccountant:
+    global _accountant
+    with _accountant_lock:
+        if _accountant is None:
+            from config import settings
+            from storage import get_storage
+            _accountant = BudgetAccountant(get_storage() or _MemoryStore(),
+                                           lease_tokens=settings.usage_lease_tokens,
+                                           flush_interval=settings.usage_flush_interval)
+        return _accountant
+
+
+def reserve_tokens(tokens: int) -> bool:
+    """Reserve a request's estimated tokens; False if the daily budget is spent.
+
+    Settle with record_usage(..., reserved=tokens), or release_tokens(tokens)
+    if the request fails.
+    """
+    return _get_accountant().reserve(tokens)
+
+
+def release_tokens(tokens: int) -> None:
+    """Give back a reservation whose request did not complete."""
+    _get_accountant().release(tokens)
+
+
+def record_usage(input_tokens: int, output_tokens: int, cache_hit: bool = False,
+                 reserved: int = 0) -> dict:
+    """Record token usage for a request. Returns usage summary.
+
+    Cache hits count as requests (and as cache_hits) but spend no tokens.
+    reserved is the reservation made for this request by reserve_tokens().
+    """
+    total = 0 if cache_hit else (input_tokens or 0) + (output_tokens or 0)
+    accountant = _get_accountant()
+    accountant.record(total, cache_hit=cache_hit, reserved=reserved)
+    return accountant.stats()
 
 
 def get_usage_stats() -> dict:
     """Return current usage stats."""
-    today = _today()
-    tokens_used = 0
-    requests = 0
-
-    db = _get_db()
-    if db:
-        try:
-            doc = db.collection("usage_daily").document(today).get()
-            if doc.exists:
-                data = doc.to_dict()
-                tokens_used = data.get("total_tokens", 0)
-                requests = data.get("request_count", 0)
-                return {
-                    "date": today,
-                    "tokens_used": tokens_used,
-                    "requests": requests,
-                    "budget": DAILY_TOKEN_BUDGET,
-                    "remaining": max(0, DAILY_TOKEN_BUDGET - tokens_used),
-                }
-        except Exception:
-            pass
-
-    mem = _daily_usage.get(today, {})
-    tokens_used = mem.get("tokens", 0)
-    requests = mem.get("requests", 0)
-    return {
-        "date": today,
-        "tokens_used": tokens_used,
-        "requests": requests,
-        "budget": DAILY_TOKEN_BUDGET,
-        "remaining": max(0, DAILY_TOKEN_BUDGET - tokens_used),
-    }
+    return _get_accountant().stats()